@@ -83,12 +83,18 @@ class Chassis(object):
     def get_ft(self, ftname):
         return self.fts.get(ftname, None)
 
-    def configure(self, config):
+    def configure(self, config, remote_topics=None):
         """configures the chassis instance
 
         Args:
             config (list): list of FTs
+            remote_topics (list): list of nodes with subscribers in
+                other chassis, if None all the nodes are considered
+                as having remote subscribers
         """
+        if remote_topics is not None:
+            self.fabric.set_remote_topics(remote_topics)
+
         newfts = {}
         for ft in config:
             ftconfig = config[ft]
@@ -4,6 +4,11 @@ from .amqp import AMQP
 
 
 def factory(commclass, config):
+    if commclass == 'ZMQ':
+        # pyzmq is needed only by this comm class
+        from .zmq import ZMQ
+        return ZMQ(config)
+
     if commclass != 'AMQP':
         raise RuntimeError('Unknown comm class %s', commclass)
 
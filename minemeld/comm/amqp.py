@@ -14,6 +14,10 @@
 
 """
 This module implements AMQP communication class for mgmtbus and fabric.
+
+Pub channels can pack update and withdraw calls in batch messages, see
+*AMQPPubChannel*. Sub channels always accept both batch and single call
+messages.
 """
 
 from __future__ import absolute_import
@@ -22,15 +26,30 @@ import amqp.connection
 import amqp
 import gevent
 import gevent.event
+import gevent.lock
 import ujson as json
 import logging
 import uuid
 
 LOG = logging.getLogger(__name__)
 
+BATCHED_METHODS = set(['update', 'withdraw'])
+
 
 class AMQPPubChannel(object):
-    def __init__(self, topic):
+    """Publish channel for a topic.
+
+    If *batch_size* is greater than 1, update and withdraw calls are
+    buffered and sent as a single message with a *batch* list of calls.
+    The buffer is flushed when it reaches *batch_size* calls or
+    *batch_max_bytes* bytes, after *batch_timeout* seconds, or before any
+    other method is published to keep ordering.
+
+    Subscribers not supporting batch messages discard them, batching
+    should be enabled only after all the nodes have been upgraded.
+    """
+    def __init__(self, topic, batch_size=1, batch_timeout=0.1,
+                 batch_max_bytes=(1 << 20)):
         self.topic = topic
 
         self.channel = None
@@ -38,6 +57,16 @@ class AMQPPubChannel(object):
 
         self.num_publish = 0
 
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.batch_max_bytes = batch_max_bytes
+
+        self._batch = []
+        self._batch_bytes = 0
+        self._batch_glet = None
+        # batches are flushed also by a timer greenlet
+        self._publish_lock = gevent.lock.Semaphore()
+
     def connect(self, conn):
         if self.channel is not None:
             return
@@ -53,10 +82,37 @@ class AMQPPubChannel(object):
         if self.channel is None:
             return
 
+        self.flush()
+
         # self.channel.exchange_delete(self.topic)
         self.channel.close()
         self.channel = None
 
+    def flush(self):
+        if self._batch_glet is not None:
+            if self._batch_glet is not gevent.getcurrent():
+                self._batch_glet.kill()
+            self._batch_glet = None
+
+        if len(self._batch) == 0:
+            return
+
+        body = '{"batch":['+','.join(self._batch)+']}'
+        self._batch = []
+        self._batch_bytes = 0
+
+        self._basic_publish(body)
+
+    def _basic_publish(self, body):
+        with self._publish_lock:
+            if self.channel is None:
+                return
+
+            self.channel.basic_publish(
+                amqp.Message(body=body),
+                exchange=self.topic
+            )
+
     def publish(self, method, params=None):
         if self.channel is None:
             return
@@ -64,14 +120,28 @@ class AMQPPubChannel(object):
         if params is None:
             params = {}
 
-        msg = {
+        msg = json.dumps({
             'method': method,
             'params': params
-        }
-        self.channel.basic_publish(
-            amqp.Message(body=json.dumps(msg)),
-            exchange=self.topic
-        )
+        })
+
+        if self.batch_size > 1 and method in BATCHED_METHODS:
+            self._batch.append(msg)
+            self._batch_bytes += len(msg)
+
+            if len(self._batch) >= self.batch_size or \
+               self._batch_bytes >= self.batch_max_bytes:
+                self.flush()
+
+            elif self._batch_glet is None:
+                self._batch_glet = gevent.spawn_later(
+                    self.batch_timeout,
+                    self.flush
+                )
+
+        else:
+            self.flush()
+            self._basic_publish(msg)
 
         self.num_publish += 1
         if self.num_publish == 10:
@@ -345,6 +415,15 @@ class AMQPSubChannel(object):
             LOG.error("invalid message received")
             return
 
+        batch = msg.get('batch', None)
+        if batch is None:
+            self._dispatch(msg)
+            return
+
+        for bmsg in batch:
+            self._dispatch(bmsg)
+
+    def _dispatch(self, msg):
         method = msg.get('method', None)
         params = msg.get('params', {})
         if method is None:
@@ -429,6 +508,9 @@ class AMQP(object):
     def __init__(self, config):
         self.num_connections = config.pop('num_connections', 1)
         self.priority = config.pop('priority', 0)
+        self.batch_size = config.pop('batch_size', 1)
+        self.batch_timeout = config.pop('batch_timeout', 0.1)
+        self.batch_max_bytes = config.pop('batch_max_bytes', 1 << 20)
 
         if 'host' not in config:
             config['host'] = '127.0.0.1'
@@ -478,7 +560,10 @@ class AMQP(object):
     def request_pub_channel(self, topic):
         if topic not in self.pub_channels:
             self.pub_channels[topic] = AMQPPubChannel(
-                topic
+                topic,
+                batch_size=self.batch_size,
+                batch_timeout=self.batch_timeout,
+                batch_max_bytes=self.batch_max_bytes
             )
 
         return self.pub_channels[topic]
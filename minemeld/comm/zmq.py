@@ -0,0 +1,770 @@
+#  Copyright 2015-2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+This module implements a brokerless ZeroMQ communication class for mgmtbus
+and fabric, for deployments where all the processes run on the same host.
+
+Every receiving channel binds a PULL socket on an IPC endpoint inside the
+directory *path* of the config (default zmq inside MM_RUN_DIR, default
+/var/run/minemeld). The directory is created with mode 0700, and the class
+refuses to start if it is accessible by other users. Endpoints left by
+dead processes are removed at start.
+
+Senders find the endpoints by name and connect a PUSH socket to each of
+them, messages sent before the receiver is up are queued by ZeroMQ up to
+*hwm* messages (default 10000). When the queue of an endpoint is full the
+sender waits, and raises RuntimeError if the message could not be queued
+in *send_timeout* seconds (default 60). Sub channels with a *max_length*
+are lossy like the AMQP queues with x-max-length: *max_length* sets the
+receive HWM of the channel socket, and messages to the channel are
+dropped and counted when its queue is full.
+
+- sub channel: s-<topic hash>-<subscriber hash>
+- sub channel with max_length: l-<topic hash>-<subscriber hash>
+- RPC server channel: r-<name hash>
+- RPC server channel on a fanout: f-<fanout hash>-<name hash>
+- RPC replies: q-<uuid>
+
+Subscribers are found again every *discovery_interval* seconds. The
+subscriber hash is derived from the subscription name or from the names
+of the listeners, a restarted process gets back the same endpoint.
+"""
+
+from __future__ import absolute_import
+
+import os
+import glob
+import stat
+import time
+import socket as _socket
+import uuid
+import errno
+import hashlib
+import logging
+
+import gevent
+import gevent.event
+import ujson as json
+import zmq.green as zmq
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_HWM = 10000
+DEFAULT_SEND_TIMEOUT = 60
+
+
+def _hash(s):
+    return hashlib.sha1(s).hexdigest()[:16]
+
+
+def _check_path(path):
+    try:
+        os.makedirs(path, 0700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    st = os.stat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise RuntimeError('ZMQ path %s is not a directory' % path)
+    if st.st_uid != os.getuid():
+        raise RuntimeError('ZMQ path %s is owned by another user' % path)
+    if st.st_mode & 0077:
+        raise RuntimeError('ZMQ path %s is accessible by other users' % path)
+
+
+def _remove_stale_endpoints(path):
+    """Removes the IPC endpoints nobody is listening on."""
+    for epath in glob.glob(os.path.join(path, '*')):
+        s = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+        try:
+            s.connect(epath)
+
+        except _socket.error as e:
+            if e.errno != errno.ECONNREFUSED:
+                continue
+
+            LOG.info('Removing stale ZMQ endpoint %s', epath)
+            try:
+                os.remove(epath)
+            except OSError:
+                pass
+
+        finally:
+            s.close()
+
+
+class _ZMQEndpoints(object):
+    """Naming of the IPC endpoints and cache of PUSH sockets."""
+    def __init__(self, context, path, hwm, send_timeout):
+        self.context = context
+        self.path = path
+        self.hwm = hwm
+        self.send_timeout = send_timeout
+
+        self._push_sockets = {}
+        self.num_dropped = 0
+
+    def endpoint(self, *components):
+        return 'ipc://'+os.path.join(self.path, '-'.join(components))
+
+    def discover(self, *components):
+        pattern = os.path.join(self.path, '-'.join(components)+'-*')
+        return ['ipc://'+p for p in glob.glob(pattern)]
+
+    def bind(self, endpoint, hwm=None):
+        if hwm is None:
+            hwm = self.hwm
+
+        socket = self.context.socket(zmq.PULL)
+        socket.setsockopt(zmq.RCVHWM, hwm)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.bind(endpoint)
+        return socket
+
+    def send(self, endpoint, body, lossy=False):
+        socket = self._push_sockets.get(endpoint, None)
+        if socket is None:
+            socket = self.context.socket(zmq.PUSH)
+            socket.setsockopt(zmq.SNDHWM, self.hwm)
+            socket.setsockopt(zmq.LINGER, 0)
+            socket.connect(endpoint)
+            self._push_sockets[endpoint] = socket
+
+        if lossy:
+            try:
+                socket.send(body, zmq.NOBLOCK)
+
+            except zmq.Again:
+                self.num_dropped += 1
+                LOG.debug('Message to %s dropped, queue full', endpoint)
+
+            return
+
+        # waits for the receiver while the queue is full
+        timeout = gevent.Timeout(self.send_timeout)
+        timeout.start()
+        try:
+            socket.send(body)
+
+        except gevent.Timeout as t:
+            if t is not timeout:
+                raise
+            raise RuntimeError(
+                'Timeout sending to %s, receiver not reading' % endpoint
+            )
+
+        finally:
+            timeout.cancel()
+
+    def close(self):
+        for socket in self._push_sockets.values():
+            socket.close()
+        self._push_sockets = {}
+
+
+def _dispatch(listeners, topic, msg):
+    method = msg.get('method', None)
+    params = msg.get('params', {})
+    if method is None:
+        LOG.error("Message without method field")
+        return
+
+    for obj, allowed_methods in listeners:
+        if method not in allowed_methods:
+            LOG.error("Method not allowed: %s", method)
+            continue
+
+        m = getattr(obj, method, None)
+        if m is None:
+            LOG.error('Method %s not defined', method)
+            continue
+
+        try:
+            m(**params)
+
+        except gevent.GreenletExit:
+            raise
+
+        except:
+            LOG.exception('Exception in handling %s on topic %s '
+                          'with params %s', method, topic, params)
+
+
+class ZMQPubChannel(object):
+    def __init__(self, topic, discovery_interval):
+        self.topic = topic
+        self.discovery_interval = discovery_interval
+
+        self.endpoints = None
+        self.subscribers = []
+        self._last_discovery = 0
+
+        self.num_publish = 0
+
+    def connect(self, endpoints):
+        if self.endpoints is not None:
+            return
+
+        self.endpoints = endpoints
+        self.discover()
+
+    def disconnect(self):
+        self.endpoints = None
+        self.subscribers = []
+
+    def discover(self):
+        self._last_discovery = time.time()
+
+        topic_hash = _hash(self.topic)
+        self.subscribers = [
+            (e, False) for e in self.endpoints.discover('s', topic_hash)
+        ]
+        self.subscribers.extend(
+            (e, True) for e in self.endpoints.discover('l', topic_hash)
+        )
+
+    def publish(self, method, params=None):
+        if self.endpoints is None:
+            return
+
+        if params is None:
+            params = {}
+
+        if time.time()-self._last_discovery > self.discovery_interval:
+            self.discover()
+
+        body = json.dumps({
+            'method': method,
+            'params': params
+        })
+        for s, lossy in self.subscribers:
+            self.endpoints.send(s, body, lossy=lossy)
+
+        self.num_publish += 1
+        if self.num_publish == 10:
+            self.num_publish = 0
+            gevent.sleep(0)
+
+
+class ZMQSubChannel(object):
+    def __init__(self, topic, listeners=None, name=None, max_length=None):
+        if listeners is None:
+            listeners = []
+
+        self.topic = topic
+        self.listeners = listeners
+        self.name = name
+        self.max_length = max_length
+
+        self.socket = None
+
+        self.num_callbacks = 0
+
+    def add_listener(self, obj, allowed_methods=None):
+        if allowed_methods is None:
+            allowed_methods = []
+
+        self.listeners.append((obj, allowed_methods))
+
+    def _subscriber_id(self):
+        if self.name is not None:
+            return _hash(self.name)
+
+        names = sorted(
+            str(getattr(obj, 'name', None)) for obj, _ in self.listeners
+        )
+        if 'None' in names:
+            return uuid.uuid4().hex[:16]
+
+        return _hash(','.join(names))
+
+    def _callback(self, body):
+        try:
+            msg = json.loads(body)
+        except ValueError:
+            LOG.error("invalid message received")
+            return
+
+        _dispatch(self.listeners, self.topic, msg)
+
+        self.num_callbacks += 1
+        if self.num_callbacks == 10:
+            self.num_callbacks = 0
+            gevent.sleep(0)
+
+    def loop(self):
+        while True:
+            self._callback(self.socket.recv())
+
+    def connect(self, endpoints):
+        if self.socket is not None:
+            return
+
+        prefix = 's'
+        if self.max_length is not None:
+            prefix = 'l'
+
+        self.socket = endpoints.bind(
+            endpoints.endpoint(prefix, _hash(self.topic),
+                               self._subscriber_id()),
+            hwm=self.max_length
+        )
+
+    def disconnect(self):
+        if self.socket is None:
+            return
+
+        self.socket.close()
+        self.socket = None
+
+
+class ZMQRpcServerChannel(object):
+    def __init__(self, name, obj, allowed_methods=None,
+                 method_prefix='', fanout=None):
+        if allowed_methods is None:
+            allowed_methods = []
+
+        self.name = name
+        self.obj = obj
+        self.allowed_methods = allowed_methods
+        self.fanout = fanout
+        self.method_prefix = method_prefix
+
+        self.endpoints = None
+        self.sockets = []
+
+    def _send_result(self, reply_to, id_, result=None, error=None):
+        ans = {
+            'source': self.name,
+            'id': id_,
+            'result': result,
+            'error': error
+        }
+        self.endpoints.send(reply_to, json.dumps(ans))
+
+        gevent.sleep(0)
+
+    def _callback(self, body):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            LOG.error("Invalid JSON in msg body")
+            return
+        LOG.debug('in callback - %s', body)
+
+        reply_to = body.get('reply_to', None)
+        if reply_to is None:
+            LOG.error('No reply_to in RPC request')
+            return
+
+        method = body.get('method', None)
+        id_ = body.get('id', None)
+        params = body.get('params', {})
+
+        if method is None:
+            LOG.error('No method in msg body')
+            return
+        if id_ is None:
+            LOG.error('No id in msg body')
+            return
+
+        method = self.method_prefix+method
+
+        if method not in self.allowed_methods:
+            LOG.error("method not allowed: %s", method)
+            self._send_result(reply_to, id_, error="Method not allowed")
+            return
+
+        m = getattr(self.obj, method, None)
+        if m is None:
+            LOG.error("Method %s not defined for %s", method, self.name)
+            self._send_result(reply_to, id_, error="Method not defined")
+            return
+
+        try:
+            result = m(**params)
+
+        except gevent.GreenletExit:
+            raise
+
+        except Exception as e:
+            self._send_result(reply_to, id_, error=str(e))
+
+        else:
+            self._send_result(reply_to, id_, result=result)
+
+    def loop(self, socket):
+        while True:
+            self._callback(socket.recv())
+
+    def connect(self, endpoints):
+        if self.endpoints is not None:
+            return
+
+        self.endpoints = endpoints
+        self.sockets.append(
+            endpoints.bind(endpoints.endpoint('r', _hash(self.name)))
+        )
+        if self.fanout:
+            self.sockets.append(endpoints.bind(endpoints.endpoint(
+                'f', _hash(self.fanout), _hash(self.name)
+            )))
+
+    def disconnect(self):
+        for socket in self.sockets:
+            socket.close()
+        self.sockets = []
+        self.endpoints = None
+
+
+class ZMQRpcFanoutClientChannel(object):
+    def __init__(self, fanout):
+        self.fanout = fanout
+        self.active_rpcs = {}
+
+        self.endpoints = None
+        self.reply_to = None
+        self.socket = None
+
+    def _in_callback(self, body):
+        try:
+            msg = json.loads(body)
+        except ValueError:
+            LOG.error("Invalid JSON in msg body")
+            return
+
+        LOG.debug('ZMQRpcFanoutClientChannel - received result %s', msg)
+
+        id_ = msg.get('id', None)
+        if id_ is None:
+            LOG.error("No id field in RPC reply")
+            return
+        if id_ not in self.active_rpcs:
+            LOG.error("Unknown id received in RPC reply: %s", id_)
+            return
+
+        source = msg.get('source', None)
+        if source is None:
+            LOG.error('No source field in RPC reply')
+            return
+
+        actreq = self.active_rpcs[id_]
+
+        result = msg.get('result', None)
+        if result is None:
+            actreq['errors'] += 1
+            errmsg = msg.get('error', 'no error in reply')
+            LOG.error('Error in RPC reply from %s: %s', source, errmsg)
+        else:
+            actreq['answers'][source] = result
+
+        if len(actreq['answers'])+actreq['errors'] >= actreq['num_results']:
+            actreq['event'].set({
+                'answers': actreq['answers'],
+                'errors': actreq['errors']
+            })
+            self.active_rpcs.pop(id_)
+
+        gevent.sleep(0)
+
+    def loop(self):
+        while True:
+            self._in_callback(self.socket.recv())
+
+    def send_rpc(self, method, params=None, num_results=0, and_discard=False):
+        if self.socket is None:
+            raise RuntimeError('Not connected')
+
+        if params is None:
+            params = {}
+
+        id_ = str(uuid.uuid1())
+
+        body = {
+            'reply_to': self.reply_to,
+            'method': method,
+            'id': id_,
+            'params': params
+        }
+
+        LOG.debug('ZMQRpcFanoutClientChannel - sending %s to %s',
+                  body, self.fanout)
+
+        event = gevent.event.AsyncResult()
+
+        if num_results == 0:
+            event.set({
+                'answers': {},
+                'errors': 0
+            })
+            return event
+
+        self.active_rpcs[id_] = {
+            'cmd': method,
+            'answers': {},
+            'num_results': num_results,
+            'event': event,
+            'errors': 0,
+            'discard': and_discard
+        }
+
+        body = json.dumps(body)
+        for server in self.endpoints.discover('f', _hash(self.fanout)):
+            self.endpoints.send(server, body)
+
+        gevent.sleep(0)
+
+        return event
+
+    def connect(self, endpoints):
+        if self.socket is not None:
+            return
+
+        self.endpoints = endpoints
+        self.reply_to = endpoints.endpoint('q', uuid.uuid4().hex)
+        self.socket = endpoints.bind(self.reply_to)
+
+    def disconnect(self):
+        if self.socket is None:
+            return
+
+        self.socket.close()
+        self.socket = None
+
+
+class ZMQ(object):
+    def __init__(self, config):
+        self.path = config.get(
+            'path',
+            os.path.join(
+                os.environ.get('MM_RUN_DIR', '/var/run/minemeld'),
+                'zmq'
+            )
+        )
+        self.hwm = config.get('hwm', DEFAULT_HWM)
+        self.send_timeout = config.get('send_timeout', DEFAULT_SEND_TIMEOUT)
+        self.discovery_interval = config.get('discovery_interval', 1)
+
+        self.rpc_server_channels = {}
+        self.pub_channels = {}
+        self.sub_channels = {}
+        self.rpc_fanout_clients_channels = []
+
+        self.rpc_reply_to = None
+        self.rpc_in_socket = None
+        self.active_rpcs = {}
+
+        self.context = None
+        self.endpoints = None
+        self.ioloops = []
+
+        self.failure_listeners = []
+
+    def add_failure_listener(self, listener):
+        self.failure_listeners.append(listener)
+
+    def request_rpc_server_channel(self, name, obj=None, allowed_methods=None,
+                                   method_prefix='', fanout=None):
+        if allowed_methods is None:
+            allowed_methods = []
+
+        if name in self.rpc_server_channels:
+            return
+
+        self.rpc_server_channels[name] = ZMQRpcServerChannel(
+            name,
+            obj,
+            method_prefix=method_prefix,
+            allowed_methods=allowed_methods,
+            fanout=fanout
+        )
+
+    def request_rpc_fanout_client_channel(self, topic):
+        c = ZMQRpcFanoutClientChannel(topic)
+        self.rpc_fanout_clients_channels.append(c)
+        return c
+
+    def request_pub_channel(self, topic):
+        if topic not in self.pub_channels:
+            self.pub_channels[topic] = ZMQPubChannel(
+                topic,
+                discovery_interval=self.discovery_interval
+            )
+
+        return self.pub_channels[topic]
+
+    def request_sub_channel(self, topic, obj=None, allowed_methods=None,
+                            name=None, max_length=None):
+        if allowed_methods is None:
+            allowed_methods = []
+
+        if topic in self.sub_channels:
+            self.sub_channels[topic].add_listener(obj, allowed_methods)
+            return
+
+        self.sub_channels[topic] = ZMQSubChannel(
+            topic,
+            [(obj, allowed_methods)],
+            name=name,
+            max_length=max_length
+        )
+
+    def _rpc_callback(self, body):
+        try:
+            msg = json.loads(body)
+        except ValueError:
+            LOG.error("Invalid JSON in msg body")
+            return
+        id_ = msg.get('id', None)
+        if id_ is None:
+            LOG.error("No id field in RPC reply")
+            return
+        if id_ not in self.active_rpcs:
+            LOG.error("Unknown id received in RPC reply: %s", id_)
+            return
+        ar = self.active_rpcs.pop(id_)
+        ar.set({
+            'error': msg.get('error', None),
+            'result': msg.get('result', None)
+        })
+
+    def _rpc_loop(self):
+        while True:
+            self._rpc_callback(self.rpc_in_socket.recv())
+
+    def send_rpc(self, dest, method, params,
+                 block=True, timeout=None):
+        if self.endpoints is None:
+            raise RuntimeError('Not connected')
+
+        id_ = str(uuid.uuid1())
+
+        body = {
+            'reply_to': self.rpc_reply_to,
+            'method': method,
+            'id': id_,
+            'params': params
+        }
+        LOG.debug('sending %s to %s', body, dest)
+
+        self.active_rpcs[id_] = gevent.event.AsyncResult()
+        self.endpoints.send(
+            self.endpoints.endpoint('r', _hash(dest)),
+            json.dumps(body)
+        )
+
+        try:
+            result = self.active_rpcs[id_].get(block=block, timeout=timeout)
+
+        except gevent.timeout.Timeout:
+            self.active_rpcs.pop(id_)
+            raise
+
+        return result
+
+    def _ioloop_failure(self, g):
+        LOG.debug('_ioloop_failure')
+
+        try:
+            g.get()
+
+        except gevent.GreenletExit:
+            return
+
+        except:
+            LOG.exception("_ioloop_failure: exception in ioloop")
+            for l in self.failure_listeners:
+                l()
+
+    def start(self, start_dispatching=True):
+        _check_path(self.path)
+        _remove_stale_endpoints(self.path)
+
+        self.context = zmq.Context()
+        self.endpoints = _ZMQEndpoints(
+            self.context,
+            self.path,
+            self.hwm,
+            self.send_timeout
+        )
+
+        # receivers first, so that local publishers find them
+        for sc in self.sub_channels.values():
+            sc.connect(self.endpoints)
+
+        for rpcc in self.rpc_server_channels.values():
+            rpcc.connect(self.endpoints)
+
+        for rfc in self.rpc_fanout_clients_channels:
+            rfc.connect(self.endpoints)
+
+        self.rpc_reply_to = self.endpoints.endpoint('q', uuid.uuid4().hex)
+        self.rpc_in_socket = self.endpoints.bind(self.rpc_reply_to)
+
+        for pc in self.pub_channels.values():
+            pc.connect(self.endpoints)
+
+        if start_dispatching:
+            self.start_dispatching()
+
+    def start_dispatching(self):
+        loops = [(self._rpc_loop, [])]
+        for sc in self.sub_channels.values():
+            loops.append((sc.loop, []))
+        for rpcc in self.rpc_server_channels.values():
+            for socket in rpcc.sockets:
+                loops.append((rpcc.loop, [socket]))
+        for rfc in self.rpc_fanout_clients_channels:
+            loops.append((rfc.loop, []))
+
+        # publishers look for subscribers started in the meantime
+        for pc in self.pub_channels.values():
+            pc.discover()
+
+        for loop, args in loops:
+            g = gevent.spawn(loop, *args)
+            self.ioloops.append(g)
+            g.link_exception(self._ioloop_failure)
+
+    def stop(self):
+        for g in self.ioloops:
+            g.unlink(self._ioloop_failure)
+            g.kill()
+        self.ioloops = []
+
+        for rpcc in self.rpc_server_channels.values():
+            rpcc.disconnect()
+
+        for pc in self.pub_channels.values():
+            pc.disconnect()
+
+        for sc in self.sub_channels.values():
+            sc.disconnect()
+
+        for rfc in self.rpc_fanout_clients_channels:
+            rfc.disconnect()
+
+        if self.rpc_in_socket is not None:
+            self.rpc_in_socket.close()
+            self.rpc_in_socket = None
+
+        if self.endpoints is not None:
+            self.endpoints.close()
+            self.endpoints = None
+
+        if self.context is not None:
+            self.context.term()
+            self.context = None
@@ -18,17 +18,91 @@ minemeld.fabric
 This module implements fabric abstraction over communication backend class.
 Each chassis has an instance of Fabric and nodes request connections to the
 fabric using this instance.
+
+Messages published by a node to subscribers in the same chassis are
+delivered through an in-process queue, without going through the
+communication backend. Messages are published on the backend only
+if the topic has subscribers in other chassis.
 """
 
 from __future__ import absolute_import
 
 import logging
 
+import gevent
+import gevent.queue
+import ujson
+
 import minemeld.comm
 
 LOG = logging.getLogger(__name__)
 
 
+class _LocalPubChannel(object):
+    """Pub channel delivering messages to the subscribers in the chassis
+    and, if needed, to the remote subscribers via the comm backend.
+
+    Params are serialized once with the same serializer used by the
+    comm backends, and each local subscriber receives its own copy.
+
+    Args:
+        topic (str): topic name
+    """
+    def __init__(self, topic):
+        self.topic = topic
+
+        self.listeners = []
+        self.remote = None
+
+        self.queue = gevent.queue.Queue()
+        self.num_publish = 0
+
+    def add_listener(self, obj, allowed_methods):
+        self.listeners.append((obj, allowed_methods))
+
+    def publish(self, method, params=None):
+        if params is None:
+            params = {}
+
+        if self.remote is not None:
+            self.remote.publish(method, params)
+
+        if len(self.listeners) != 0:
+            self.queue.put((method, ujson.dumps(params)))
+
+            self.num_publish += 1
+            if self.num_publish == 10:
+                self.num_publish = 0
+                gevent.sleep(0)
+
+    def _deliver(self, obj, allowed_methods, method, params):
+        if method not in allowed_methods:
+            LOG.error("Method not allowed: %s", method)
+            return
+
+        m = getattr(obj, method, None)
+        if m is None:
+            LOG.error('Method %s not defined', method)
+            return
+
+        try:
+            m(**params)
+
+        except gevent.GreenletExit:
+            raise
+
+        except:
+            LOG.exception('Exception in handling %s on topic %s '
+                          'with params %s', method, self.topic, params)
+
+    def loop(self):
+        while True:
+            method, body = self.queue.get()
+
+            for obj, allowed_methods in self.listeners:
+                self._deliver(obj, allowed_methods, method, ujson.loads(body))
+
+
 class Fabric(object):
     """MineMeld chassis fabric class
 
@@ -45,6 +119,23 @@ class Fabric(object):
 
         self.comm = minemeld.comm.factory(self.comm_class, self.comm_config)
 
+        # topics with subscribers in other chassis, None if unknown
+        self.remote_topics = None
+
+        self.pub_channels = {}
+        self.sub_channels = {}
+        self.local_glets = []
+
+    def set_remote_topics(self, topics):
+        """Sets the list of topics published in this chassis with
+        subscribers in other chassis. By default all the topics are
+        published on the communication backend.
+
+        Args:
+            topics (list): list of topic names
+        """
+        self.remote_topics = set(topics)
+
     def request_rpc_channel(self, ftname, node, allowed_methods):
         """Creates a new RPC channel on the communication backend.
 
@@ -61,7 +152,10 @@ class Fabric(object):
         Args:
             ftname (str): node name
         """
-        return self.comm.request_pub_channel(ftname)
+        if ftname not in self.pub_channels:
+            self.pub_channels[ftname] = _LocalPubChannel(ftname)
+
+        return self.pub_channels[ftname]
 
     def request_sub_channel(self, ftname, node, subname, allowed_methods):
         """Creates a subscription channel to topic subname.
@@ -73,7 +167,11 @@ class Fabric(object):
             allowed_methods (list): list of allowed methods
         """
         _ = ftname  # noqa
-        self.comm.request_sub_channel(subname, node, allowed_methods)
+
+        # resolved in start, when all the local nodes are connected
+        self.sub_channels.setdefault(subname, []).append(
+            (node, allowed_methods)
+        )
 
     def send_rpc(self, sftname, dftname, method, params,
                  block=True, timeout=None):
@@ -99,16 +197,55 @@ class Fabric(object):
     def _comm_failure(self):
         self.chassis.fabric_failed()
 
+    def _connect_channels(self):
+        for topic, listeners in self.sub_channels.iteritems():
+            pc = self.pub_channels.get(topic, None)
+            if pc is not None:
+                for node, allowed_methods in listeners:
+                    pc.add_listener(node, allowed_methods)
+                continue
+
+            for node, allowed_methods in listeners:
+                self.comm.request_sub_channel(topic, node, allowed_methods)
+
+        for topic, pc in self.pub_channels.iteritems():
+            if self.remote_topics is None or topic in self.remote_topics:
+                pc.remote = self.comm.request_pub_channel(topic)
+
+        LOG.info(
+            'fabric - local delivery for %d topics, remote for %d',
+            sum(1 for pc in self.pub_channels.values() if pc.listeners),
+            sum(1 for pc in self.pub_channels.values() if pc.remote)
+        )
+
     def start(self):
         LOG.debug("fabric start called")
+        self._connect_channels()
         self.comm.add_failure_listener(self._comm_failure)
         self.comm.start(start_dispatching=False)
 
     def start_dispatching(self):
+        for pc in self.pub_channels.values():
+            if len(pc.listeners) == 0:
+                continue
+
+            g = gevent.spawn(pc.loop)
+            g.link_exception(self._local_failure)
+            self.local_glets.append(g)
+
         self.comm.start_dispatching()
 
+    def _local_failure(self, g):
+        LOG.error('fabric - local delivery failure: %s', g.exception)
+        self._comm_failure()
+
     def stop(self):
         LOG.debug("fabric stop called")
+        for g in self.local_glets:
+            g.unlink(self._local_failure)
+            g.kill()
+        self.local_glets = []
+
         self.comm.stop()
 
 
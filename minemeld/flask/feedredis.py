@@ -13,12 +13,22 @@
 #  limitations under the License.
 
 import re
+import time
 import cStringIO
-
+import itertools
+import collections
+import hashlib
+import zlib
+
+import gevent
+import gevent.event
+import redis
+import ujson
 from flask import request, jsonify, Response, stream_with_context
 from flask.ext.login import current_user
 
-from .redisclient import SR
+from . import config
+from .redisclient import SR, REDIS_CP
 from .mmrpc import MMMaster
 from .aaa import MMBlueprint
 from .logger import LOG
@@ -27,7 +37,7 @@ from .logger import LOG
 __all__ = ['BLUEPRINT']
 
 
-FEED_INTERVAL = 100
+FEED_INTERVAL = 100  # default page size, config FEEDS_PAGE_SIZE
 _PROTOCOL_RE = re.compile('^(?:[a-z]+:)*//')
 _INVALID_TOKEN_RE = re.compile('(?:[^\./+=\?&]+\*[^\./+=\?&]*)|(?:[^\./+=\?&]*\*[^\./+=\?&]+)')
 
@@ -35,78 +45,324 @@ _INVALID_TOKEN_RE = re.compile('(?:[^\./+=\?&]+\*[^\./+=\?&]*)|(?:[^\./+=\?&]*\*
 BLUEPRINT = MMBlueprint('feeds', __name__, url_prefix='/feeds')
 
 
-def generate_panosurl_feed(feed, start, num, desc, value):
-    zrange = SR.zrange
+class _FeedCache(object):
+    """LRU cache of rendered feeds, bounded by the total size of the
+    cached bodies. Entries are valid only for the feed generation they
+    have been rendered from.
+    """
+    def __init__(self):
+        self.size = 0
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, generation):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+
+        if entry['generation'] != generation:
+            self.size -= entry['size']
+            return None
+
+        self._entries[key] = entry
+        return entry
+
+    @staticmethod
+    def etag(key, generation):
+        return hashlib.sha1('{}:{!r}'.format(generation, key)).hexdigest()
+
+    def put(self, key, generation, body, max_size):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old['size']
+
+        entry = {
+            'generation': generation,
+            'etag': self.etag(key, generation),
+            'body': body,
+            'gzbody': None,
+            'size': len(body)
+        }
+        self._add(key, entry, max_size)
+
+        return entry
+
+    def compressed(self, key, entry, max_size):
+        if entry['gzbody'] is None:
+            # gzip container
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16+zlib.MAX_WBITS)
+            entry['gzbody'] = compressor.compress(entry['body']) + \
+                compressor.flush()
+
+            if self._entries.pop(key, None) is not None:
+                self.size -= entry['size']
+                entry['size'] += len(entry['gzbody'])
+                self._add(key, entry, max_size)
+
+        return entry['gzbody']
+
+    def _add(self, key, entry, max_size):
+        if entry['size'] > max_size:
+            return
+
+        self._entries[key] = entry
+        self.size += entry['size']
+
+        while self.size > max_size:
+            _, oentry = self._entries.popitem(last=False)
+            self.size -= oentry['size']
+
+
+_FEED_CACHE = _FeedCache()
+
+
+_FEED_NODES_MIN_REFRESH_INTERVAL = 1
+
+
+class _FeedNodes(object):
+    """Cache of the classes of the engine nodes, to check feed requests
+    without a status RPC to the master.
+
+    The cache is updated by the node status published by the master on
+    mm-engine-status.<node>, and cleared when the engine process changes
+    state. Entries not updated for FEEDS_NODES_TTL seconds are expired.
+    Unknown nodes trigger a status RPC, a node not found is not looked up
+    again for FEEDS_NODES_REFRESH_INTERVAL seconds unless its status is
+    published in the meantime. Lookups arriving while a status RPC is in
+    progress wait for its result, RPCs are at least
+    _FEED_NODES_MIN_REFRESH_INTERVAL seconds apart.
+    """
+    def __init__(self):
+        self._nodes = {}
+        self._missing = {}
+        self._last_refresh = None
+        self._refreshing = None
+        self._glet = None
+
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis.StrictRedis(connection_pool=REDIS_CP).pubsub(
+                    ignore_subscribe_messages=True
+                )
+                pubsub.psubscribe('mm-engine-status.*')
+
+                for message in pubsub.listen():
+                    self._update(message['data'])
+
+            except gevent.GreenletExit:
+                break
+
+            except:
+                LOG.exception('Error in feed nodes listener')
+
+            finally:
+                if pubsub is not None:
+                    pubsub.close()
+
+            # status updates could have been lost
+            self.clear()
+            gevent.sleep(5)
+
+    def _update(self, message):
+        try:
+            message = ujson.loads(message)
+            source = message['source']
+            status = message['status']
+        except (ValueError, TypeError, KeyError):
+            LOG.error('Invalid engine status message')
+            return
+
+        if source == '<minemeld-engine>':
+            self.clear()
+            return
+
+        nclass = status.get('class', None)
+        if nclass is not None:
+            self._nodes[source] = (nclass, time.time())
+            self._missing.pop(source, None)
+
+    def _refresh(self):
+        self._last_refresh = time.time()
+
+        status = MMMaster.status()
+        tr = status.get('result', None)
+        if tr is None:
+            raise RuntimeError(status.get('error', 'error'))
+
+        now = time.time()
+        nodes = {}
+        for nname, nstatus in tr.iteritems():
+            _, _, nname = nname.split(':', 2)
+            nodes[nname] = (nstatus.get('class', None), now)
+        self._nodes = nodes
+
+    def _shared_refresh(self):
+        if self._refreshing is not None:
+            self._refreshing.get()
+            return
+
+        refreshing = self._refreshing = gevent.event.AsyncResult()
+        try:
+            # bounds the RPC rate when many different nodes are missing
+            if self._last_refresh is not None:
+                wait = self._last_refresh + \
+                    _FEED_NODES_MIN_REFRESH_INTERVAL-time.time()
+                if wait > 0:
+                    gevent.sleep(wait)
+
+            self._refresh()
+            refreshing.set()
+
+        except Exception as e:
+            refreshing.set_exception(e)
+            raise
+
+        finally:
+            self._refreshing = None
+            if not refreshing.ready():
+                refreshing.set_exception(
+                    RuntimeError('node status refresh interrupted')
+                )
+
+    def clear(self):
+        self._nodes = {}
+        self._missing = {}
+        self._last_refresh = None
+
+    def get_class(self, name):
+        """Returns the class of node *name*, None if the node is unknown.
+        Raises RuntimeError if the status RPC fails.
+        """
+        if self._glet is None or self._glet.dead:
+            self._glet = gevent.spawn(self._listen)
+
+        ttl = int(config.get('FEEDS_NODES_TTL', 300))
+        refresh_interval = int(config.get('FEEDS_NODES_REFRESH_INTERVAL', 10))
+
+        now = time.time()
+        entry = self._nodes.get(name, None)
+        if entry is not None and now-entry[1] < ttl:
+            return entry[0]
+
+        missing = self._missing.get(name, None)
+        if missing is not None and now-missing < refresh_interval:
+            return None
+
+        self._missing = dict(
+            (n, t) for n, t in self._missing.iteritems()
+            if now-t < refresh_interval
+        )
+        self._shared_refresh()
+
+        entry = self._nodes.get(name, None)
+        if entry is None:
+            self._missing[name] = time.time()
+            return None
+        return entry[0]
+
+
+_FEED_NODES = _FeedNodes()
+
+
+def _page_size():
+    try:
+        result = int(config.get('FEEDS_PAGE_SIZE', FEED_INTERVAL))
+    except (TypeError, ValueError):
+        LOG.error('Invalid FEEDS_PAGE_SIZE, using %d', FEED_INTERVAL)
+        result = FEED_INTERVAL
+
+    return max(result, 1)
+
+
+def _feed_pages(feed, start, num, desc, values=False):
+    """Yields the indicators of the feed, one page at a time, as tuples
+    (indicators, values).
+
+    If *values* is True, the values of a page are retrieved with a single
+    HMGET, pipelined with the ZRANGE of the next page. Otherwise values is
+    None.
+    """
+    zrange = 'zrange'
     if desc:
-        zrange = SR.zrevrange
+        zrange = 'zrevrange'
 
     if num is None:
         num = (1 << 32)-1
 
-    cstart = start
+    page_size = _page_size()
+    end = start+num
 
-    while cstart < (start+num):
-        ilist = zrange(feed, cstart,
-                       cstart-1+min(start+num - cstart, FEED_INTERVAL))
+    def _zrange(client, cstart):
+        return getattr(client, zrange)(
+            feed,
+            cstart,
+            cstart-1+min(end-cstart, page_size)
+        )
 
-        for i in ilist:
-            i = i.lower()
+    cstart = start
+    ilist = _zrange(SR, cstart)
 
-            i = _PROTOCOL_RE.sub('', i)
-            i = _INVALID_TOKEN_RE.sub('*', i)
+    while True:
+        nstart = cstart+len(ilist)
+        more = (len(ilist) == page_size and nstart < end)
 
-            yield i+'\n'
+        if not values:
+            yield ilist, None
 
-        if len(ilist) < 100:
-            break
+            if not more:
+                break
 
-        cstart += 100
+            cstart = nstart
+            ilist = _zrange(SR, cstart)
+            continue
 
+        pipe = SR.pipeline(transaction=False)
+        if len(ilist) != 0:
+            pipe.hmget(feed+'.value', ilist)
+        if more:
+            _zrange(pipe, nstart)
+        presult = pipe.execute()
 
-def generate_plain_feed(feed, start, num, desc, value):
-    zrange = SR.zrange
-    if desc:
-        zrange = SR.zrevrange
+        vlist = []
+        if len(ilist) != 0:
+            vlist = presult.pop(0)
 
-    if num is None:
-        num = (1 << 32)-1
+        yield ilist, vlist
 
-    cstart = start
+        if not more:
+            break
 
-    while cstart < (start+num):
-        ilist = zrange(feed, cstart,
-                       cstart-1+min(start+num - cstart, FEED_INTERVAL))
+        cstart = nstart
+        ilist = presult[0]
 
-        yield '\n'.join(ilist)+'\n'
 
-        if len(ilist) < 100:
-            break
+def generate_panosurl_feed(feed, start, num, desc, value):
+    for ilist, _ in _feed_pages(feed, start, num, desc):
+        for i in ilist:
+            i = i.lower()
 
-        cstart += 100
+            i = _PROTOCOL_RE.sub('', i)
+            i = _INVALID_TOKEN_RE.sub('*', i)
 
+            yield i+'\n'
 
-def generate_json_feed(feed, start, num, desc, value):
-    zrange = SR.zrange
-    if desc:
-        zrange = SR.zrevrange
 
-    if num is None:
-        num = (1 << 32)-1
+def generate_plain_feed(feed, start, num, desc, value):
+    for ilist, _ in _feed_pages(feed, start, num, desc):
+        yield '\n'.join(ilist)+'\n'
 
+
+def generate_json_feed(feed, start, num, desc, value):
     if value == 'json':
         yield '[\n'
 
-    cstart = start
     firstelement = True
 
-    while cstart < (start+num):
-        ilist = zrange(feed, cstart,
-                       cstart-1+min(start+num - cstart, FEED_INTERVAL))
-
+    for ilist, vlist in _feed_pages(feed, start, num, desc, values=True):
         result = cStringIO.StringIO()
 
-        for i in ilist:
-            v = SR.hget(feed+'.value', i)
+        for i, v in itertools.izip(ilist, vlist):
             if v is None:
                 v = 'null'
 
@@ -131,11 +387,6 @@ def generate_json_feed(feed, start, num, desc, value):
 
         result.close()
 
-        if len(ilist) < 100:
-            break
-
-        cstart += 100
-
     if value == 'json':
         yield ']\n'
 
@@ -156,21 +407,97 @@ _FEED_FORMATS = {
 }
 
 
+def _feed_response(feed, formatter, mimetype, start, num, desc, value):
+    # rendered feeds are cached by feed generation, feeds not written
+    # by a RedisSet with generation counter are not cached
+    cache_size = int(config.get('FEEDS_CACHE_SIZE', 64*1024*1024))
+    generation = None
+    if cache_size > 0:
+        generation = SR.get(feed+'.generation')
+
+    if generation is None:
+        return Response(
+            stream_with_context(
+                formatter(feed, start, num, desc, value)
+            ),
+            mimetype=mimetype
+        )
+
+    key = (feed, value, start, num, desc)
+    gzipped = (
+        config.get('FEEDS_GZIP', False) and
+        request.accept_encodings['gzip'] > 0
+    )
+    plain_etag = _FeedCache.etag(key, generation)
+    etag = plain_etag
+    if gzipped:
+        etag += '-gzip'
+
+    # feeds too large for the cache are sent uncompressed with the plain
+    # ETag also to gzip clients, both ETags are valid for them
+    for vetag in set([etag, plain_etag]):
+        if request.if_none_match.contains(vetag):
+            response = Response(status=304)
+            response.set_etag(vetag)
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+
+    entry = _FEED_CACHE.get(key, generation)
+    if entry is None:
+        # feeds larger than FEEDS_CACHE_ENTRY_SIZE are streamed
+        max_entry_size = min(
+            int(config.get('FEEDS_CACHE_ENTRY_SIZE', 16*1024*1024)),
+            cache_size
+        )
+
+        content = formatter(feed, start, num, desc, value)
+        chunks = []
+        size = 0
+        for chunk in content:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_entry_size:
+                break
+
+        else:
+            entry = _FEED_CACHE.put(key, generation, ''.join(chunks),
+                                    cache_size)
+
+    if entry is None:
+        response = Response(
+            stream_with_context(itertools.chain(chunks, content)),
+            mimetype=mimetype
+        )
+        # streamed feeds are not compressed
+        etag = plain_etag
+
+    elif gzipped:
+        response = Response(
+            _FEED_CACHE.compressed(key, entry, cache_size),
+            mimetype=mimetype
+        )
+        response.headers['Content-Encoding'] = 'gzip'
+
+    else:
+        response = Response(entry['body'], mimetype=mimetype)
+
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+
+    return response
+
+
 @BLUEPRINT.route('/<feed>', methods=['GET'], feeds=True, read_write=False)
 def get_feed_content(feed):
     if not current_user.check_feed(feed):
         return 'Unauthorized', 401
 
     # check if feed exists
-    status = MMMaster.status()
-    tr = status.get('result', None)
-    if tr is None:
-        return jsonify(error={'message': status.get('error', 'error')})
+    try:
+        nclass = _FEED_NODES.get_class(feed)
+    except RuntimeError as e:
+        return jsonify(error={'message': str(e)})
 
-    nname = 'mbus:slave:'+feed
-    if nname not in tr:
-        return jsonify(error={'message': 'Unknown feed'}), 404
-    nclass = tr[nname].get('class', None)
     if nclass != 'minemeld.ft.redis.RedisSet':
         return jsonify(error={'message': 'Unknown feed'}), 404
 
@@ -210,9 +537,4 @@ def get_feed_content(feed):
         formatter = _FEED_FORMATS[value]['formatter']
         mimetype = _FEED_FORMATS[value]['mimetype']
 
-    return Response(
-        stream_with_context(
-            formatter(feed, start, num, desc, value)
-        ),
-        mimetype=mimetype
-    )
+    return _feed_response(feed, formatter, mimetype, start, num, desc, value)
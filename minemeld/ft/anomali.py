@@ -22,7 +22,6 @@ import yaml
 import netaddr
 import pytz
 import datetime
-import requests
 import logging
 
 from . import basepoller
@@ -196,7 +195,7 @@ class Intelligence(basepoller.BasePollerFT):
             params=params
         )
 
-        r = requests.get(
+        r = self._http_session().get(
             _API_BASE+_API_ENDPOINT,
             **rkwargs
         )
@@ -232,7 +231,7 @@ class Intelligence(basepoller.BasePollerFT):
 
             LOG.debug('%s - requesting next items', self.name)
             rkwargs.pop('params', None)
-            r = requests.get(
+            r = self._http_session().get(
                 _API_BASE+cjson['meta']['next'],
                 **rkwargs
             )
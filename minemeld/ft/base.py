@@ -23,6 +23,8 @@ import copy
 import os
 import collections
 import json
+import time
+import zlib
 
 from . import condition
 from . import ft_states
@@ -30,13 +32,86 @@ from . import utils
 
 
 DISABLE_FULL_TRACE = 'MM_DISABLE_FULL_TRACE' in os.environ
+TRACE_MODES = ['off', 'sampled', 'hashed', 'rate_limited', 'full']
 LOG = logging.getLogger(__name__)
 
 
+_SPECIAL_FIELDS = {
+    '__indicator': 'indicator',
+    '__method': 'method',
+    '__origin': 'origin'
+}
+
+
+class _FilterContext(object):
+    """Update or withdraw evaluated by _Filters."""
+    __slots__ = ['value', 'indicator', 'method', 'origin', '_document']
+
+    def __init__(self, value, indicator, method, origin):
+        self.value = value
+        self.indicator = indicator
+        self.method = method
+        self.origin = origin
+        self._document = None
+
+    def document(self):
+        """Returns the value with the special fields __indicator, __method
+        and __origin, as seen by JMESPath expressions.
+        """
+        if self._document is not None:
+            return self._document
+
+        if self.value is None:
+            d = {}
+        else:
+            d = copy.copy(self.value)
+
+        for field, attr in _SPECIAL_FIELDS.iteritems():
+            v = getattr(self, attr)
+            if v is not None:
+                d[field] = v
+
+        self._document = d
+        return d
+
+
+def _compile_condition(c):
+    """Returns a function evaluating the condition *c* on a _FilterContext.
+
+    Simple attribute lookups are resolved with a direct dict lookup, other
+    expressions are evaluated with JMESPath on the full document.
+    """
+    field = c.field()
+    if field is None:
+        return lambda ctx: c.eval(ctx.document())
+
+    comparator = c.comparator
+    cvalue = c.value
+    special = _SPECIAL_FIELDS.get(field, None)
+
+    def _match(ctx):
+        r = None
+        if special is not None:
+            r = getattr(ctx, special)
+        if r is None and ctx.value is not None:
+            r = ctx.value.get(field)
+
+        # same workaround of Condition.eval
+        if r == 'null':
+            r = None
+
+        return comparator(r, cvalue)
+
+    return _match
+
+
 class _Filters(object):
     """Implements a set of filters to be applied to indicators.
     Used by mineneld.ft.base.BaseFT for ingress and egress filters.
 
+    Conditions are compiled at init, the value is copied only when the
+    indicator is accepted.
+
     Args:
         filters (list): list of filters.
     """
@@ -47,6 +122,7 @@ class _Filters(object):
             cf = {
                 'name': f.get('name', 'filter_%d' % len(self.filters)),
                 'conditions': [],
+                'matchers': [],
                 'actions': []
             }
 
@@ -54,7 +130,9 @@ class _Filters(object):
             if fconditions is None:
                 fconditions = []
             for c in fconditions:
-                cf['conditions'].append(condition.Condition(c))
+                c = condition.Condition(c)
+                cf['conditions'].append(c)
+                cf['matchers'].append(_compile_condition(c))
 
             for a in f.get('actions'):
                 cf['actions'].append(a)
@@ -62,54 +140,36 @@ class _Filters(object):
             self.filters.append(cf)
 
     def apply(self, origin=None, method=None, indicator=None, value=None):
-        if value is None:
-            d = {}
-        else:
-            d = copy.copy(value)
-
-        if indicator is not None:
-            d['__indicator'] = indicator
-
-        if method is not None:
-            d['__method'] = method
-
-        if origin is not None:
-            d['__origin'] = origin
+        ctx = _FilterContext(value, indicator, method, origin)
 
         for f in self.filters:
             LOG.debug("evaluating filter %s", f['name'])
 
             r = True
-            for c in f['conditions']:
-                r &= c.eval(d)
+            for m in f['matchers']:
+                if not m(ctx):
+                    r = False
+                    break
 
             if not r:
                 continue
 
             for a in f['actions']:
                 if a == 'accept':
-                    if value is None:
-                        return indicator, None
-
-                    d.pop('__indicator')
-                    d.pop('__origin', None)
-                    d.pop('__method', None)
-
-                    return indicator, d
+                    return self._accept(indicator, value)
 
                 elif a == 'drop':
                     return None, None
 
         LOG.debug("no matching filter, default accept")
 
+        return self._accept(indicator, value)
+
+    def _accept(self, indicator, value):
         if value is None:
             return indicator, None
 
-        d.pop('__indicator')
-        d.pop('__origin', None)
-        d.pop('__method', None)
-
-        return indicator, d
+        return indicator, copy.copy(value)
 
 
 def _counting(statsname):
@@ -137,6 +197,18 @@ class BaseFT(object):
             received indicators.
         :outfilters: outbound filter set. Filters to be applied to
             transmitted indicators.
+        :trace_mode: which trace events are sent to mm-traced, one of
+            **off**, **sampled** (1 event every *trace_sample*),
+            **hashed** (all the events of 1 indicator every
+            *trace_sample*, selected by hash), **rate_limited** (at most
+            *trace_rate* events per second) and **full**. Default: value of
+            env MM_TRACE_MODE or **full**. Can be changed at runtime with
+            the **trace** signal, with parameters *mode*, *sample* and
+            *rate*. Events not sent are counted in trace.dropped.
+        :trace_sample: sampling ratio of **sampled** and **hashed** modes.
+            Default: 100
+        :trace_rate: max events per second in **rate_limited** mode.
+            Default: 100
 
     **Filter set**
         Each filter set is a list of filters. Filters are verified from top
@@ -341,6 +413,31 @@ class BaseFT(object):
         self.infilters = _Filters(self.config.get('infilters', []))
         self.outfilters = _Filters(self.config.get('outfilters', []))
 
+        self._configure_trace(
+            mode=self.config.get(
+                'trace_mode',
+                os.environ.get('MM_TRACE_MODE', 'full')
+            ),
+            sample=self.config.get('trace_sample', 100),
+            rate=self.config.get('trace_rate', 100)
+        )
+
+    def _configure_trace(self, mode=None, sample=None, rate=None):
+        if mode is not None:
+            if mode not in TRACE_MODES:
+                raise ValueError('Unknown trace mode {}'.format(mode))
+            self.trace_mode = mode
+
+        if sample is not None:
+            self.trace_sample = max(int(sample), 1)
+
+        if rate is not None:
+            self.trace_rate = max(float(rate), 0.0)
+
+        self._trace_counter = 0
+        self._trace_tokens = self.trace_rate
+        self._trace_last = time.time()
+
     def connect(self, inputs, output):
         if self.state != ft_states.READY:
             LOG.error('connect called in non ready FT')
@@ -660,7 +757,20 @@ class BaseFT(object):
         self.hup(source=source)
 
     def mgmtbus_signal(self, source=None, signal=None, **kwargs):
-        raise NotImplementedError('{}: signal - not implemented'.format(self.name))
+        if signal != 'trace':
+            raise NotImplementedError('{}: signal - not implemented'.format(self.name))
+
+        self._configure_trace(
+            mode=kwargs.get('mode', None),
+            sample=kwargs.get('sample', None),
+            rate=kwargs.get('rate', None)
+        )
+        LOG.info(
+            '%s - trace mode set to %s (sample: %d rate: %s)',
+            self.name, self.trace_mode, self.trace_sample, self.trace_rate
+        )
+
+        return 'OK'
 
     def initialize(self):
         pass
@@ -699,6 +809,10 @@ class BaseFT(object):
             )
             return
 
+        if not self._trace_selected(indicator):
+            self.statistics['trace.dropped'] += 1
+            return
+
         trace = {
             'indicator': indicator,
             'op': action,
@@ -711,6 +825,41 @@ class BaseFT(object):
             value=trace
         )
 
+    def _trace_selected(self, indicator):
+        mode = self.trace_mode
+
+        if mode == 'full':
+            return True
+
+        if mode == 'off':
+            return False
+
+        if mode == 'sampled':
+            self._trace_counter += 1
+            return (self._trace_counter % self.trace_sample) == 0
+
+        if mode == 'hashed':
+            # the same indicators are traced in all the nodes
+            if isinstance(indicator, unicode):
+                indicator = indicator.encode('utf8')
+            elif not isinstance(indicator, str):
+                indicator = str(indicator)
+            return (zlib.crc32(indicator) % self.trace_sample) == 0
+
+        # rate_limited, token bucket with trace_rate tokens per sec
+        now = time.time()
+        self._trace_tokens = min(
+            self.trace_rate,
+            self._trace_tokens+(now-self._trace_last)*self.trace_rate
+        )
+        self._trace_last = now
+
+        if self._trace_tokens < 1:
+            return False
+
+        self._trace_tokens -= 1
+        return True
+
     def start(self):
         LOG.debug("%s - start called", self.name)
 
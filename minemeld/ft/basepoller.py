@@ -23,7 +23,10 @@ import gevent
 import gevent.event
 import gevent.queue
 import random
+import hashlib
 import collections
+import requests
+import requests.adapters
 
 import shutil
 
@@ -39,10 +42,57 @@ LOG = logging.getLogger(__name__)
 _MAX_AGE_OUT = ((1 << 32)-1)*1000  # 2106-02-07 6:28:15
 
 
+def _url_hash(url):
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+
+    return hashlib.sha1(url).hexdigest()
+
+
 class _BaseBPTable(object):
     def __init__(self, table):
         self.table = table
 
+    def _init_last_run(self):
+        # the last run an indicator has been seen in is tracked in a
+        # column, to avoid rewriting values of unchanged indicators
+        if not self.table.create_column('_last_run'):
+            return
+
+        with self.table.batch():
+            for i, v in self.table.query(include_value=True):
+                last_run = v.get('_last_run', None)
+                if last_run is not None:
+                    self.table.put_column(i, '_last_run', last_run)
+
+    def _key(self, indicator, itype):
+        return indicator
+
+    def _indicator(self, key):
+        return key
+
+    def get_last_run(self, indicator, itype=None):
+        return self.table.get_column(self._key(indicator, itype), '_last_run')
+
+    def set_last_run(self, indicator, itype, last_run):
+        self.table.put_column(
+            self._key(indicator, itype),
+            '_last_run',
+            last_run
+        )
+
+    def query_last_run(self, to_key):
+        """Iterates over the indicators last seen in a run <= to_key"""
+        for key, last_run in self.table.query_column('_last_run'):
+            if last_run > to_key:
+                continue
+
+            value = self.table.get(key)
+            if value is None:
+                continue
+
+            yield self._indicator(key), value
+
     def get(self, indicator, itype=None):
         return self.table.get(indicator)
 
@@ -50,14 +100,30 @@ class _BaseBPTable(object):
         self.table.delete(indicator)
 
     def put(self, indicator, value):
-        self.table.put(indicator, value)
+        # _last_run lives in its column, values migrated from older
+        # tables are stripped to stop feeding the old _last_run index
+        if '_last_run' in value:
+            value = dict(value)
+            value.pop('_last_run')
+
+        self.table.put(
+            self._key(indicator, value.get('type', None)),
+            value
+        )
 
     def query(self, *args, **kwargs):
         return self.table.query(*args, **kwargs)
 
+    def batch(self, *args, **kwargs):
+        return self.table.batch(*args, **kwargs)
+
     def length(self):
         return self.table.num_indicators
 
+    @property
+    def index_stats(self):
+        return self.table.index_stats
+
     def close(self):
         self.table.close()
 
@@ -71,7 +137,8 @@ class _BPTable_v0(_BaseBPTable):
 
         self.table.create_index('_age_out')
         self.table.create_index('_withdrawn')
-        self.table.create_index('_last_run')
+
+        self._init_last_run()
 
 
 class _BPTable_v1(_BaseBPTable):
@@ -80,7 +147,6 @@ class _BPTable_v1(_BaseBPTable):
 
         self.table.create_index('_age_out')
         self.table.create_index('_withdrawn')
-        self.table.create_index('_last_run')
 
         self.type_in_key = type_in_key
 
@@ -92,6 +158,20 @@ class _BPTable_v1(_BaseBPTable):
             if cmetadata.get('type_in_key', None) != self.type_in_key:
                 raise RuntimeError('Can\'t change type in key of an existing table')
 
+        self._init_last_run()
+
+    def _key(self, indicator, itype):
+        if self.type_in_key:
+            return self._type_key(indicator, itype)
+
+        return indicator
+
+    def _indicator(self, key):
+        if self.type_in_key:
+            return self._type_key_indicator(key)
+
+        return key
+
     def get(self, indicator, itype=None):
         if self.type_in_key:
             indicator = self._type_key(indicator, itype)
@@ -104,13 +184,6 @@ class _BPTable_v1(_BaseBPTable):
 
         return self.table.delete(indicator)
 
-    def put(self, indicator, value):
-        if self.type_in_key:
-            itype = value.get('type', None)
-            indicator = self._type_key(indicator, itype)
-
-        return self.table.put(indicator, value)
-
     def query(self, *args, **kwargs):
         if not self.type_in_key:
             return self.table.query(*args, **kwargs)
@@ -138,8 +211,14 @@ class _BPTable_v1(_BaseBPTable):
         return key.split('::', 1)[1]
 
 
-def _bptable_factory(name, truncate=False, type_in_key=False):
-    table = Table(name, truncate=truncate)
+def _bptable_factory(name, truncate=False, type_in_key=False,
+                     cache_size=0, statistics=None):
+    table = Table(
+        name,
+        truncate=truncate,
+        cache_size=cache_size,
+        statistics=statistics
+    )
 
     metadata = table.get_custom_metadata()
     if metadata is not None:
@@ -181,8 +260,11 @@ class IndicatorStatus(object):
 
     def __init__(self, indicator, attributes, itable, now, in_feed_threshold):
         self.state = 0
+        self.last_run = None
+
+        itype = attributes.get('type', None)
 
-        self.cv = itable.get(indicator, itype=attributes.get('type', None))
+        self.cv = itable.get(indicator, itype=itype)
         if self.cv is None:
             return
         self.state = self.state | IndicatorStatus.D_MASK
@@ -190,7 +272,11 @@ class IndicatorStatus(object):
         if self.cv['_age_out'] < now:
             self.state = self.state | IndicatorStatus.A_MASK
 
-        if self.cv['_last_run'] >= in_feed_threshold:
+        self.last_run = itable.get_last_run(indicator, itype=itype)
+        if self.last_run is None:
+            self.last_run = self.cv.get('_last_run', None)
+
+        if self.last_run >= in_feed_threshold:
             self.state = self.state | IndicatorStatus.F_MASK
 
         if self.cv.get('_withdrawn', None) is not None:
@@ -214,6 +300,23 @@ class BasePollerFT(base.BaseFT):
         :age_out: age out policies to apply to the indicators.
             Default: age out check interval 3600 seconds, sudden death enabled,
             default age out interval 30 days.
+        :table_cache_size: number of indicators values cached in memory
+            in front of the indicators table. Default: 0, no cache.
+        :conditional_polling: boolean, for miners polling HTTP sources. If
+            *true* ETag and Last-Modified of the last successful poll are
+            sent in conditional requests, and if the source replies with
+            304 Not Modified the poll is considered successful and the
+            indicators table is not updated. Default: *true*
+        :conditional_content_hash: boolean, if *true* and conditional
+            polling is enabled the content of the source is loaded in
+            memory and compared with the content of the last successful
+            poll, a poll with the same content is handled as a 304.
+            Default: *false*
+        :conditional_max_age: max number of seconds between two polls
+            updating the indicators table, after this interval a full
+            poll is performed even if the content did not change. Should be
+            lower than any *last_seen* based age out interval.
+            Default: 86400
 
     **Age out policy**
         Age out policy is described by a dictionary with at least 3 keys:
@@ -310,9 +413,19 @@ class BasePollerFT(base.BaseFT):
         self.last_run = None
         self.last_successful_run = None
         self.last_ageout_run = None
+        self.age_out_rate = None
+        self._age_out_cursor = None
+        self._next_age_out = None
+        self._gc_cursor = None
         self._sub_state = None
         self._sub_state_message = None
 
+        self.conditional_state = None
+        self._conditional_current = None
+        self._conditional_candidate = None
+
+        self._session = None
+
         self.poll_event = gevent.event.Event()
 
         self.state_lock = RWLock()
@@ -328,6 +441,17 @@ class BasePollerFT(base.BaseFT):
         self.interval = self.config.get('interval', 3600)
         self.num_retries = self.config.get('num_retries', 2)
         self.aggregate_indicators = self.config.get('aggregate_indicators', False)
+        self.table_cache_size = self.config.get('table_cache_size', 0)
+        self.conditional_polling = self.config.get('conditional_polling', True)
+        self.conditional_max_age = self.config.get('conditional_max_age', 86400)
+        self.conditional_content_hash = self.config.get(
+            'conditional_content_hash',
+            False
+        )
+        self.fetch_concurrency = max(
+            self.config.get('fetch_concurrency', 4),
+            1
+        )
 
         _age_out = self.config.get('age_out', {})
 
@@ -351,22 +475,34 @@ class BasePollerFT(base.BaseFT):
             'last_successful_run',
             None
         )
+        self.conditional_state = saved_state.get('conditional', None)
+        self._age_out_cursor = saved_state.get('age_out_cursor', None)
+        self._gc_cursor = saved_state.get('gc_cursor', None)
 
     def _saved_state_create(self):
         return {
             'last_run': self.last_run,
-            'last_successful_run': self.last_successful_run
+            'last_successful_run': self.last_successful_run,
+            'conditional': self.conditional_state,
+            'age_out_cursor': self._age_out_cursor,
+            'gc_cursor': self._gc_cursor
         }
 
     def _saved_state_reset(self):
         self.last_successful_run = None
         self.last_run = None
+        self.conditional_state = None
+        self._age_out_cursor = None
+        self._next_age_out = None
+        self._gc_cursor = None
 
     def _initialize_table(self, truncate=False):
         self.table = _bptable_factory(
             self.name,
             truncate=truncate,
-            type_in_key=self.multiple_indicator_types
+            type_in_key=self.multiple_indicator_types,
+            cache_size=self.table_cache_size,
+            statistics=self.statistics
         )
 
     def initialize(self):
@@ -412,23 +548,48 @@ class BasePollerFT(base.BaseFT):
 
             try:
                 now = utc_millisec()
-
-                for i, v in self.table.query(index='_age_out',
-                                             to_key=now-1,
-                                             include_value=True):
-                    LOG.debug('%s - %s %s aged out', self.name, i, v)
-
-                    if v.get('_withdrawn', None) is not None:
-                        continue
-
-                    self._controlled_emit_withdraw(
-                        indicator=i,
-                        value=v
-                    )
-                    v['_withdrawn'] = now
-                    self.table.put(i, v)
-
-                    self.statistics['aged_out'] += 1
+                num_aged_out = 0
+
+                # entries of the _age_out index <= _age_out_cursor have
+                # already been processed, only the due slice is scanned
+                if self._next_age_out is None or self._next_age_out < now:
+                    from_key = None
+                    if self._age_out_cursor is not None and \
+                       self._age_out_cursor < now:
+                        from_key = self._age_out_cursor+1
+
+                    with self.table.batch():
+                        for i, v in self.table.query(index='_age_out',
+                                                     from_key=from_key,
+                                                     to_key=now-1,
+                                                     include_value=True):
+                            LOG.debug('%s - %s %s aged out', self.name, i, v)
+
+                            if v.get('_withdrawn', None) is not None:
+                                continue
+
+                            self._controlled_emit_withdraw(
+                                indicator=i,
+                                value=v
+                            )
+                            v['_withdrawn'] = now
+                            self.table.put(i, v)
+
+                            self.statistics['aged_out'] += 1
+                            num_aged_out += 1
+
+                    self._age_out_cursor = now-1
+                    self._next_age_out = _MAX_AGE_OUT
+                    for _, v in self.table.query(index='_age_out',
+                                                 from_key=now,
+                                                 include_value=True):
+                        self._next_age_out = v['_age_out']
+                        break
+
+                if self.last_ageout_run is not None and \
+                   now > self.last_ageout_run:
+                    self.age_out_rate = \
+                        num_aged_out*1000.0/(now-self.last_ageout_run)
 
                 self.last_ageout_run = now
 
@@ -446,18 +607,19 @@ class BasePollerFT(base.BaseFT):
             try:
                 now = utc_millisec()
 
-                for i, v in self.table.query(include_value=True):
-                    if v.get('_withdrawn', None) is not None:
-                        continue
+                with self.table.batch():
+                    for i, v in self.table.query(include_value=True):
+                        if v.get('_withdrawn', None) is not None:
+                            continue
 
-                    self._controlled_emit_withdraw(
-                        indicator=i,
-                        value=v
-                    )
-                    v['_withdrawn'] = now
-                    self.table.put(i, v)
+                        self._controlled_emit_withdraw(
+                            indicator=i,
+                            value=v
+                        )
+                        v['_withdrawn'] = now
+                        self.table.put(i, v)
 
-                    self.statistics['flushed'] += 1
+                        self.statistics['flushed'] += 1
 
             except gevent.GreenletExit:
                 raise
@@ -475,14 +637,15 @@ class BasePollerFT(base.BaseFT):
 
             LOG.debug('checking sudden death for %d', self.last_successful_run)
 
-            for i, v in self.table.query(index='_last_run',
-                                         to_key=self.last_successful_run-1,
-                                         include_value=True):
-                LOG.debug('%s - %s %s sudden death', self.name, i, v)
+            with self.table.batch():
+                for i, v in self.table.query_last_run(
+                        to_key=self.last_successful_run-1):
+                    LOG.debug('%s - %s %s sudden death', self.name, i, v)
 
-                v['_age_out'] = self.last_successful_run-1
-                self.table.put(i, v)
-                self.statistics['removed'] += 1
+                    v['_age_out'] = self.last_successful_run-1
+                    self._schedule_age_out(v['_age_out'])
+                    self.table.put(i, v)
+                    self.statistics['removed'] += 1
 
     def _collect_garbage(self):
         now = utc_millisec()
@@ -491,12 +654,151 @@ class BasePollerFT(base.BaseFT):
             if self.state != ft_states.STARTED:
                 return
 
-            for i, v in self.table.query(index='_withdrawn',
-                                         to_key=now,
-                                         include_value=True):
-                LOG.debug('%s - %s collected', self.name, i)
-                self.table.delete(i, itype=v.get('type', None))
-                self.statistics['garbage_collected'] += 1
+            # indicators are withdrawn with the current time, entries
+            # of the _withdrawn index < _gc_cursor have been collected
+            from_key = None
+            if self._gc_cursor is not None and self._gc_cursor <= now:
+                from_key = self._gc_cursor
+
+            with self.table.batch():
+                for i, v in self.table.query(index='_withdrawn',
+                                             from_key=from_key,
+                                             to_key=now,
+                                             include_value=True):
+                    LOG.debug('%s - %s collected', self.name, i)
+                    self.table.delete(i, itype=v.get('type', None))
+                    self.statistics['garbage_collected'] += 1
+
+            self._gc_cursor = now
+
+    def _schedule_age_out(self, age_out):
+        """Updates the age out cursor and watermark when an indicator is
+        set to age out before the next scheduled expiration.
+        """
+        if self._age_out_cursor is not None and \
+           age_out <= self._age_out_cursor:
+            self._age_out_cursor = age_out-1
+
+        if self._next_age_out is not None and age_out < self._next_age_out:
+            self._next_age_out = age_out
+
+    def _conditional_headers(self, url, now):
+        """Returns the headers for a conditional request to url, empty if
+        a full poll should be performed.
+        """
+        self._conditional_current = None
+        self._conditional_candidate = None
+
+        if not self.conditional_polling:
+            return {}
+
+        if self.last_successful_run is None:
+            return {}
+
+        if now-self.last_successful_run > self.conditional_max_age*1000:
+            return {}
+
+        # URLs could contain credentials, only the hash is saved
+        cstate = self.conditional_state
+        if cstate is None or cstate.get('url', None) != _url_hash(url):
+            return {}
+
+        self._conditional_current = cstate
+
+        headers = {}
+        if cstate.get('etag', None) is not None:
+            headers['If-None-Match'] = cstate['etag']
+        if cstate.get('last_modified', None) is not None:
+            headers['If-Modified-Since'] = cstate['last_modified']
+
+        return headers
+
+    def _conditional_hash_content(self):
+        """Returns True if the content of the response should be loaded
+        and passed to _conditional_unchanged.
+        """
+        return self.conditional_polling and self.conditional_content_hash
+
+    def _conditional_unchanged(self, url, response, content=None):
+        """Checks if the source did not change since the last successful
+        poll. Otherwise validators and hash of content are saved at the end
+        of the poll.
+
+        Args:
+            url (str): URL of the request
+            response: requests response to the request
+            content (str): content of the response, if available
+        """
+        if not self.conditional_polling:
+            return False
+
+        current = self._conditional_current
+
+        if response.status_code == 304 and current is not None:
+            LOG.info('%s - source not modified', self.name)
+            self.statistics['poll.not_modified'] += 1
+            return True
+
+        content_hash = None
+        if content is not None:
+            content_hash = hashlib.sha1(content).hexdigest()
+
+            if current is not None and \
+               current.get('content_hash', None) == content_hash:
+                LOG.info('%s - source content unchanged', self.name)
+                self.statistics['poll.unchanged'] += 1
+                return True
+
+        self._conditional_candidate = {
+            'url': _url_hash(url),
+            'etag': response.headers.get('etag', None),
+            'last_modified': response.headers.get('last-modified', None),
+            'content_hash': content_hash
+        }
+
+        return False
+
+    def _http_session(self):
+        """Returns the requests session shared by the polls of the node.
+        Connections to the source are kept open and reused across polls.
+        """
+        if self._session is None:
+            adapter = requests.adapters.HTTPAdapter(
+                pool_maxsize=self.fetch_concurrency
+            )
+
+            self._session = requests.Session()
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+
+        return self._session
+
+    def _reset_http_session(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _fetch_pages(self, fetch, pages):
+        """Calls fetch on each page with up to fetch_concurrency requests
+        in flight, and yields the results in the order of pages.
+
+        Args:
+            fetch (callable): function retrieving a page
+            pages (iterable): pages to retrieve
+        """
+        glets = collections.deque()
+
+        try:
+            for page in pages:
+                glets.append(gevent.spawn(fetch, page))
+                if len(glets) >= self.fetch_concurrency:
+                    yield glets.popleft().get()
+
+            while len(glets) != 0:
+                yield glets.popleft().get()
+
+        finally:
+            gevent.killall(list(glets))
 
     def _compare_attributes(self, oa, na):
         for k in na:
@@ -578,98 +880,124 @@ class BasePollerFT(base.BaseFT):
             process_item = self._aggregate_process_item
             iterator = self.agg_table.query(include_value=True)
 
-        for nitem, item in enumerate(iterator):
-            if nitem != 0 and nitem % 1024 == 0:
-                gevent.sleep(0.001)
-
-            with self.state_lock:
-                if self.state != ft_states.STARTED:
-                    break
+        with self.table.batch():
+            for nitem, item in enumerate(iterator):
+                if nitem != 0 and nitem % 1024 == 0:
+                    gevent.sleep(0.001)
 
-                try:
-                    ipairs = process_item(item)
+                with self.state_lock:
+                    if self.state != ft_states.STARTED:
+                        break
 
-                except gevent.GreenletExit:
-                    raise
+                    try:
+                        ipairs = process_item(item)
 
-                except:
-                    self.statistics['error.parsing'] += 1
-                    LOG.exception('%s - Exception parsing %s', self.name, item)
-                    continue
+                    except gevent.GreenletExit:
+                        raise
 
-                for indicator, attributes in ipairs:
-                    if indicator is None:
-                        LOG.debug('%s - indicator is None for item %s',
-                                  self.name, item)
+                    except:
+                        self.statistics['error.parsing'] += 1
+                        LOG.exception('%s - Exception parsing %s', self.name, item)
                         continue
 
-                    in_feed_threshold = self.last_successful_run
-                    if in_feed_threshold is None:
-                        in_feed_threshold = now - self.interval*1000
-
-                    istatus = IndicatorStatus(
-                        indicator=indicator,
-                        attributes=attributes,
-                        itable=self.table,
-                        now=now,
-                        in_feed_threshold=in_feed_threshold
-                    )
-
-                    if istatus.state in [IndicatorStatus.NX,
-                                         IndicatorStatus.NFNANW,
-                                         IndicatorStatus.NFXANW,
-                                         IndicatorStatus.NFXAXW,
-                                         IndicatorStatus.NFNAXW]:
-                        v = copy.copy(self.attributes)
-                        v['sources'] = [self.source_name]
-                        v['last_seen'] = now
-                        v['first_seen'] = now
-                        v['_last_run'] = now
-                        v.update(attributes)
-                        v['_age_out'] = self._calc_age_out(indicator, v)
-
-                        self.statistics['added'] += 1
-                        self.table.put(indicator, v)
-                        self._controlled_emit_update(indicator, v)
-
-                        LOG.debug('%s - added %s %s', self.name, indicator, v)
-
-                    elif istatus.state == IndicatorStatus.XFNANW:
-                        v = istatus.cv
-
-                        eq = self._compare_attributes(v, attributes)
-
-                        old_last_run = v['_last_run']
-                        v['_last_run'] = now
-
-                        v = self._update_attributes(
-                            v, attributes,
-                            old_last_run, now
+                    for indicator, attributes in ipairs:
+                        if indicator is None:
+                            LOG.debug('%s - indicator is None for item %s',
+                                      self.name, item)
+                            continue
+
+                        in_feed_threshold = self.last_successful_run
+                        if in_feed_threshold is None:
+                            in_feed_threshold = now - self.interval*1000
+
+                        istatus = IndicatorStatus(
+                            indicator=indicator,
+                            attributes=attributes,
+                            itable=self.table,
+                            now=now,
+                            in_feed_threshold=in_feed_threshold
                         )
 
-                        v['_age_out'] = self._calc_age_out(indicator, v)
-
-                        self.table.put(indicator, v)
-
-                        if not eq:
+                        if istatus.state in [IndicatorStatus.NX,
+                                             IndicatorStatus.NFNANW,
+                                             IndicatorStatus.NFXANW,
+                                             IndicatorStatus.NFXAXW,
+                                             IndicatorStatus.NFNAXW]:
+                            v = copy.copy(self.attributes)
+                            v['sources'] = [self.source_name]
+                            v['last_seen'] = now
+                            v['first_seen'] = now
+                            v.update(attributes)
+                            v['_age_out'] = self._calc_age_out(indicator, v)
+                            self._schedule_age_out(v['_age_out'])
+
+                            self.statistics['added'] += 1
+                            self.table.put(indicator, v)
+                            self.table.set_last_run(
+                                indicator, v.get('type', None), now
+                            )
                             self._controlled_emit_update(indicator, v)
 
-                    elif istatus.state == IndicatorStatus.XFXANW:
-                        v = istatus.cv
-                        v['_last_run'] = now
-                        self.table.put(indicator, v)
-
-                    elif istatus.state in [IndicatorStatus.XFXAXW,
-                                           IndicatorStatus.XFNAXW]:
-                        v = istatus.cv
-                        v['_last_run'] = now
-                        v['_withdrawn'] = now
-                        self.table.put(indicator, v)
-
-                    else:
-                        LOG.error('%s - indicator state unhandled: %s',
-                                  self.name, istatus.state)
-                        continue
+                            LOG.debug('%s - added %s %s', self.name, indicator, v)
+
+                        elif istatus.state == IndicatorStatus.XFNANW:
+                            v = istatus.cv
+
+                            eq = self._compare_attributes(v, attributes)
+
+                            # _update_attributes only touches the new
+                            # attributes, but could update lists in place
+                            ov = None
+                            if eq:
+                                ov = dict(
+                                    (k, copy.copy(v.get(k, None)))
+                                    for k in attributes
+                                )
+                                ov['_age_out'] = v.get('_age_out', None)
+
+                            v = self._update_attributes(
+                                v, attributes,
+                                istatus.last_run, now
+                            )
+
+                            v['_age_out'] = self._calc_age_out(indicator, v)
+                            self._schedule_age_out(v['_age_out'])
+
+                            # value is rewritten only if changed
+                            changed = ov is None or any(
+                                v.get(k, None) != ov[k] for k in ov
+                            )
+                            if changed:
+                                self.table.put(indicator, v)
+                            else:
+                                self.statistics['unchanged'] += 1
+
+                            self.table.set_last_run(
+                                indicator, v.get('type', None), now
+                            )
+
+                            if not eq:
+                                self._controlled_emit_update(indicator, v)
+
+                        elif istatus.state == IndicatorStatus.XFXANW:
+                            v = istatus.cv
+                            self.table.set_last_run(
+                                indicator, v.get('type', None), now
+                            )
+
+                        elif istatus.state in [IndicatorStatus.XFXAXW,
+                                               IndicatorStatus.XFNAXW]:
+                            v = istatus.cv
+                            v['_withdrawn'] = now
+                            self.table.put(indicator, v)
+                            self.table.set_last_run(
+                                indicator, v.get('type', None), now
+                            )
+
+                        else:
+                            LOG.error('%s - indicator state unhandled: %s',
+                                      self.name, istatus.state)
+                            continue
 
         if self.agg_table is not None:
             iterator.close()
@@ -701,6 +1029,8 @@ class BasePollerFT(base.BaseFT):
                 performed = self._polling_loop()
                 if performed:
                     self.last_successful_run = lastrun
+                    if self._conditional_candidate is not None:
+                        self.conditional_state = self._conditional_candidate
 
                 _result = 'SUCCESS'
                 break
@@ -874,6 +1204,9 @@ class BasePollerFT(base.BaseFT):
         result = super(BasePollerFT, self).mgmtbus_status()
         result['last_run'] = self.last_run
         result['last_successful_run'] = self.last_successful_run
+        result['age_out_rate'] = self.age_out_rate
+        if self.table is not None:
+            result['indexes'] = self.table.index_stats
         result['sub_state'] = self.sub_state[0]
 
         if self.sub_state[1] is not None:
@@ -883,8 +1216,12 @@ class BasePollerFT(base.BaseFT):
 
     def mgmtbus_signal(self, source=None, signal=None, **kwargs):
         if signal != 'flush':
-            raise NotImplementedError('Unknown signal {}'.format(signal))
-            
+            return super(BasePollerFT, self).mgmtbus_signal(
+                source=source,
+                signal=signal,
+                **kwargs
+            )
+
         self._actor_queue.put(
             (utc_millisec(), 'flush')
         )
@@ -909,6 +1246,7 @@ class BasePollerFT(base.BaseFT):
 
     def hup(self, source=None):
         LOG.info('%s - hup received, force polling', self.name)
+        self._reset_http_session()
         self.poll_event.set()
 
     def length(self, source=None):
@@ -942,6 +1280,7 @@ class BasePollerFT(base.BaseFT):
         self._poll_glet.kill()
         self._age_out_glet.kill()
 
+        self._reset_http_session()
         self.table.close()
 
         LOG.info("%s - # indicators: %d", self.name, self.table.length())
@@ -2,3 +2,4 @@ from .BoolExprParser import BoolExprParser  # noqa
 from .BoolExprLexer import BoolExprLexer  # noqa
 from .BoolExprListener import BoolExprListener  # noqa
 from .interface import Condition  # noqa
+from .interface import load_cache, save_cache  # noqa
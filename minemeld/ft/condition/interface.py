@@ -16,6 +16,7 @@ import jmespath
 import logging
 import antlr4
 import operator
+import ujson
 
 from .BoolExprParser import BoolExprParser  # noqa
 from .BoolExprLexer import BoolExprLexer  # noqa
@@ -24,6 +25,19 @@ from .BoolExprListener import BoolExprListener  # noqa
 
 LOG = logging.getLogger(__name__)
 
+_COMPARATORS = {
+    '==': operator.eq,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '!=': operator.ne
+}
+
+# parsed conditions by condition string, shared by all the nodes
+# in the process. Parsed expressions are immutable
+_CACHE = {}
+
 
 class _BECompiler(BoolExprListener):
     def exitExpression(self, ctx):
@@ -31,18 +45,8 @@ class _BECompiler(BoolExprListener):
 
     def exitComparator(self, ctx):
         comparator = ctx.getText()
-        if comparator == '==':
-            self.comparator = operator.eq
-        elif comparator == '<':
-            self.comparator = operator.lt
-        elif comparator == '<=':
-            self.comparator = operator.le
-        elif comparator == '>':
-            self.comparator = operator.gt
-        elif comparator == '>=':
-            self.comparator = operator.ge
-        elif comparator == '!=':
-            self.comparator = operator.ne
+        if comparator in _COMPARATORS:
+            self.comparator = _COMPARATORS[comparator]
 
     def exitValue(self, ctx):
         if ctx.STRING() is not None:
@@ -57,9 +61,56 @@ class _BECompiler(BoolExprListener):
             self.value = True
 
 
+def load_cache(path):
+    """Loads parsed conditions saved with save_cache.
+
+    Returns:
+        number of conditions loaded
+    """
+    try:
+        with open(path, 'r') as f:
+            entries = ujson.load(f)
+
+    except (IOError, ValueError) as e:
+        LOG.info('Condition cache %s not loaded: %s', path, str(e))
+        return 0
+
+    num_loaded = 0
+    for s, (expression, comparator, value) in entries.iteritems():
+        if comparator not in _COMPARATORS:
+            continue
+
+        try:
+            expression = jmespath.compile(expression)
+        except jmespath.exceptions.JMESPathError:
+            continue
+
+        _CACHE[s] = (expression, _COMPARATORS[comparator], value)
+        num_loaded += 1
+
+    return num_loaded
+
+
+def save_cache(path):
+    """Saves the parsed conditions to path."""
+    symbols = {v: k for k, v in _COMPARATORS.iteritems()}
+
+    entries = {}
+    for s, (expression, comparator, value) in _CACHE.iteritems():
+        entries[s] = [expression.expression, symbols[comparator], value]
+
+    with open(path, 'w') as f:
+        ujson.dump(entries, f)
+
+
 class Condition(object):
     def __init__(self, s):
-        self.expression, self.comparator, self.value = self._parse_boolexpr(s)
+        parsed = _CACHE.get(s, None)
+        if parsed is None:
+            parsed = self._parse_boolexpr(s)
+            _CACHE[s] = parsed
+
+        self.expression, self.comparator, self.value = parsed
 
     def _parse_boolexpr(self, s):
         lexer = BoolExprLexer(
@@ -75,6 +126,16 @@ class Condition(object):
 
         return eb.expression, eb.comparator, eb.value
 
+    def field(self):
+        """Returns the name of the attribute if the expression is a simple
+        attribute lookup, None otherwise.
+        """
+        parsed = self.expression.parsed
+        if parsed['type'] != 'field':
+            return None
+
+        return parsed['value']
+
     def eval(self, i):
         try:
             r = self.expression.search(i)
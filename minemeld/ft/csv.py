@@ -19,6 +19,7 @@ feeds over HTTP/HTTPS.
 
 from __future__ import absolute_import
 
+import io
 import logging
 import re
 import itertools
@@ -105,9 +106,10 @@ class CSVFT(basepoller.BasePollerFT):
         return r.prepare()
 
     def _build_iterator(self, now):
-        _session = requests.Session()
+        _session = self._http_session()
 
         prepreq = self._build_request(now)
+        prepreq.headers.update(self._conditional_headers(prepreq.url, now))
 
         # this is to honour the proxy environment variables
         rkwargs = _session.merge_environment_settings(
@@ -127,10 +129,22 @@ class CSVFT(basepoller.BasePollerFT):
             raise
 
         response = r.raw
+        if self._conditional_hash_content():
+            content = r.content
+            if self._conditional_unchanged(prepreq.url, r, content=content):
+                r.close()
+                return None
+
+            response = io.BytesIO(content)
+
+        elif self._conditional_unchanged(prepreq.url, r):
+            r.close()
+            return None
+
         if self.ignore_regex is not None:
             response = itertools.ifilter(
                 lambda x: self.ignore_regex.match(x) is None,
-                r.raw
+                response
             )
 
         csvreader = csv.DictReader(
@@ -175,16 +175,17 @@ class HttpFT(basepoller.BasePollerFT):
             timeout=self.polling_timeout
         )
 
+        headers = self._conditional_headers(self.url, now)
+
         if self.user_agent is not None:
             if self.user_agent == 'MineMeld':
-                rkwargs['headers'] = {
-                    'User-Agent': 'MineMeld/%s' % MM_VERSION
-                }
+                headers['User-Agent'] = 'MineMeld/%s' % MM_VERSION
 
             else:
-                rkwargs['headers'] = {
-                    'User-Agent': self.user_agent
-                }
+                headers['User-Agent'] = self.user_agent
+
+        if headers:
+            rkwargs['headers'] = headers
 
         r = requests.get(
             self.url,
@@ -198,6 +199,14 @@ class HttpFT(basepoller.BasePollerFT):
                       self.name, r.status_code, r.content)
             raise
 
+        content = None
+        if self._conditional_hash_content():
+            content = r.content
+
+        if self._conditional_unchanged(self.url, r, content=content):
+            r.close()
+            return None
+
         result = r.iter_lines()
         if self.ignore_regex is not None:
             result = itertools.ifilter(
@@ -16,6 +16,10 @@ import logging
 import netaddr
 import uuid
 import shutil
+import bisect
+
+import gevent
+import gevent.lock
 
 from . import base
 from . import actorbase
@@ -30,48 +34,112 @@ WL_LEVEL = st.MAX_LEVEL
 
 
 class MWUpdate(object):
-    def __init__(self, start, end, uuids):
+    def __init__(self, start, end, uuids, version=4):
         self.start = start
         self.end = end
         self.uuids = set(uuids)
+        self.version = version
 
-        s = netaddr.IPAddress(start)
-        e = netaddr.IPAddress(end)
-        self._indicator = '%s-%s' % (s, e)
+        self._indicator = None
 
     def indicator(self):
+        if self._indicator is None:
+            s = netaddr.IPAddress(self.start, self.version)
+            e = netaddr.IPAddress(self.end, self.version)
+            self._indicator = '%s-%s' % (s, e)
+
         return self._indicator
 
     def __repr__(self):
-        return 'MWUpdate('+self._indicator+', %r)' % self.uuids
+        return 'MWUpdate('+self.indicator()+', %r)' % self.uuids
 
     def __hash__(self):
-        return hash(self._indicator)
+        return hash((self.start, self.end))
 
     def __eq__(self, other):
         return self.start == other.start and \
             self.end == other.end
 
 
+class _DirtyRanges(object):
+    """Sorted list of disjoint endpoint intervals touched by deferred
+    updates. For each interval the IP ranges before the first change
+    and the list of changed address zones are kept.
+    """
+    def __init__(self):
+        self.lowers = []
+        self.intervals = []
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def overlapping(self, lower, upper):
+        idx = bisect.bisect_right(self.lowers, upper)
+        result = []
+        while idx > 0:
+            interval = self.intervals[idx-1]
+            if interval[1] < lower:
+                break
+            result.append(idx-1)
+            idx -= 1
+        result.reverse()
+
+        return result
+
+    def replace(self, idxs, lower, upper, ranges, zones):
+        for idx in reversed(idxs):
+            del self.lowers[idx]
+            del self.intervals[idx]
+
+        idx = bisect.bisect_left(self.lowers, lower)
+        self.lowers.insert(idx, lower)
+        self.intervals.insert(idx, (lower, upper, ranges, zones))
+
+
 class AggregateIPv4FT(actorbase.ActorBaseFT):
+    _INDICATOR_TYPE = 'IPv4'
+    _IP_VERSION = 4
+    _EP_SIZE = 32
+
     def __init__(self, name, chassis, config):
         self.active_requests = []
 
+        self._dirty_ranges = _DirtyRanges()
+        self._touched_uuids = set()
+        self._withdrawn_values = {}
+        self._pending_recomputations = 0
+        self._pending_recomputed = 0
+        self._flush_glet = None
+        self._flush_lock = gevent.lock.Semaphore()
+
         super(AggregateIPv4FT, self).__init__(name, chassis, config)
 
     def configure(self):
         super(AggregateIPv4FT, self).configure()
 
         self.whitelist_prefixes = self.config.get('whitelist_prefixes', [])
+        self.table_cache_size = self.config.get('table_cache_size', 0)
+        self.st_in_memory = self.config.get('st_in_memory', True)
+        self.aggregation_window = self.config.get('aggregation_window', 0)
 
     def _initialize_tables(self, truncate=False):
         self.table = table.Table(
             self.name,
             bloom_filter_bits=10,
-            truncate=truncate
+            truncate=truncate,
+            cache_size=self.table_cache_size,
+            statistics=self.statistics
         )
         self.table.create_index('_id')
-        self.st = st.ST(self.name+'_st', 32, truncate=truncate)
+        self.st = st.ST(
+            self.name+'_st',
+            self._EP_SIZE,
+            truncate=truncate,
+            in_memory=self.st_in_memory
+        )
 
     def initialize(self):
         self._initialize_tables()
@@ -85,11 +153,14 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
     def _indicator_key(self, indicator, source):
         return indicator+'\x00'+source
 
-    def _calc_indicator_value(self, uuids, additional_uuid=None, additional_value=None):
+    def _calc_indicator_value(self, uuids, additional_uuid=None,
+                              additional_value=None, values=None):
         mv = {'sources': []}
         for uuid_ in uuids:
             if uuid_ == additional_uuid:
                 v = additional_value
+            elif values is not None and uuid_ in values:
+                v = values[uuid_]
             else:
                 # uuid_ = str(uuid.UUID(bytes=uuid_))
                 k, v = next(
@@ -99,6 +170,8 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
                 )
                 if k is None:
                     LOG.error("Unable to find key associated with uuid: %s", uuid_)
+                if values is not None:
+                    values[uuid_] = v
 
             for vk in v:
                 if vk in mv and vk in RESERVED_ATTRIBUTES:
@@ -189,7 +262,7 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
                         LOG.debug('start: %s %s %s',
                                   oep, epaddr-1, live_ids)
                         result.add(MWUpdate(oep, epaddr-1,
-                                            live_ids))
+                                            live_ids, self._IP_VERSION))
 
                 oep = epaddr
                 oeplevel = eplevel
@@ -199,7 +272,8 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
                 if oep is not None and len(live_ids) != 0:
                     if eplevel < WL_LEVEL:
                         LOG.debug('end: %s %s %s', oep, epaddr, live_ids)
-                        result.add(MWUpdate(oep, epaddr, live_ids))
+                        result.add(MWUpdate(oep, epaddr, live_ids,
+                                            self._IP_VERSION))
 
                 oep = epaddr+1
                 oeplevel = eplevel
@@ -208,23 +282,34 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
         return result
 
     def _range_from_indicator(self, indicator):
-        if '-' in indicator:
-            start, end = map(
-                lambda x: int(netaddr.IPAddress(x)),
-                indicator.split('-', 1)
-            )
-        elif '/' in indicator:
-            ipnet = netaddr.IPNetwork(indicator)
-            start = int(ipnet.ip)
-            end = start+ipnet.size-1
-        else:
-            start = int(netaddr.IPAddress(indicator))
-            end = start
-
-        if (not (start >= 0 and start <= 0xFFFFFFFF)) or \
-           (not (end >= 0 and end <= 0xFFFFFFFF)):
-            LOG.error('%s - {%s} invalid IPv4 indicator',
-                      self.name, indicator)
+        try:
+            if '-' in indicator:
+                start, end = map(
+                    lambda x: netaddr.IPAddress(x),
+                    indicator.split('-', 1)
+                )
+                version = start.version if start.version == end.version \
+                    else None
+                start, end = int(start), int(end)
+            elif '/' in indicator:
+                ipnet = netaddr.IPNetwork(indicator)
+                version = ipnet.version
+                start = int(ipnet.ip)
+                end = start+ipnet.size-1
+            else:
+                start = netaddr.IPAddress(indicator)
+                version = start.version
+                start = int(start)
+                end = start
+
+        except (netaddr.AddrFormatError, ValueError):
+            version = None
+
+        if version != self._IP_VERSION or \
+           (not (start >= 0 and start <= self.st.max_endpoint)) or \
+           (not (end >= 0 and end <= self.st.max_endpoint)):
+            LOG.error('%s - {%s} invalid %s indicator',
+                      self.name, indicator, self._INDICATOR_TYPE)
             return None, None
 
         return start, end
@@ -255,7 +340,7 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
     @base._counting('update.processed')
     def filtered_update(self, source=None, indicator=None, value=None):
         vtype = value.get('type', None)
-        if vtype != 'IPv4':
+        if vtype != self._INDICATOR_TYPE:
             self.statistics['update.ignored'] += 1
             return
 
@@ -276,6 +361,17 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
 
         rangestart, rangestop = self._endpoints_from_range(start, end)
 
+        if self.aggregation_window:
+            self._defer_ranges(rangestart, rangestop)
+            if not newindicator and level != WL_LEVEL:
+                self._pending_recomputations += 1
+                self._touched_uuids.add(v['_id'])
+                return
+
+            self._pending_recomputations += 2
+            self.st.put(v['_id'], start, end, level=level)
+            return
+
         rangesb = set(self._calc_ipranges(rangestart, rangestop))
         LOG.debug('%s - ranges before update: %s', self.name, rangesb)
 
@@ -324,7 +420,7 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
     def filtered_withdraw(self, source=None, indicator=None, value=None):
         LOG.debug("%s - withdraw from %s - %s", self.name, source, indicator)
 
-        if value is not None and value.get('type', None) != 'IPv4':
+        if value is not None and value.get('type', None) != self._INDICATOR_TYPE:
             self.statistics['withdraw.ignored'] += 1
             return
 
@@ -350,6 +446,13 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
 
         rangestart, rangestop = self._endpoints_from_range(start, end)
 
+        if self.aggregation_window:
+            self._defer_ranges(rangestart, rangestop)
+            self._pending_recomputations += 2
+            self._withdrawn_values[v['_id']] = v
+            self.st.delete(v['_id'], start, end, level=level)
+            return
+
         rangesb = set(self._calc_ipranges(rangestart, rangestop))
         LOG.debug("ranges before: %s", rangesb)
 
@@ -390,11 +493,152 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
                 )
             )
 
+    def _defer_ranges(self, rangestart, rangestop):
+        # ranges changed by the update are inside [rangestart, rangestop],
+        # the ranges before the update are computed on a window one
+        # endpoint larger to get all the ranges overlapping it
+        lower, upper = 0, self.st.max_endpoint
+        if rangestart is None:
+            rangestart = 0
+        elif rangestart > 0:
+            lower = next(
+                self.st.query_endpoints(start=0, stop=rangestart-1,
+                                        reverse=True),
+                (0,)
+            )[0]
+        if rangestop is None:
+            rangestop = self.st.max_endpoint
+        elif rangestop < self.st.max_endpoint:
+            upper = next(
+                self.st.query_endpoints(start=rangestop+1,
+                                        stop=self.st.max_endpoint),
+                (self.st.max_endpoint,)
+            )[0]
+        zone = (rangestart, rangestop)
+
+        idxs = self._dirty_ranges.overlapping(lower, upper)
+        if len(idxs) == 1:
+            ilower, iupper, _, zones = self._dirty_ranges.intervals[idxs[0]]
+            if ilower <= lower and upper <= iupper:
+                # the ranges before the change are already known
+                zones.append(zone)
+                self._schedule_flush()
+                return
+
+        # ranges overlapping a zone already changed in this batch
+        # could be different now, their original version is already
+        # recorded
+        ranges = set()
+        zones = []
+        for idx in idxs:
+            ilower, iupper, iranges, izones = \
+                self._dirty_ranges.intervals[idx]
+            ranges |= iranges
+            zones.extend(izones)
+
+        self._pending_recomputed += 1
+        for u in self._calc_ipranges(lower, upper):
+            changed = False
+            for zstart, zend in zones:
+                if u.start <= zend and zstart <= u.end:
+                    changed = True
+                    break
+            if not changed:
+                ranges.add(u)
+
+        if len(idxs) != 0:
+            lower = min(lower, self._dirty_ranges.intervals[idxs[0]][0])
+            upper = max(upper, self._dirty_ranges.intervals[idxs[-1]][1])
+        zones.append(zone)
+
+        self._dirty_ranges.replace(idxs, lower, upper, ranges, zones)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_glet is not None:
+            return
+
+        self._flush_glet = gevent.spawn_later(
+            self.aggregation_window,
+            self._flush_ranges
+        )
+
+    def _flush_ranges(self):
+        with self._flush_lock:
+            if self._flush_glet is not None and \
+               self._flush_glet is not gevent.getcurrent():
+                self._flush_glet.kill()
+            self._flush_glet = None
+
+            dirty_ranges, self._dirty_ranges = \
+                self._dirty_ranges, _DirtyRanges()
+            touched, self._touched_uuids = self._touched_uuids, set()
+            values, self._withdrawn_values = self._withdrawn_values, {}
+            recomputations, self._pending_recomputations = \
+                self._pending_recomputations, 0
+            recomputed, self._pending_recomputed = \
+                self._pending_recomputed, 0
+
+            if len(dirty_ranges) == 0:
+                return
+
+            # messages are computed before emitting, emit can yield
+            # and updates received meanwhile go to the next batch
+            messages = []
+            for lower, upper, rangesb, _ in dirty_ranges:
+                rangesa = set(self._calc_ipranges(lower, upper))
+                recomputed += 1
+
+                added = rangesa-rangesb
+                removed = rangesb-rangesa
+
+                for u in added:
+                    messages.append((
+                        'update',
+                        u.indicator(),
+                        self._calc_indicator_value(u.uuids, values=values)
+                    ))
+
+                oranges = dict((ou, ou) for ou in rangesb)
+                for u in rangesa - added:
+                    ou = oranges[u]
+                    if len(u.uuids ^ ou.uuids) != 0 or \
+                       len(u.uuids & touched) != 0:
+                        messages.append((
+                            'update',
+                            u.indicator(),
+                            self._calc_indicator_value(u.uuids,
+                                                       values=values)
+                        ))
+
+                for u in removed:
+                    messages.append((
+                        'withdraw',
+                        u.indicator(),
+                        self._calc_indicator_value(u.uuids, values=values)
+                    ))
+
+            self.statistics['ranges.recomputed'] += recomputed
+            self.statistics['ranges.recomputations_saved'] += \
+                max(recomputations - recomputed, 0)
+            LOG.debug('%s - flushing %d ranges', self.name, len(messages))
+
+            for method, indicator, value in messages:
+                if method == 'update':
+                    self.emit_update(indicator, value)
+                else:
+                    self.emit_withdraw(indicator, value=value)
+
+    def emit_checkpoint(self, value):
+        self._flush_ranges()
+
+        super(AggregateIPv4FT, self).emit_checkpoint(value)
+
     def _send_indicators(self, source=None, from_key=None, to_key=None):
         if from_key is None:
             from_key = 0
         if to_key is None:
-            to_key = 0xFFFFFFFF
+            to_key = self.st.max_endpoint
 
         result = self._calc_ipranges(from_key, to_key)
         for u in result:
@@ -409,7 +653,7 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
         if not type(indicator) in [str, unicode]:
             raise ValueError("Invalid indicator type")
 
-        indicator = int(netaddr.IPAddress(indicator))
+        indicator = int(netaddr.IPAddress(indicator, self._IP_VERSION))
 
         result = self._calc_ipranges(indicator, indicator)
         if len(result) == 0:
@@ -426,9 +670,9 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
         if index is not None:
             raise ValueError('Index not found')
         if from_key is not None:
-            from_key = int(netaddr.IPAddress(from_key))
+            from_key = int(netaddr.IPAddress(from_key, self._IP_VERSION))
         if to_key is not None:
-            to_key = int(netaddr.IPAddress(to_key))
+            to_key = int(netaddr.IPAddress(to_key, self._IP_VERSION))
 
         self._send_indicators(
             source=source,
@@ -442,6 +686,8 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
         return self.table.num_indicators
 
     def stop(self):
+        self._flush_ranges()
+
         super(AggregateIPv4FT, self).stop()
 
         for g in self.active_requests:
@@ -458,3 +704,14 @@ class AggregateIPv4FT(actorbase.ActorBaseFT):
 
         shutil.rmtree(name, ignore_errors=True)
         shutil.rmtree('{}_st'.format(name), ignore_errors=True)
+
+
+class AggregateIPv6FT(AggregateIPv4FT):
+    """Aggregates IPv6 indicators, same semantics as AggregateIPv4FT.
+
+    Endpoints are 128 bit wide, the segment tree stores them as
+    2 64-bit words.
+    """
+    _INDICATOR_TYPE = 'IPv6'
+    _IP_VERSION = 6
+    _EP_SIZE = 128
@@ -17,14 +17,58 @@ This module implements minemeld.ft.json.SimpleJSON, the Miner node for JSON
 feeds over HTTP/HTTPS.
 """
 
+import re
+import decimal
 import requests
 import logging
 import jmespath
 
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    import ijson
+
 from . import basepoller
 
 LOG = logging.getLogger(__name__)
 
+# extractors like items[*], data.items[] or @
+_SIMPLE_EXTRACTOR = re.compile(
+    r'^(?:@|(?P<path>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)'
+    r'(?:\[\*\]|\[\]))$'
+)
+
+
+def _extractor_prefix(extractor):
+    """Translates a simple JMESPath extractor selecting the elements of an
+    array into the equivalent ijson prefix. Returns None for all the
+    other expressions.
+    """
+    m = _SIMPLE_EXTRACTOR.match(extractor.strip())
+    if m is None:
+        return None
+
+    path = m.group('path')
+    if path is None:
+        return 'item'
+
+    return path+'.item'
+
+
+def _decimal_to_float(o):
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+
+    if isinstance(o, dict):
+        for k, v in o.iteritems():
+            o[k] = _decimal_to_float(v)
+
+    elif isinstance(o, list):
+        for j, v in enumerate(o):
+            o[j] = _decimal_to_float(v)
+
+    return o
+
 
 class SimpleJSON(basepoller.BasePollerFT):
     """Implements class for miners of JSON feeds over http/https.
@@ -41,6 +85,12 @@ class SimpleJSON(basepoller.BasePollerFT):
         :fields: list of JSON attributes to include in the indicator value.
             If *null* no additional attributes are extracted. Default: *null*
         :prefix: prefix to add to field names. Default: json
+        :streaming: boolean, if *true* the feed is parsed incrementally and
+            items are processed as they are found, keeping memory usage
+            independent of the feed size. Supported only when the
+            extractor selects the elements of an array, like *items[*]*
+            or *data.items[*]*, for other extractors the whole document
+            is loaded. Default: *false*
 
     Example:
         Example config in YAML::
@@ -70,6 +120,17 @@ class SimpleJSON(basepoller.BasePollerFT):
         self.prefix = self.config.get('prefix', 'json')
         self.fields = self.config.get('fields', None)
 
+        self.streaming_prefix = None
+        if self.config.get('streaming', False):
+            self.streaming_prefix = _extractor_prefix(
+                self.config.get('extractor', '@')
+            )
+            if self.streaming_prefix is None:
+                LOG.info(
+                    '%s - extractor not supported in streaming mode, '
+                    'the whole document will be loaded', self.name
+                )
+
     def _process_item(self, item):
         if self.indicator not in item:
             LOG.debug('%s not in %s', self.indicator, item)
@@ -104,6 +165,10 @@ class SimpleJSON(basepoller.BasePollerFT):
             timeout=self.polling_timeout
         )
 
+        headers = self._conditional_headers(self.url, now)
+        if headers:
+            rkwargs['headers'] = headers
+
         r = requests.get(
             self.url,
             **rkwargs
@@ -116,6 +181,32 @@ class SimpleJSON(basepoller.BasePollerFT):
                       self.name, r.status_code, r.content)
             raise
 
+        if self.streaming_prefix is not None:
+            # content is not loaded, only validators are checked
+            if self._conditional_unchanged(self.url, r):
+                r.close()
+                return None
+
+            return self._stream_items(r)
+
+        content = None
+        if self._conditional_hash_content():
+            content = r.content
+
+        if self._conditional_unchanged(self.url, r, content=content):
+            r.close()
+            return None
+
         result = self.extractor.search(r.json())
 
         return result
+
+    def _stream_items(self, r):
+        r.raw.decode_content = True
+
+        try:
+            for item in ijson.items(r.raw, self.streaming_prefix):
+                yield _decimal_to_float(item)
+
+        finally:
+            r.close()
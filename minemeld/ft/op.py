@@ -37,9 +37,15 @@ class AggregateFT(actorbase.ActorBaseFT):
         super(AggregateFT, self).configure()
 
         self.whitelist_prefixes = self.config.get('whitelist_prefixes', [])
+        self.table_cache_size = self.config.get('table_cache_size', 0)
 
     def _initialize_table(self, truncate=False):
-        self.table = table.Table(self.name, truncate=truncate)
+        self.table = table.Table(
+            self.name,
+            truncate=truncate,
+            cache_size=self.table_cache_size,
+            statistics=self.statistics
+        )
 
     def initialize(self):
         self._initialize_table()
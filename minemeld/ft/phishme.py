@@ -19,7 +19,6 @@ PhishMe Intelligence API.
 
 import os
 import yaml
-import requests
 import itertools
 import logging
 
@@ -235,6 +234,30 @@ class Intelligence(basepoller.BasePollerFT):
         # update
         return self._threathq_update(now)
 
+    def _threathq_search(self, payload):
+        rkwargs = dict(
+            verify=self.verify_cert,
+            timeout=self.polling_timeout,
+            params=payload,
+            auth=(self.username, self.api_key)
+        )
+
+        r = self._http_session().post(
+            _API_BASE+_API_THREAT_SEARCH,
+            **rkwargs
+        )
+
+        try:
+            r.raise_for_status()
+        except:
+            LOG.error(
+                '%s - exception in request: %s %s',
+                self.name, r.status_code, r.content
+            )
+            raise
+
+        return r.json()
+
     def _threathq_backfill(self, now):
         payload = {
             'beginTimestamp': int(now/1000.0 - self.initial_interval),
@@ -243,58 +266,41 @@ class Intelligence(basepoller.BasePollerFT):
             'resultsPerPage': _RESULTS_PER_PAGE
         }
 
-        cur_page = 0
-        total_pages = 1
+        def _search_page(page):
+            LOG.debug('%s - polling backfill page %d', self.name, page)
+            return self._threathq_search(dict(payload, page=page))
 
-        while cur_page < total_pages:
-            LOG.debug('%s - polling backfill %d/%d', self.name, cur_page, total_pages)
+        # first page is retrieved alone to get the number of pages,
+        # the others are then retrieved in parallel
+        cjson = _search_page(0)
 
-            payload['page'] = cur_page
-
-            rkwargs = dict(
-                verify=self.verify_cert,
-                timeout=self.polling_timeout,
-                params=payload,
-                auth=(self.username, self.api_key)
-            )
+        data = cjson.get('data', None)
+        if data is None:
+            LOG.error('%s - no "data" in response', self.name)
+            return
 
-            r = requests.post(
-                _API_BASE+_API_THREAT_SEARCH,
-                **rkwargs
-            )
+        page = data.get('page', None)
+        if page is None:
+            LOG.error('%s - no "page" in response', self.name)
+            return
+        total_pages = page.get('totalPages', None)
+        if total_pages is None:
+            LOG.error('%s - no "totalPages" in response', self.name)
+            return
+        LOG.debug('%s - total_pages set to %d', self.name, total_pages)
 
-            try:
-                r.raise_for_status()
-            except:
-                LOG.error(
-                    '%s - exception in request: %s %s',
-                    self.name, r.status_code, r.content
-                )
-                raise
-
-            cjson = r.json()
+        for t in data.get('threats', []):
+            yield t
 
+        for cjson in self._fetch_pages(_search_page, xrange(1, total_pages)):
             data = cjson.get('data', None)
-            if 'data' is None:
+            if data is None:
                 LOG.error('%s - no "data" in response', self.name)
                 return
 
-            page = data.get('page', None)
-            if page is None:
-                LOG.error('%s - no "page" in response', self.name)
-                return
-            total_pages = page.get('totalPages', None)
-            if total_pages is None:
-                LOG.error('%s - no "totalPages" in response', self.name)
-                return
-            LOG.debug('%s - total_pages set to %d', self.name, total_pages)
-
-            threats = data.get('threats', [])
-            for t in threats:
+            for t in data.get('threats', []):
                 yield t
 
-            cur_page += 1
-
     def _threathq_update(self, now):
         changelog_size = 1000
         while changelog_size == 1000:
@@ -311,7 +317,7 @@ class Intelligence(basepoller.BasePollerFT):
                 auth=(self.username, self.api_key)
             )
 
-            r = requests.post(
+            r = self._http_session().post(
                 _API_BASE+_API_THREAT_UPDATE,
                 **rkwargs
             )
@@ -386,35 +392,13 @@ class Intelligence(basepoller.BasePollerFT):
             yield threatids
 
     def _retrieve_threats(self, pages):
-        for p in pages:
-            payload = {
+        def _search_threats(p):
+            return self._threathq_search({
                 'resultsPerPage': _RESULTS_PER_PAGE,
                 'threatId': p
-            }
-
-            rkwargs = dict(
-                verify=self.verify_cert,
-                timeout=self.polling_timeout,
-                params=payload,
-                auth=(self.username, self.api_key)
-            )
-
-            r = requests.post(
-                _API_BASE+_API_THREAT_SEARCH,
-                **rkwargs
-            )
-
-            try:
-                r.raise_for_status()
-            except:
-                LOG.error(
-                    '%s - exception in request: %s %s',
-                    self.name, r.status_code, r.content
-                )
-                raise
-
-            cjson = r.json()
+            })
 
+        for cjson in self._fetch_pages(_search_threats, pages):
             data = cjson.get('data', None)
             if data is None:
                 LOG.error('%s - no "data" in search request', self.name)
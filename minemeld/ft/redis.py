@@ -15,22 +15,86 @@
 from __future__ import absolute_import
 
 import logging
+import time
+
+import gevent
+import gevent.lock
 import redis
 import ujson
 
 from . import base
 from . import actorbase
+from . import ft_states
+from .utils import utc_millisec
 
 LOG = logging.getLogger(__name__)
 
+_MAX_FLUSH_BACKOFF = 60
+
+# KEYS: set, values hash - ARGV: max entries, score, indicator [, value]
+# returns 1 if added, 0 if updated, -1 if dropped because of max entries
+_ADD_SCRIPT = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[3]) and
+   redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return -1
+end
+local result = redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+if #ARGV > 3 then
+    redis.call('HSET', KEYS[2], ARGV[3], ARGV[4])
+end
+return result
+"""
+
 
 class RedisSet(actorbase.ActorBaseFT):
+    """Stores indicators in a Redis sorted set, served by the /feeds API.
+
+    Updates and withdraws are queued and written in a single pipeline
+    when *batch_size* operations are pending or *batch_interval* seconds
+    after the first pending operation. Batches failing with an error are
+    kept and retried by the flush timer, with an exponential backoff up
+    to 60 seconds. While retrying, operations over *max_pending* pending
+    operations are dropped and counted in drop.backlog. The number of
+    entries is tracked
+    locally. With *atomic_add* the max_entries check is performed by a
+    Lua script in Redis, and updates of existing entries are not
+    dropped when the set is full.
+
+    With *shadow_rebuild*, on rebuild and reset the replay from upstream
+    is written to shadow keys while the feed keeps serving the previous
+    content. The shadow keys are renamed over the feed keys when the
+    first checkpoint is received from upstream, once no operations have
+    been received for *shadow_rebuild_idle* seconds, or
+    *shadow_rebuild_timeout* seconds after start if nothing has been
+    received at all.
+
+    The feed generation counter stored at <name>.generation is
+    incremented every time the feed content changes, and is used by the
+    web tier to cache the rendered feeds.
+    """
     def __init__(self, name, chassis, config):
         self.redis_skey = name
         self.redis_skey_value = name+'.value'
         self.redis_skey_chkp = name+'.chkp'
+        self.redis_skey_generation = name+'.generation'
+        self.redis_skey_shadow = name+'.shadow'
+        self.redis_skey_value_shadow = name+'.value.shadow'
+
+        # keys the pending operations are written to
+        self._wkey = self.redis_skey
+        self._wkey_value = self.redis_skey_value
 
         self.SR = None
+        self._add_script = None
+        self._count = 0
+        self._pending = []
+        self._pending_adds = 0
+        self._flush_errors = 0
+        self._flush_glet = None
+        self._flush_lock = gevent.lock.RLock()
+        self._resync_glet = None
+        self._resync_start = None
+        self._resync_last = None
 
         super(RedisSet, self).__init__(name, chassis, config)
 
@@ -47,6 +111,16 @@ class RedisSet(actorbase.ActorBaseFT):
         )
         self.store_value = self.config.get('store_value', False)
         self.max_entries = self.config.get('max_entries', 1000 * 1000)
+        self.batch_size = max(self.config.get('batch_size', 1000), 1)
+        self.batch_interval = self.config.get('batch_interval', 1.0)
+        self.max_pending = self.config.get('max_pending', 100000)
+        self.atomic_add = self.config.get('atomic_add', False)
+        self.shadow_rebuild = self.config.get('shadow_rebuild', False)
+        self.shadow_rebuild_idle = self.config.get('shadow_rebuild_idle', 60)
+        self.shadow_rebuild_timeout = self.config.get(
+            'shadow_rebuild_timeout',
+            120
+        )
 
     def connect(self, inputs, output):
         output = False
@@ -58,6 +132,16 @@ class RedisSet(actorbase.ActorBaseFT):
 
     def create_checkpoint(self, value):
         self._connect_redis()
+        self._flush()
+
+        if self._resyncing():
+            # upstream checkpointed, the replay is completed
+            if self._resync_glet is not None:
+                self._resync_glet.kill()
+                self._resync_glet = None
+
+            self._swap()
+
         self.SR.set(self.redis_skey_chkp, value)
 
     def remove_checkpoint(self):
@@ -75,45 +159,266 @@ class RedisSet(actorbase.ActorBaseFT):
             db=self.redis_db
         )
 
+        # generations start from the current time, to avoid reusing
+        # the generations of a deleted feed with the same name
+        self.SR.setnx(self.redis_skey_generation, utc_millisec())
+
+        if self.atomic_add:
+            self._add_script = self.SR.register_script(_ADD_SCRIPT)
+
+        self._count = self.SR.zcard(self.redis_skey)
+
     def initialize(self):
         self._connect_redis()
 
     def rebuild(self):
         self._connect_redis()
-        self.SR.delete(self.redis_skey)
-        self.SR.delete(self.redis_skey_value)
+        self._clear()
 
     def reset(self):
         self._connect_redis()
-        self.SR.delete(self.redis_skey)
-        self.SR.delete(self.redis_skey_value)
+        self._clear()
 
-    def _add_indicator(self, score, indicator, value):
-        if self.length() >= self.max_entries:
-            self.statistics['drop.overflow'] += 1
+    def _clear(self):
+        self._pending = []
+        self._pending_adds = 0
+
+        if self.shadow_rebuild:
+            self._wkey = self.redis_skey_shadow
+            self._wkey_value = self.redis_skey_value_shadow
+            self.SR.delete(self._wkey, self._wkey_value)
+            self._count = 0
             return
 
         with self.SR.pipeline() as p:
             p.multi()
 
-            p.zadd(self.redis_skey, score, indicator)
-            if self.store_value:
-                p.hset(self.redis_skey_value, indicator, ujson.dumps(value))
+            p.delete(self.redis_skey)
+            p.delete(self.redis_skey_value)
+            p.incr(self.redis_skey_generation)
 
-            result = p.execute()[0]
+            p.execute()
 
-        self.statistics['added'] += result
+        self._count = 0
 
-    def _delete_indicator(self, indicator):
+    def _resyncing(self):
+        return self._wkey != self.redis_skey
+
+    def _swap(self):
+        with self._flush_lock:
+            if not self._resyncing():
+                return
+
+            self._flush()
+
+            with self.SR.pipeline() as p:
+                p.exists(self.redis_skey_shadow)
+                p.exists(self.redis_skey_value_shadow)
+                exists = p.execute()
+
+            with self.SR.pipeline() as p:
+                p.multi()
+
+                for shadow, key, e in [
+                        (self.redis_skey_shadow, self.redis_skey, exists[0]),
+                        (self.redis_skey_value_shadow, self.redis_skey_value,
+                         exists[1])]:
+                    # RENAME fails if the shadow key does not exist
+                    if e:
+                        p.rename(shadow, key)
+                    else:
+                        p.delete(key)
+                p.incr(self.redis_skey_generation)
+
+                p.execute()
+
+            self._wkey = self.redis_skey
+            self._wkey_value = self.redis_skey_value
+
+        LOG.info('%s - shadow rebuild completed, %d entries',
+                 self.name, self._count)
+
+    def _resync_loop(self):
+        while True:
+            now = time.time()
+            if self._resync_last is None:
+                deadline = self._resync_start+self.shadow_rebuild_timeout
+            else:
+                deadline = self._resync_last+self.shadow_rebuild_idle
+
+            if now >= deadline:
+                break
+
+            gevent.sleep(deadline-now)
+
+        # the swap should not be interrupted by stop
+        self._resync_glet = None
+
+        try:
+            self._swap()
+
+        except gevent.GreenletExit:
+            pass
+
+        except:
+            LOG.exception('%s - error completing shadow rebuild', self.name)
+            self.statistics['error.swap'] += 1
+
+            # retried after another idle period
+            if self._resyncing() and self._resync_glet is None and \
+               self.state == ft_states.STARTED:
+                self._resync_last = time.time()
+                self._resync_glet = gevent.spawn(self._resync_loop)
+
+    def _flush_timer(self):
+        try:
+            self._flush()
+
+        except gevent.GreenletExit:
+            pass
+
+        except:
+            LOG.exception('%s - error flushing pending operations', self.name)
+
+    def _flush(self):
+        glet, self._flush_glet = self._flush_glet, None
+        if glet is not None and glet is not gevent.getcurrent():
+            glet.kill(block=False)
+
+        with self._flush_lock:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if len(self._pending) == 0:
+            return
+
+        pending, self._pending = self._pending, []
+        self._pending_adds = 0
+
+        try:
+            counters, result = self._write(pending)
+
+        except:
+            # operations are put back and retried at the next flush
+            self._pending = pending+self._pending
+            self._pending_adds = sum(
+                1 for op in self._pending if op[0] == 'add'
+            )
+            self.statistics['error.flush'] += 1
+            self._flush_errors += 1
+            self._schedule_flush()
+            raise
+
+        self._flush_errors = 0
+        self._count = result[-1]
+
+        for statistic, idx in counters:
+            if result[idx] < 0:
+                self.statistics['drop.overflow'] += 1
+                continue
+
+            self.statistics[statistic] += result[idx]
+
+    def _write(self, pending):
+        # list of (statistic, result index)
+        counters = []
         with self.SR.pipeline() as p:
-            p.multi()
+            for op in pending:
+                if op[0] == 'add':
+                    _, score, indicator, value = op
+
+                    if self._add_script is not None:
+                        args = [self.max_entries, score, indicator]
+                        if self.store_value:
+                            args.append(ujson.dumps(value))
+                        self._add_script(
+                            keys=[self._wkey, self._wkey_value],
+                            args=args,
+                            client=p
+                        )
+                        counters.append(('added', len(p)-1))
+                        continue
+
+                    p.zadd(self._wkey, score, indicator)
+                    counters.append(('added', len(p)-1))
+                    if self.store_value:
+                        p.hset(
+                            self._wkey_value,
+                            indicator,
+                            ujson.dumps(value)
+                        )
+
+                else:
+                    _, indicator = op
+
+                    p.zrem(self._wkey, indicator)
+                    counters.append(('removed', len(p)-1))
+                    p.hdel(self._wkey_value, indicator)
+
+            if not self._resyncing():
+                p.incr(self.redis_skey_generation)
+            p.zcard(self._wkey)
+
+            result = p.execute()
+
+        return counters, result
+
+    def _retrying(self):
+        return self._flush_errors != 0
+
+    def _schedule_flush(self):
+        if self._flush_glet is not None:
+            return
+
+        delay = self.batch_interval
+        if self._retrying():
+            delay = min(
+                max(delay, 0.1)*(2**min(self._flush_errors, 10)),
+                _MAX_FLUSH_BACKOFF
+            )
+
+        self._flush_glet = gevent.spawn_later(delay, self._flush_timer)
+
+    def _queue(self, op):
+        self._resync_last = time.time()
 
-            p.zrem(self.redis_skey, indicator)
-            p.hdel(self.redis_skey_value, indicator)
+        if self._retrying() and len(self._pending) >= self.max_pending:
+            self.statistics['drop.backlog'] += 1
+            return
+
+        self._pending.append(op)
+        if op[0] == 'add':
+            self._pending_adds += 1
+
+        # failed batches are retried only by the timer
+        if len(self._pending) < self.batch_size or self._retrying():
+            self._schedule_flush()
+            return
+
+        try:
+            self._flush()
+
+        except gevent.GreenletExit:
+            raise
+
+        except:
+            # the operation is queued, it will be retried
+            LOG.exception('%s - error flushing pending operations', self.name)
+
+    def _add_indicator(self, score, indicator, value):
+        if self._add_script is None and \
+           self._count+self._pending_adds >= self.max_entries:
+            # pending adds could be updates, flush to get the real count
+            if not self._retrying():
+                self._flush()
+            if self._count >= self.max_entries:
+                self.statistics['drop.overflow'] += 1
+                return
 
-            result = p.execute()[0]
+        self._queue(('add', score, indicator, value))
 
-        self.statistics['removed'] += result
+    def _delete_indicator(self, indicator):
+        self._queue(('delete', indicator))
 
     @base._counting('update.processed')
     def filtered_update(self, source=None, indicator=None, value=None):
@@ -133,7 +438,30 @@ class RedisSet(actorbase.ActorBaseFT):
         self._delete_indicator(indicator)
 
     def length(self, source=None):
-        return self.SR.zcard(self.redis_skey)
+        if not self._retrying():
+            self._flush()
+        return self._count
+
+    def start(self):
+        super(RedisSet, self).start()
+
+        if self._resyncing() and self._resync_glet is None:
+            self._resync_start = time.time()
+            self._resync_last = None
+            self._resync_glet = gevent.spawn(self._resync_loop)
+
+    def stop(self):
+        super(RedisSet, self).stop()
+
+        if self._resync_glet is not None:
+            self._resync_glet.kill()
+            self._resync_glet = None
+
+        try:
+            self._flush()
+
+        except:
+            LOG.exception('%s - error flushing pending operations', self.name)
 
     @staticmethod
     def gc(name, config=None):
@@ -145,6 +473,9 @@ class RedisSet(actorbase.ActorBaseFT):
         redis_skey = name
         redis_skey_value = '{}.value'.format(name)
         redis_skey_chkp = '{}.chkp'.format(name)
+        redis_skey_generation = '{}.generation'.format(name)
+        redis_skey_shadow = '{}.shadow'.format(name)
+        redis_skey_value_shadow = '{}.value.shadow'.format(name)
         redis_host = config.get('redis_host', '127.0.0.1')
         redis_port = config.get('redis_port', 6379)
         redis_password = config.get('redis_password', None)
@@ -165,6 +496,9 @@ class RedisSet(actorbase.ActorBaseFT):
             SR.delete(redis_skey)
             SR.delete(redis_skey_value)
             SR.delete(redis_skey_chkp)
+            SR.delete(redis_skey_generation)
+            SR.delete(redis_skey_shadow)
+            SR.delete(redis_skey_value_shadow)
 
         except Exception as e:
             raise RuntimeError(str(e))
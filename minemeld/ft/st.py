@@ -22,16 +22,28 @@ Numbers are 8-bit unsigned.
 - Segment key: (1, <start>, <end>, <level>, <uuid>)
 - Endpoint key: (1, <endpoint>, <type>, <level>, <uuid>)
 
+Endpoints are stored as 64-bit unsigned MSB, or as 128-bit unsigned MSB if
+the endpoint size of the tree is greater than 64 bits.
+
 **ENDPOINT**
 
 - Type: 0: START, 1: END
+
+**IN MEMORY INDEX**
+
+If *in_memory* is True (default), segments and endpoints are also kept in
+memory and cover and query_endpoints never touch LevelDB. The in memory
+index is rebuilt from the LevelDB keys when the tree is opened and is kept
+in sync by put and delete. Differently from LevelDB iterators, the
+generators returned by cover and query_endpoints are not snapshots: the
+tree should not be modified while they are consumed.
 """
 
 import plyvel
 import struct
 import logging
 import shutil
-import array
+import bisect
 
 LOG = logging.getLogger(__name__)
 
@@ -40,9 +52,117 @@ TYPE_START = 0x00
 TYPE_END = 0x1
 
 
+class _SortedKeys(object):
+    """Sorted list of unique keys, stored in buckets of bounded size to
+    keep insertions and deletions cheap on large lists.
+    """
+    BUCKET_SIZE = 1024
+
+    def __init__(self):
+        self._buckets = []
+        self._maxes = []
+
+    def __len__(self):
+        return sum(len(b) for b in self._buckets)
+
+    def append(self, key):
+        """Appends a key greater than all the keys in the list, used
+        to load the list from sorted keys.
+        """
+        if len(self._buckets) == 0 or \
+           len(self._buckets[-1]) >= self.BUCKET_SIZE:
+            self._buckets.append([])
+            self._maxes.append(None)
+
+        self._buckets[-1].append(key)
+        self._maxes[-1] = key
+
+    def add(self, key):
+        if len(self._buckets) == 0:
+            self.append(key)
+            return
+
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            bucket = self._buckets[pos]
+            bucket.append(key)
+            self._maxes[pos] = key
+
+        else:
+            bucket = self._buckets[pos]
+            idx = bisect.bisect_left(bucket, key)
+            if bucket[idx] == key:
+                return
+            bucket.insert(idx, key)
+
+        if len(bucket) > 2*self.BUCKET_SIZE:
+            self._buckets.insert(pos+1, bucket[self.BUCKET_SIZE:])
+            self._maxes.insert(pos+1, bucket[-1])
+            del bucket[self.BUCKET_SIZE:]
+            self._maxes[pos] = bucket[-1]
+
+    def discard(self, key):
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return
+
+        bucket = self._buckets[pos]
+        idx = bisect.bisect_left(bucket, key)
+        if bucket[idx] != key:
+            return
+
+        del bucket[idx]
+        if len(bucket) == 0:
+            del self._buckets[pos]
+            del self._maxes[pos]
+        else:
+            self._maxes[pos] = bucket[-1]
+
+    def _position(self, key, right):
+        # position of the first key >= key (> key if right is True)
+        bisect_ = bisect.bisect_right if right else bisect.bisect_left
+
+        pos = bisect_(self._maxes, key)
+        if pos == len(self._maxes):
+            return (pos, 0)
+
+        return (pos, bisect_(self._buckets[pos], key))
+
+    def irange(self, start, stop, include_start=True, include_stop=True,
+               reverse=False):
+        spos = self._position(start, not include_start)
+        epos = self._position(stop, include_stop)
+
+        if not reverse:
+            bi, i = spos
+            while (bi, i) < epos:
+                bucket = self._buckets[bi]
+                last = len(bucket) if bi < epos[0] else epos[1]
+                for j in xrange(i, last):
+                    yield bucket[j]
+                bi, i = bi+1, 0
+
+            return
+
+        bi, i = epos
+        while (bi, i) > spos:
+            if i == 0:
+                bi -= 1
+                i = len(self._buckets[bi])
+                continue
+
+            bucket = self._buckets[bi]
+            first = spos[1] if bi == spos[0] else 0
+            for j in xrange(i-1, first-1, -1):
+                yield bucket[j]
+            i = first
+
+
 class ST(object):
     def __init__(self, name, epsize, truncate=False,
-                 bloom_filter_bits=10, write_buffer_size=(4 << 20)):
+                 bloom_filter_bits=10, write_buffer_size=(4 << 20),
+                 in_memory=True):
         if truncate:
             try:
                 shutil.rmtree(name)
@@ -55,82 +175,176 @@ class ST(object):
             write_buffer_size=write_buffer_size,
             bloom_filter_bits=bloom_filter_bits
         )
+        if epsize > 128:
+            raise ValueError('Endpoint size not supported: {}'.format(epsize))
         self.epsize = epsize
         self.max_endpoint = (1 << epsize)-1
+        # number of 64-bit words per endpoint in keys and values
+        self._epwords = 1 if epsize <= 64 else 2
 
         self.num_endpoints = 0
         self.num_segments = 0
 
-    def _split_interval(self, start, end, lower, upper):
-        if start <= lower and upper <= end:
-            return [(lower, upper)]
+        self.in_memory = in_memory
+        self._segments = None
+        self._endpoints = None
+        self._segment_sizes = None
+        self._cover_sizes = None
+        if self.in_memory:
+            self._load_in_memory_index()
+
+    def _load_in_memory_index(self):
+        # segment -> sorted list of (level, uuid, start, end)
+        self._segments = {}
+        self._endpoints = _SortedKeys()
+        # segment size -> number of non empty segments of that size
+        self._segment_sizes = {}
+        self._cover_sizes = []
+
+        ri = self.db.iterator(
+            start=struct.pack("B", 1),
+            stop=struct.pack("B", 2),
+            include_value=True
+        )
+        with ri:
+            for k, v in ri:
+                lower, upper, level, uuid_ = self._split_segment_key(k)
+                start, end = self._unpack_endpoints(v)
+                segments = self._segments.setdefault((lower, upper), [])
+                if len(segments) == 0:
+                    self._update_segment_sizes(upper-lower+1, 1)
+                segments.append((level, uuid_, start, end))
+                self.num_segments += 1
+
+        ri = self.db.iterator(
+            start=struct.pack("B", 2),
+            stop=struct.pack("B", 3),
+            include_value=False
+        )
+        with ri:
+            for k in ri:
+                self._endpoints.append(k)
+                self.num_endpoints += 1
+
+        LOG.info('ST loaded in memory: %d segments %d endpoints',
+                 self.num_segments, self.num_endpoints)
+
+    def _update_segment_sizes(self, size, delta):
+        count = self._segment_sizes.get(size, 0)+delta
+        if count == 0:
+            self._segment_sizes.pop(size)
+        else:
+            self._segment_sizes[size] = count
+
+        if count == 0 or count == delta:
+            self._cover_sizes = sorted(self._segment_sizes, reverse=True)
+
+    def _add_memory_segment(self, segment, level, uuid_, start, end):
+        segments = self._segments.setdefault(segment, [])
+        if len(segments) == 0:
+            self._update_segment_sizes(segment[1]-segment[0]+1, 1)
+
+        entry = (level, uuid_, start, end)
+        idx = bisect.bisect_left(segments, (level, uuid_))
+        if idx < len(segments) and segments[idx][:2] == (level, uuid_):
+            segments[idx] = entry
+            return
+
+        segments.insert(idx, entry)
+
+    def _delete_memory_segment(self, segment, level, uuid_):
+        segments = self._segments.get(segment, None)
+        if segments is None:
+            return
+
+        idx = bisect.bisect_left(segments, (level, uuid_))
+        if idx < len(segments) and segments[idx][:2] == (level, uuid_):
+            del segments[idx]
+
+        if len(segments) == 0:
+            self._segments.pop(segment)
+            self._update_segment_sizes(segment[1]-segment[0]+1, -1)
+
+    def _split_interval(self, start, end):
+        # canonical decomposition of [start, end] in the segment tree
+        # rooted at [0, max_endpoint]: the tree is a complete binary
+        # tree, so its segments are the maximal blocks aligned to their
+        # power of 2 size
+        result = []
 
-        mid = (lower+upper)/2
+        root_size = self.max_endpoint+1
+        while start <= end:
+            size = (start & -start) if start != 0 else root_size
+            size = min(size, 1 << ((end-start+1).bit_length()-1))
 
-        result = []
-        if start <= mid:
-            result += self._split_interval(start, end, lower, mid)
-        if end > mid:
-            result += self._split_interval(start, end, mid+1, upper)
+            result.append((start, start+size-1))
+            start += size
 
         return result
 
+    def _pack_endpoints(self, *endpoints):
+        if self._epwords == 1:
+            return struct.pack(">"+"Q"*len(endpoints), *endpoints)
+
+        words = []
+        for e in endpoints:
+            words.append(e >> 64)
+            words.append(e & 0xFFFFFFFFFFFFFFFF)
+        return struct.pack(">"+"Q"*len(words), *words)
+
+    def _unpack_endpoints(self, data):
+        words = struct.unpack(">"+"Q"*(len(data)/8), data)
+        if self._epwords == 1:
+            return words
+
+        return [(words[j] << 64) | words[j+1]
+                for j in xrange(0, len(words), 2)]
+
     def _segment_key(self, start, end, uuid_=None, level=None):
-        res = array.array('B', [
-            1,
-            (start >> 56) & 0xFF, (start >> 48) & 0xFF,
-            (start >> 40) & 0xFF, (start >> 32) & 0xFF,
-            (start >> 24) & 0xFF, (start >> 16) & 0xFF,
-            (start >> 8) & 0xFF, start & 0xFF,
-            (end >> 56) & 0xFF, (end >> 48) & 0xFF,
-            (end >> 40) & 0xFF, (end >> 32) & 0xFF,
-            (end >> 24) & 0xFF, (end >> 16) & 0xFF,
-            (end >> 8) & 0xFF, end & 0xFF,
-        ])
+        res = '\x01'+self._pack_endpoints(start, end)
 
         if level is not None:
-            res.append(level)
+            res += chr(level)
             if uuid_ is not None:
-                for c in uuid_:
-                    res.append(ord(c))
+                res += uuid_
 
-        return res.tostring()
+        return res
 
     def _split_segment_key(self, key):
-        _, start, end, level = struct.unpack(">BQQB", key[:18])
-        return start, end, level, key[18:]
+        eplen = 8*self._epwords
+        start, end = self._unpack_endpoints(key[1:1+2*eplen])
+        level = ord(key[1+2*eplen])
+        return start, end, level, key[2+2*eplen:]
 
     def _endpoint_key(self, endpoint, level=None, type_=None, uuid_=None):
-        res = array.array('B', [
-            2,
-            (endpoint >> 56) & 0xFF, (endpoint >> 48) & 0xFF,
-            (endpoint >> 40) & 0xFF, (endpoint >> 32) & 0xFF,
-            (endpoint >> 24) & 0xFF, (endpoint >> 16) & 0xFF,
-            (endpoint >> 8) & 0xFF, endpoint & 0xFF
-        ])
+        res = '\x02'+self._pack_endpoints(endpoint)
 
         if level is not None:
-            res.append(level)
+            res += chr(level)
             if type_ is not None:
-                res.append(type_)
+                res += chr(type_)
                 if uuid_ is not None:
-                    for c in uuid_:
-                        res.append(ord(c))
+                    res += uuid_
 
-        return res.tostring()
+        return res
 
     def _split_endpoint_key(self, k):
-        _, endpoint, level, type_ = struct.unpack(">BQBB", k[:11])
-        type_ = (True if type_ == TYPE_START else False)
-        return endpoint, level, type_, k[11:]
+        eplen = 8*self._epwords
+        endpoint = self._unpack_endpoints(k[1:1+eplen])[0]
+        level = ord(k[1+eplen])
+        type_ = (True if ord(k[2+eplen]) == TYPE_START else False)
+        return endpoint, level, type_, k[3+eplen:]
 
     def close(self):
         self.db.close()
 
     def put(self, uuid_, start, end, level=0):
-        si = self._split_interval(start, end, 0, self.max_endpoint)
+        if type(uuid_) == unicode:
+            uuid_ = uuid_.encode('utf8')
 
-        value = struct.pack(">QQ", start, end)
+        si = self._split_interval(start, end)
+
+        value = self._pack_endpoints(start, end)
 
         batch = self.db.write_batch()
 
@@ -155,13 +369,22 @@ class ST(object):
 
         batch.write()
 
+        if self.in_memory:
+            for i in si:
+                self._add_memory_segment(i, level, uuid_, start, end)
+            self._endpoints.add(ks)
+            self._endpoints.add(ke)
+
         self.num_endpoints += 2
         self.num_segments += len(si)
 
     def delete(self, uuid_, start, end, level=0):
+        if type(uuid_) == unicode:
+            uuid_ = uuid_.encode('utf8')
+
         batch = self.db.write_batch()
 
-        si = self._split_interval(start, end, 0, self.max_endpoint)
+        si = self._split_interval(start, end)
         for i in si:
             k = self._segment_key(i[0], i[1], uuid_=uuid_, level=level)
             batch.delete(k)
@@ -183,10 +406,36 @@ class ST(object):
 
         batch.write()
 
+        if self.in_memory:
+            for i in si:
+                self._delete_memory_segment(i, level, uuid_)
+            self._endpoints.discard(ks)
+            self._endpoints.discard(ke)
+
         self.num_endpoints -= 2
         self.num_segments -= len(si)
 
     def cover(self, value):
+        if self.in_memory:
+            return self._memory_cover(value)
+
+        return self._db_cover(value)
+
+    def _memory_cover(self, value):
+        # value is never above max_endpoint, so below the root every
+        # segment containing value is aligned to its size and only
+        # the sizes currently in the tree have to be checked
+        get_segments = self._segments.get
+
+        for size in self._cover_sizes:
+            lower = value - value % size
+
+            segments = get_segments((lower, lower+size-1))
+            if segments is not None:
+                for level, uuid_, start, end in reversed(segments):
+                    yield uuid_, level, start, end
+
+    def _db_cover(self, value):
         lower = 0
         upper = self.max_endpoint*2
 
@@ -204,7 +453,7 @@ class ST(object):
                                          reverse=True, include_start=False,
                                          include_stop=False):
                 _, _, level, uuid_ = self._split_segment_key(k)
-                start, end = struct.unpack(">QQ", v)
+                start, end = self._unpack_endpoints(v)
 
                 yield uuid_, level, start, end
 
@@ -222,6 +471,18 @@ class ST(object):
         else:
             stop = self._endpoint_key(stop, level=MAX_LEVEL+1)
 
+        if self.in_memory:
+            di = self._endpoints.irange(
+                start,
+                stop,
+                include_start=include_start,
+                include_stop=include_stop,
+                reverse=reverse
+            )
+            for k in di:
+                yield self._split_endpoint_key(k)
+            return
+
         di = self.db.iterator(
             start=start,
             stop=stop,
@@ -26,8 +26,11 @@ Numbers are 8-bit unsigned.
 - Number of Indicators: (0,3)
 - Table Last Global ID: (0,4)
 - Custom Metadata: (0,5)
+- Value Codec: (0,6)
+- Column: (0,7,<column id>)
 - Indicator Version: (1,0,<indicator>)
 - Indicator: (1,1,<indicator>)
+- Column Entry: (3,<column id>,<indicator>)
 
 **INDICATORS**
 
@@ -38,7 +41,18 @@ When an indicator value is updated, its version number is incremented.
 The version number is a 64-bit LSB unsigned int.
 
 The value of an indicator is a 64-bit unsigned int LSB followed by a dump of
-a dictionary of attributes in JSON format.
+a dictionary of attributes encoded with the table value codec. The name of
+the codec is stored at (0,6), supported codecs are:
+
+- *json*: dictionary in JSON format (default)
+- *msgpack*: msgpack array of alternating attribute names and values.
+  Well known attribute names are interned as small integers.
+
+The codec of new tables can be selected with the env MM_TABLE_CODEC.
+If a table is opened with a codec different from the stored one, all the
+values are converted. Each codec can identify its own encodings from the
+first byte, values left in the old encoding by an interrupted conversion are
+still readable and are converted when the conversion is restarted.
 
 To iterate over all the indicators versions iterate from key (1,0) to key
 (1,1) excluded.
@@ -65,17 +79,59 @@ Each entry in the index is stored with a key
 
 When iterating over an index, the value of an index entry is loaded and if
 the version does not match with current indicator version the index entry is
-deleted. This permits a sort of lazy garbage collection.
+skipped. When values are requested, the version is read from the head of the
+value record to check the index entry and retrieve the value with a single
+lookup.
+
+Stale index entries are deleted by a background vacuum greenlet. Every
+*vacuum_interval* seconds (env MM_TABLE_VACUUM_INTERVAL, default 1) the
+vacuum checks up to *vacuum_size* index entries (env MM_TABLE_VACUUM_SIZE,
+default 1024), resuming from where it stopped, and deletes the stale ones in
+a single write batch. After a full pass over all the indexes the vacuum waits
+*vacuum_pass_interval* seconds (env MM_TABLE_VACUUM_PASS_INTERVAL, default
+600). The number of live and dead entries found in the last complete pass of
+each index is available in *index_stats*.
 
 To retrieve all the indicators with a specific attribute value just iterate
 over the keys (2,<index id>,0xF0,<encoded value>) and
 (2,<index id>,0xF0,<encoded value>,0xFF..FF)
+
+**COLUMNS**
+
+Columns store a 64-bit unsigned int per indicator outside of the indicator
+value, to track attributes updated much more often than the rest of the
+value without rewriting the value and its index entries. Each column has an
+id in the range 0 - 255, the name of the column is stored at
+(0,7,<column id>). Column entries are not versioned and are deleted
+together with the indicator.
+
+**BATCHES**
+
+By default each put and delete is committed to the DB in its own write batch
+together with the table metadata. Inside a *batch* context
+(``with table.batch():``) puts and deletes are accumulated in a single write
+batch, committed every *size* operations (default: 1024, env
+MM_TABLE_BATCH_SIZE) and when the context exits. Metadata keys are written
+once per commit. Reads performed inside the context see the pending writes.
+
+**CACHE**
+
+If *cache_size* is greater than 0, the last *cache_size* value records read
+or written by point operations are kept in an in-memory LRU cache. Records
+are kept encoded and decoded on each hit, so values returned to callers can
+be freely modified. Missing indicators are cached as well. Range scans use
+the cache but do not populate it. Hits and misses are counted in
+*statistics* as table.cache.hit and table.cache.miss.
 """
 
 import os
+import collections
+import contextlib
+import itertools
 import plyvel
 import struct
 import ujson
+import msgpack
 import time
 import logging
 import shutil
@@ -89,6 +145,31 @@ LAST_UPDATE_KEY = struct.pack("BB", 0, 2)
 NUM_INDICATORS_KEY = struct.pack("BB", 0, 3)
 TABLE_LAST_GLOBAL_ID = struct.pack("BB", 0, 4)
 CUSTOM_METADATA = struct.pack("BB", 0, 5)
+VALUE_CODEC_KEY = struct.pack("BB", 0, 6)
+START_COLUMN_KEY = struct.pack("BBB", 0, 7, 0)
+END_COLUMN_KEY = struct.pack("BBB", 0, 7, 0xFF)
+
+# interned attribute names used by MsgpackValueCodec
+# entries can only be appended to this list
+_INTERNED_ATTRIBUTES = [
+    '_age_out',
+    '_last_run',
+    '_withdrawn',
+    '_added',
+    '_updated',
+    '_id',
+    'sources',
+    'first_seen',
+    'last_seen',
+    'type',
+    'confidence',
+    'share_level',
+    'direction',
+    'country',
+    'description',
+    'tags',
+    'ttl'
+]
 
 LOG = logging.getLogger(__name__)
 
@@ -97,8 +178,100 @@ class InvalidTableException(Exception):
     pass
 
 
+class JSONValueCodec(object):
+    name = 'json'
+
+    def identify(self, data):
+        return data[:1] == '{'
+
+    def encode(self, value):
+        return ujson.dumps(value)
+
+    def decode(self, data):
+        return ujson.loads(data)
+
+
+class MsgpackValueCodec(object):
+    name = 'msgpack'
+
+    def __init__(self):
+        self._attr_to_id = {
+            attr: idx for idx, attr in enumerate(_INTERNED_ATTRIBUTES)
+        }
+
+    def identify(self, data):
+        # fixarray, array 16 and array 32
+        return data[:1] != '' and \
+            (ord(data[0]) & 0xF0 == 0x90 or data[0] in '\xdc\xdd')
+
+    def encode(self, value):
+        attr_to_id = self._attr_to_id
+
+        result = []
+        for k, v in value.iteritems():
+            result.append(attr_to_id.get(k, k))
+            result.append(v)
+
+        return msgpack.packb(result, use_bin_type=False)
+
+    def decode(self, data):
+        attrs = iter(msgpack.unpackb(data, raw=False))
+
+        return {
+            (_INTERNED_ATTRIBUTES[k] if type(k) is int else k): v
+            for k, v in itertools.izip(attrs, attrs)
+        }
+
+
+VALUE_CODECS = {
+    JSONValueCodec.name: JSONValueCodec,
+    MsgpackValueCodec.name: MsgpackValueCodec
+}
+
+
+class _PendingWriteBatch(object):
+    """plyvel write batch keeping track of the pending writes, used to
+    serve reads of keys not yet committed to the DB.
+    """
+    def __init__(self, db):
+        self.write_batch = db.write_batch()
+        self.pending = {}
+        self.num_operations = 0
+
+    def put(self, key, value):
+        self.write_batch.put(key, value)
+        self.pending[key] = value
+
+    def delete(self, key):
+        self.write_batch.delete(key)
+        self.pending[key] = None
+
+    def write(self):
+        self.write_batch.write()
+
+
+class _ValueCache(object):
+    """Size bounded LRU cache of value records."""
+    def __init__(self, size):
+        self.size = size
+        self._records = collections.OrderedDict()
+
+    def get(self, key):
+        # raises KeyError if key is not cached
+        record = self._records.pop(key)
+        self._records[key] = record
+        return record
+
+    def put(self, key, record):
+        self._records.pop(key, None)
+        self._records[key] = record
+        if len(self._records) > self.size:
+            self._records.popitem(last=False)
+
+
 class Table(object):
-    def __init__(self, name, truncate=False, bloom_filter_bits=0):
+    def __init__(self, name, truncate=False, bloom_filter_bits=0, codec=None,
+                 cache_size=0, statistics=None):
         if truncate:
             try:
                 shutil.rmtree(name)
@@ -106,45 +279,87 @@ class Table(object):
                 pass
 
         self.db = None
-        self._compact_glet = None
+        self._vacuum_glet = None
+        self._batch = None
+        self._batch_size = None
+
+        self._cache = None
+        if cache_size > 0:
+            self._cache = _ValueCache(cache_size)
+
+        self.statistics = statistics
+        if self.statistics is None:
+            self.statistics = collections.defaultdict(int)
+
+        if codec is None:
+            codec = os.environ.get('MM_TABLE_CODEC', None)
+        if codec is not None and codec not in VALUE_CODECS:
+            raise InvalidTableException('Unknown value codec {}'.format(codec))
+        self.codec = None
+
+        self.batch_size = int(os.environ.get('MM_TABLE_BATCH_SIZE', 1024))
 
         self.db = plyvel.DB(
             name,
             create_if_missing=True,
             bloom_filter_bits=bloom_filter_bits
         )
-        self._read_metadata()
-
-        self.compact_interval = int(os.environ.get('MM_TABLE_COMPACT_INTERVAL', 3600 * 6))
-        self.compact_delay = int(os.environ.get('MM_TABLE_COMPACT_DELAY', 3600))
-        self._compact_glet = gevent.spawn(self._compact_loop)
-
-    def _init_db(self):
+        self._read_metadata(codec=codec)
+
+        self.index_stats = {}
+        self._vacuum_index = None
+        self._vacuum_cursor = None
+        self._vacuum_counts = [0, 0]  # live, dead
+        self.vacuum_interval = float(os.environ.get('MM_TABLE_VACUUM_INTERVAL', 1))
+        self.vacuum_size = int(os.environ.get('MM_TABLE_VACUUM_SIZE', 1024))
+        self.vacuum_pass_interval = float(os.environ.get('MM_TABLE_VACUUM_PASS_INTERVAL', 600))
+        self._vacuum_glet = gevent.spawn(self._vacuum_loop)
+
+    def _init_db(self, codec=None):
         self.last_update = 0
         self.indexes = {}
+        self.columns = {}
         self.num_indicators = 0
         self.last_global_id = 0
 
+        if codec is None:
+            codec = JSONValueCodec.name
+        self.codec = VALUE_CODECS[codec]()
+
         batch = self.db.write_batch()
-        batch.put(SCHEMAVERSION_KEY, struct.pack("B", 1))
+        batch.put(SCHEMAVERSION_KEY, struct.pack("B", 2))
         batch.put(LAST_UPDATE_KEY, struct.pack(">Q", self.last_update))
         batch.put(NUM_INDICATORS_KEY, struct.pack(">Q", self.num_indicators))
         batch.put(TABLE_LAST_GLOBAL_ID, struct.pack(">Q", self.last_global_id))
+        batch.put(VALUE_CODEC_KEY, self.codec.name)
         batch.write()
 
-    def _read_metadata(self):
+    def _read_metadata(self, codec=None):
         sv = self._get(SCHEMAVERSION_KEY)
         if sv is None:
-            return self._init_db()
+            return self._init_db(codec=codec)
         sv = struct.unpack("B", sv)[0]
         if sv == 0:
             # add table last global id
             self._upgrade_from_s0()
-        elif sv == 1:
+            sv = 1
+        if sv == 1:
+            # add value codec
+            self._upgrade_from_s1()
+        elif sv == 2:
             pass
         else:
             raise InvalidTableException("Schema version not supported")
 
+        stored_codec = self._get(VALUE_CODEC_KEY)
+        if stored_codec not in VALUE_CODECS:
+            raise InvalidTableException(
+                "Unknown value codec {!r}".format(stored_codec)
+            )
+        self.codec = VALUE_CODECS[stored_codec]()
+        if codec is not None and codec != stored_codec:
+            self._convert_values(VALUE_CODECS[codec]())
+
         self.indexes = {}
         ri = self.db.iterator(
             start=START_INDEX_KEY,
@@ -159,6 +374,17 @@ class Table(object):
                     'id': indexid,
                     'last_global_id': 0
                 }
+        self.columns = {}
+        ri = self.db.iterator(
+            start=START_COLUMN_KEY,
+            stop=END_COLUMN_KEY,
+            include_stop=True
+        )
+        with ri:
+            for k, v in ri:
+                _, _, columnid = struct.unpack("BBB", k)
+                self.columns[v] = columnid
+
         for i in self.indexes:
             lgi = self._get(self._last_global_id_key(self.indexes[i]['id']))
             if lgi is not None:
@@ -182,6 +408,9 @@ class Table(object):
         self.last_global_id = struct.unpack(">Q", t)[0]
 
     def _get(self, key):
+        if self._batch is not None and key in self._batch.pending:
+            return self._batch.pending[key]
+
         try:
             result = self.db.get(key)
         except KeyError:
@@ -207,33 +436,81 @@ class Table(object):
         self.db.put(CUSTOM_METADATA, cmetadata)
 
     def close(self):
+        if self._batch is not None and self.db is not None:
+            self._commit_batch()
+        self._batch = None
+
         if self.db is not None:
             self.db.close()
 
-        if self._compact_glet is not None:
-            self._compact_glet.kill()
+        if self._vacuum_glet is not None:
+            self._vacuum_glet.kill()
 
         self.db = None
-        self._compact_glet = None
+        self._vacuum_glet = None
+        self._cache = None
+
+    def _exists(self, key):
+        if self._cache is not None:
+            return (self._get_value_record(key) is not None)
+
+        ikeyv = self._indicator_key_version(key)
+        return (self._get(ikeyv) is not None)
 
     def exists(self, key):
         if type(key) == unicode:
             key = key.encode('utf8')
 
-        ikeyv = self._indicator_key_version(key)
-        return (self._get(ikeyv) is not None)
+        return self._exists(key)
 
     def get(self, key):
         if type(key) == unicode:
             key = key.encode('utf8')
 
-        ikey = self._indicator_key(key)
-        value = self._get(ikey)
+        value = self._get_value_record(key)
         if value is None:
             return None
 
+        return self._decode_value(value)
+
+    def _get_value_record(self, key, populate=True):
+        ikey = self._indicator_key(key)
+        if self._cache is None:
+            return self._get(ikey)
+
+        try:
+            record = self._cache.get(ikey)
+            self.statistics['table.cache.hit'] += 1
+            return record
+
+        except KeyError:
+            pass
+
+        self.statistics['table.cache.miss'] += 1
+        record = self._get(ikey)
+        if populate:
+            self._cache.put(ikey, record)
+
+        return record
+
+    def _decode_value(self, value):
         # skip version
-        return ujson.loads(value[8:])
+        data = value[8:]
+
+        codec = self.codec
+        if not codec.identify(data):
+            # value left by an interrupted codec conversion
+            codec = self._identify_codec(data)
+
+        return codec.decode(data)
+
+    def _identify_codec(self, data):
+        for codec in VALUE_CODECS.values():
+            codec = codec()
+            if codec.identify(data):
+                return codec
+
+        raise InvalidTableException('Unknown value encoding')
 
     def delete(self, key):
         if type(key) == unicode:
@@ -242,15 +519,31 @@ class Table(object):
         ikey = self._indicator_key(key)
         ikeyv = self._indicator_key_version(key)
 
-        if self._get(ikeyv) is None:
+        if not self._exists(key):
             return
 
-        batch = self.db.write_batch()
+        if self._cache is not None:
+            self._cache.put(ikey, None)
+
+        batch = self._batch
+        if batch is None:
+            batch = self.db.write_batch()
+
         batch.delete(ikey)
         batch.delete(ikeyv)
+        for columnid in self.columns.values():
+            batch.delete(self._column_key(columnid, key))
         self.num_indicators -= 1
-        batch.put(NUM_INDICATORS_KEY, struct.pack(">Q", self.num_indicators))
-        batch.write()
+
+        if self._batch is None:
+            batch.put(
+                NUM_INDICATORS_KEY,
+                struct.pack(">Q", self.num_indicators)
+            )
+            batch.write()
+            return
+
+        self._batch_operation_done()
 
     def _indicator_key(self, key):
         return struct.pack("BB", 1, 1)+key
@@ -297,6 +590,69 @@ class Table(object):
         batch.put(struct.pack("BBB", 0, 1, idxid), attribute)
         batch.write()
 
+    def create_column(self, name):
+        """Creates a column, returns False if the column already exists."""
+        if name in self.columns:
+            return False
+
+        columnid = 0
+        if len(self.columns) != 0:
+            columnid = max(self.columns.values())+1
+
+        self.columns[name] = columnid
+        self.db.put(struct.pack("BBB", 0, 7, columnid), name)
+
+        return True
+
+    def _column_key(self, columnid, key):
+        return struct.pack("BB", 3, columnid)+key
+
+    def put_column(self, key, column, value):
+        if type(key) == unicode:
+            key = key.encode('utf8')
+
+        ckey = self._column_key(self.columns[column], key)
+        cvalue = struct.pack(">Q", value)
+
+        if self._batch is None:
+            self.db.put(ckey, cvalue)
+            return
+
+        self._batch.put(ckey, cvalue)
+        self._batch_operation_done()
+
+    def get_column(self, key, column):
+        if type(key) == unicode:
+            key = key.encode('utf8')
+
+        cvalue = self._get(self._column_key(self.columns[column], key))
+        if cvalue is None:
+            return None
+
+        return struct.unpack(">Q", cvalue)[0]
+
+    def query_column(self, column):
+        """Iterates over the (indicator, value) entries of a column, in
+        indicator order.
+        """
+        columnid = self.columns[column]
+
+        ri = self.db.iterator(
+            start=struct.pack("BB", 3, columnid),
+            stop=struct.pack("BB", 3, columnid+1)
+        )
+        with ri:
+            for ckey, cvalue in ri:
+                if self._batch is not None:
+                    cvalue = self._get(ckey)
+                    if cvalue is None:
+                        continue
+
+                yield (
+                    ckey[2:].decode('utf8', 'ignore'),
+                    struct.unpack(">Q", cvalue)[0]
+                )
+
     def put(self, key, value):
         if type(key) == unicode:
             key = key.encode('utf8')
@@ -307,20 +663,28 @@ class Table(object):
         ikey = self._indicator_key(key)
         ikeyv = self._indicator_key_version(key)
 
-        exists = self._get(ikeyv)
+        exists = self._exists(key)
         self.last_global_id += 1
         cversion = self.last_global_id
 
         now = time.time()
         self.last_update = now
 
+        record = struct.pack(">Q", cversion)+self.codec.encode(value)
+        if self._cache is not None:
+            self._cache.put(ikey, record)
+
+        if self._batch is not None:
+            self._batch_put(key, ikey, ikeyv, cversion, exists, record, value)
+            return
+
         batch = self.db.write_batch()
-        batch.put(ikey, struct.pack(">Q", cversion)+ujson.dumps(value))
+        batch.put(ikey, record)
         batch.put(ikeyv, struct.pack(">Q", cversion))
         batch.put(LAST_UPDATE_KEY, struct.pack(">Q", self.last_update))
         batch.put(TABLE_LAST_GLOBAL_ID, struct.pack(">Q", self.last_global_id))
 
-        if exists is None:
+        if not exists:
             self.num_indicators += 1
             batch.put(
                 NUM_INDICATORS_KEY,
@@ -344,6 +708,82 @@ class Table(object):
 
         batch.write()
 
+    def _batch_put(self, key, ikey, ikeyv, cversion, exists, record, value):
+        batch = self._batch
+
+        batch.put(ikey, record)
+        batch.put(ikeyv, struct.pack(">Q", cversion))
+
+        if not exists:
+            self.num_indicators += 1
+
+        for iattr, index in self.indexes.iteritems():
+            v = value.get(iattr, None)
+            if v is None:
+                continue
+
+            index['last_global_id'] += 1
+
+            idxkey = self._index_key(index['id'], v, index['last_global_id'])
+            batch.put(idxkey, struct.pack(">Q", cversion)+key)
+
+        self._batch_operation_done()
+
+    def _batch_operation_done(self):
+        self._batch.num_operations += 1
+        if self._batch.num_operations >= self._batch_size:
+            self._commit_batch()
+            self._batch = _PendingWriteBatch(self.db)
+
+    def _commit_batch(self):
+        batch = self._batch
+        if batch.num_operations == 0:
+            return
+
+        batch.put(LAST_UPDATE_KEY, struct.pack(">Q", self.last_update))
+        batch.put(NUM_INDICATORS_KEY, struct.pack(">Q", self.num_indicators))
+        batch.put(TABLE_LAST_GLOBAL_ID, struct.pack(">Q", self.last_global_id))
+        for index in self.indexes.values():
+            if index['last_global_id'] < 0:
+                continue
+
+            batch.put(
+                self._last_global_id_key(index['id']),
+                struct.pack(">Q", index['last_global_id'])
+            )
+
+        batch.write()
+
+    @contextlib.contextmanager
+    def batch(self, size=None):
+        """Context manager to group puts and deletes in write batches.
+
+        Writes are committed every *size* operations and when the context
+        exits, also on exceptions to keep the DB in sync with the
+        in-memory metadata. Nested contexts are merged with the outermost
+        one.
+
+        Args:
+            size (int): number of operations per commit, default
+                *batch_size*
+        """
+        if self._batch is not None:
+            yield self
+            return
+
+        if size is None:
+            size = self.batch_size
+
+        self._batch_size = size
+        self._batch = _PendingWriteBatch(self.db)
+        try:
+            yield self
+
+        finally:
+            if self._batch is not None and self.db is not None:
+                self._commit_batch()
+            self._batch = None
+
     def query(self, index=None, from_key=None, to_key=None,
               include_value=False, include_stop=True, include_start=True,
               reverse=False):
@@ -392,15 +832,26 @@ class Table(object):
             include_stop=include_stop,
             include_start=include_start,
             reverse=reverse,
-            include_value=False
+            include_value=include_value
         )
         with ri:
-            for ekey in ri:
-                ekey = ekey[2:]
-                if include_value:
-                    yield ekey.decode('utf8', 'ignore'), self.get(ekey)
-                else:
-                    yield ekey.decode('utf8', 'ignore')
+            if not include_value:
+                for ekey in ri:
+                    yield ekey[2:].decode('utf8', 'ignore')
+                return
+
+            # values are read from the same iterator pass, pending
+            # writes of the current batch take precedence
+            for ikey, evalue in ri:
+                if self._batch is not None:
+                    evalue = self._get(ikey)
+                    if evalue is None:
+                        continue
+
+                yield (
+                    ikey[2:].decode('utf8', 'ignore'),
+                    self._decode_value(evalue)
+                )
 
     def _query_by_index(self, index, from_key=None, to_key=None,
                         include_value=False, include_stop=True,
@@ -410,6 +861,9 @@ class Table(object):
 
         idxid = self.indexes[index]['id']
 
+        # point queries populate the value cache, range scans don't
+        populate = (from_key is not None and from_key == to_key)
+
         if from_key is None:
             from_key = struct.pack("BBB", 2, idxid, 0xF0)
             include_start = False
@@ -426,7 +880,6 @@ class Table(object):
                 lastidxid=0xFFFFFFFFFFFFFFFF
             )
 
-        ldeleted = 0
         ri = self.db.iterator(
             start=from_key,
             stop=to_key,
@@ -440,53 +893,133 @@ class Table(object):
                 iversion = struct.unpack(">Q", ekey[:8])[0]
                 ekey = ekey[8:]
 
-                evalue = self._get(self._indicator_key_version(ekey))
+                # the value record starts with the indicator version,
+                # if the value is needed version check and value
+                # retrieval are done with a single lookup
+                if include_value:
+                    evalue = self._get_value_record(ekey, populate=populate)
+                else:
+                    evalue = self._get(self._indicator_key_version(ekey))
+
                 if evalue is None:
-                    # LOG.debug("Key does not exist")
-                    # key does not exist
-                    self.db.delete(ikey)
-                    ldeleted += 1
+                    # key does not exist, entry is left to the vacuum
                     continue
 
-                cversion = struct.unpack(">Q", evalue)[0]
+                cversion = struct.unpack(">Q", evalue[:8])[0]
                 if iversion != cversion:
                     # index value is old
-                    # LOG.debug("Version mismatch")
-                    self.db.delete(ikey)
-                    ldeleted += 1
                     continue
 
                 if include_value:
-                    yield ekey.decode('utf8', 'ignore'), self.get(ekey)
+                    yield (
+                        ekey.decode('utf8', 'ignore'),
+                        self._decode_value(evalue)
+                    )
                 else:
                     yield ekey.decode('utf8', 'ignore')
 
-        LOG.info('Deleted in scan of {}: {}'.format(index, ldeleted))
+    def vacuum(self, max_entries=None):
+        """Deletes stale index entries, checking at most *max_entries*
+        entries (default *vacuum_size*). Each call resumes from where the
+        previous one stopped.
 
-    def _compact_loop(self):
-        gevent.sleep(self.compact_delay)
+        Returns:
+            True if a full pass over all the indexes has been completed
+        """
+        if max_entries is None:
+            max_entries = self.vacuum_size
 
-        while True:
-            try:
-                gevent.idle()
+        names = sorted(self.indexes.keys())
+        if len(names) == 0:
+            return True
+
+        if self._vacuum_index not in self.indexes:
+            self._vacuum_index = names[0]
+            self._vacuum_cursor = None
+            self._vacuum_counts = [0, 0]
+
+        batch = self.db.write_batch()
+        num_deleted = 0
+        pass_completed = False
+
+        while max_entries > 0:
+            idxid = self.indexes[self._vacuum_index]['id']
+
+            start = self._vacuum_cursor
+            if start is None:
+                start = struct.pack("BBB", 2, idxid, 0xF0)
+
+            index_completed = True
+            ri = self.db.iterator(
+                start=start,
+                stop=struct.pack("BBB", 2, idxid, 0xF1),
+                include_value=True,
+                include_start=False
+            )
+            with ri:
+                for ikey, ekey in ri:
+                    if max_entries == 0:
+                        index_completed = False
+                        break
+                    max_entries -= 1
+
+                    self._vacuum_cursor = ikey
+
+                    # pending writes are checked as well, entries
+                    # made stale by the current batch are deleted
+                    iversion = struct.unpack(">Q", ekey[:8])[0]
+                    cversion = self._get(self._indicator_key_version(ekey[8:]))
+                    if cversion is not None and \
+                       struct.unpack(">Q", cversion)[0] == iversion:
+                        self._vacuum_counts[0] += 1
+                        continue
+
+                    batch.delete(ikey)
+                    num_deleted += 1
+                    self._vacuum_counts[1] += 1
+
+            if not index_completed:
+                break
+
+            live, dead = self._vacuum_counts
+            self.index_stats[self._vacuum_index] = {
+                'live': live,
+                'dead': dead,
+                'dead_ratio': (float(dead)/(live+dead) if live+dead else 0.0)
+            }
 
-                counter = 0
-                for idx in self.indexes.keys():
-                    for i in self.query(index=idx, include_value=False):
-                        if counter % 512 == 0:
-                            gevent.sleep(0.001)  # yield to other greenlets
-                        counter += 1
+            nextidx = names.index(self._vacuum_index)+1
+            self._vacuum_index = names[nextidx % len(names)]
+            self._vacuum_cursor = None
+            self._vacuum_counts = [0, 0]
 
+            if nextidx == len(names):
+                pass_completed = True
+                break
+
+        batch.write()
+        self.statistics['table.vacuum.deleted'] += num_deleted
+
+        return pass_completed
+
+    def _vacuum_loop(self):
+        delay = self.vacuum_pass_interval
+
+        while True:
+            try:
+                gevent.sleep(delay)
             except gevent.GreenletExit:
                 break
-            except:
-                LOG.exception('Exception in _compact_loop')
 
             try:
-                gevent.sleep(self.compact_interval)
+                delay = self.vacuum_interval
+                if self.vacuum():
+                    delay = self.vacuum_pass_interval
 
             except gevent.GreenletExit:
                 break
+            except:
+                LOG.exception('Exception in _vacuum_loop')
 
     def _upgrade_from_s0(self):
         LOG.info('Upgrading from schema version 0 to schema version 1')
@@ -540,3 +1073,47 @@ class Table(object):
         batch.put(SCHEMAVERSION_KEY, struct.pack("B", 1))
         batch.put(TABLE_LAST_GLOBAL_ID, struct.pack(">Q", last_global_id))
         batch.write()
+
+    def _upgrade_from_s1(self):
+        LOG.info('Upgrading from schema version 1 to schema version 2')
+
+        batch = self.db.write_batch()
+        batch.put(SCHEMAVERSION_KEY, struct.pack("B", 2))
+        batch.put(VALUE_CODEC_KEY, JSONValueCodec.name)
+        batch.write()
+
+    def _convert_values(self, codec):
+        LOG.info('Converting values from {} to {}'.format(
+            self.codec.name, codec.name
+        ))
+
+        # the codec is switched after the values are converted, values
+        # already converted by an interrupted conversion are skipped
+        num_converted = 0
+        ri = self.db.iterator(
+            start=struct.pack("BB", 1, 1),
+            stop=struct.pack("BB", 1, 2),
+            include_value=True
+        )
+        with ri:
+            batch = self.db.write_batch()
+            for ikey, value in ri:
+                if codec.identify(value[8:]):
+                    continue
+
+                batch.put(
+                    ikey,
+                    value[:8]+codec.encode(self.codec.decode(value[8:]))
+                )
+                num_converted += 1
+
+                if num_converted % self.batch_size == 0:
+                    batch.write()
+                    batch = self.db.write_batch()
+
+            batch.write()
+
+        self.db.put(VALUE_CODEC_KEY, codec.name)
+        self.codec = codec
+
+        LOG.info('Converted values: {}'.format(num_converted))
@@ -17,7 +17,6 @@ This module implements minemeld.ft.threatq.Export, the Miner node for ThreatQ
 export API.
 """
 
-import requests
 import logging
 import os
 import yaml
@@ -156,7 +155,7 @@ class Export(basepoller.BasePollerFT):
             timeout=self.polling_timeout
         )
 
-        r = requests.get(
+        r = self._http_session().get(
             self.url,
             **rkwargs
         )
@@ -42,6 +42,8 @@ RUNNING_CONFIG = 'running-config.yml'
 PROTOTYPE_ENV = 'MINEMELD_PROTOTYPE_PATH'
 MGMTBUS_NUM_CONNS_ENV = 'MGMTBUS_NUM_CONNS'
 FABRIC_NUM_CONNS_ENV = 'FABRIC_NUM_CONNS'
+FABRIC_CLASS_ENV = 'FABRIC_CLASS'
+FABRIC_ZMQ_PATH_ENV = 'FABRIC_ZMQ_PATH'
 
 CHANGE_ADDED = 0
 CHANGE_DELETED = 1
@@ -172,6 +174,14 @@ class MineMeldConfig(_Config):
             dconfig = {}
 
         fabric = dconfig.get('fabric', None)
+        if fabric is None and os.getenv(FABRIC_CLASS_ENV, 'AMQP') == 'ZMQ':
+            fabric = {
+                'class': 'ZMQ',
+                'config': {}
+            }
+            if os.getenv(FABRIC_ZMQ_PATH_ENV, None) is not None:
+                fabric['config']['path'] = os.getenv(FABRIC_ZMQ_PATH_ENV)
+
         if fabric is None:
             fabric_num_conns = int(
                 os.getenv(FABRIC_NUM_CONNS_ENV, 50)
@@ -32,14 +32,16 @@ import psutil
 
 import minemeld.chassis
 import minemeld.mgmtbus
+import minemeld.ft.condition
 import minemeld.run.config
+import minemeld.run.placement
 
 from minemeld import __version__
 
 LOG = logging.getLogger(__name__)
 
 
-def _run_chassis(fabricconfig, mgmtbusconfig, fts):
+def _run_chassis(fabricconfig, mgmtbusconfig, fts, remote_topics=None):
     try:
         # lower priority to make master and web
         # more "responsive"
@@ -50,7 +52,7 @@ def _run_chassis(fabricconfig, mgmtbusconfig, fts):
             fabricconfig['config'],
             mgmtbusconfig
         )
-        c.configure(fts)
+        c.configure(fts, remote_topics=remote_topics)
 
         gevent.signal(signal.SIGUSR1, c.stop)
 
@@ -75,6 +77,55 @@ def _run_chassis(fabricconfig, mgmtbusconfig, fts):
         raise
 
 
+def _remote_topics(ftlist, nodes):
+    """Returns the nodes in ftlist with subscribers outside ftlist."""
+    result = set()
+    for ft, ftconfig in nodes.iteritems():
+        if ft in ftlist:
+            continue
+
+        for i in ftconfig.get('inputs', []):
+            if i in ftlist:
+                result.add(i)
+
+    return list(result)
+
+
+def _parse_conditions(nodes, cdir):
+    """Parses the filter conditions of all the nodes. Conditions are parsed
+    before the chassis are forked, to share the parsed conditions.
+
+    If MM_CONDITION_CACHE is set, parsed conditions are also loaded from
+    and saved to this path, relative to the config directory.
+    """
+    cache_path = os.environ.get('MM_CONDITION_CACHE', None)
+    if cache_path is not None:
+        cache_path = os.path.join(cdir, cache_path)
+        LOG.info(
+            'Conditions loaded from cache: %d',
+            minemeld.ft.condition.load_cache(cache_path)
+        )
+
+    for nname, nconfig in nodes.iteritems():
+        nodeconfig = nconfig.get('config', None)
+        if nodeconfig is None:
+            continue
+
+        for fname in ['infilters', 'outfilters']:
+            for f in (nodeconfig.get(fname, None) or []):
+                for c in (f.get('conditions', None) or []):
+                    try:
+                        minemeld.ft.condition.Condition(c)
+                    except Exception:
+                        LOG.error('%s - invalid condition %r', nname, c)
+
+    if cache_path is not None:
+        try:
+            minemeld.ft.condition.save_cache(cache_path)
+        except (IOError, OSError):
+            LOG.exception('Error saving condition cache')
+
+
 def _check_disk_space(num_nodes):
     free_disk_per_node = int(os.environ.get(
         'MM_DISK_SPACE_PER_NODE',
@@ -123,6 +174,14 @@ def _parse_args():
         metavar='NPC',
         help='number of nodes per chassis (default 15)'
     )
+    parser.add_argument(
+        '--placement',
+        default='round-robin',
+        choices=sorted(minemeld.run.placement.STRATEGIES.keys()),
+        action='store',
+        help='strategy for placing nodes in chassis, graph minimises '
+             'the edges between chassis (default round-robin)'
+    )
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -233,12 +292,9 @@ def main():
     )
     LOG.info("Number of chassis: %d", np)
 
-    ftlists = [{} for j in range(np)]
-    j = 0
-    for ft in config.nodes:
-        pn = j % len(ftlists)
-        ftlists[pn][ft] = config.nodes[ft]
-        j += 1
+    ftlists = minemeld.run.placement.place(args.placement, config, np)
+
+    _parse_conditions(config.nodes, cdir)
 
     signal.signal(signal.SIGINT, signal.SIG_IGN)
     signal.signal(signal.SIGTERM, signal.SIG_IGN)
@@ -253,7 +309,8 @@ def main():
             args=(
                 config.fabric,
                 config.mgmtbus,
-                g
+                g,
+                _remote_topics(g, config.nodes)
             )
         )
         processes.append(p)
@@ -0,0 +1,202 @@
+#  Copyright 2015-2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Strategies for placing the nodes of the graph in chassis.
+
+- round-robin: nodes are assigned to chassis in config order
+- graph: nodes are assigned to chassis to minimise the number of
+  edges between chassis, keeping the load of the chassis balanced.
+  The load of a node is estimated from the optional *weight*
+  attribute in the node config (default 1)
+"""
+
+import logging
+
+import networkx as nx
+
+from minemeld.startupplanner import _build_graph
+
+LOG = logging.getLogger(__name__)
+
+# max load of a chassis, relative to the average load
+BALANCE_TOLERANCE = 1.1
+MAX_REFINEMENT_PASSES = 10
+
+
+def _node_weight(nodeconfig):
+    try:
+        return max(float(nodeconfig.get('weight', 1)), 0.0)
+
+    except (TypeError, ValueError):
+        LOG.error('Invalid weight %r, using 1', nodeconfig.get('weight'))
+        return 1.0
+
+
+def round_robin(config, num_chassis):
+    """Assigns nodes to chassis round-robin.
+
+    Args:
+        config (MineMeldConfig): config
+        num_chassis (int): number of chassis
+
+    Returns:
+        list of dicts, one per chassis, with the nodes config
+    """
+    ftlists = [{} for j in range(num_chassis)]
+    j = 0
+    for ft in config.nodes:
+        pn = j % len(ftlists)
+        ftlists[pn][ft] = config.nodes[ft]
+        j += 1
+
+    return ftlists
+
+
+def graph(config, num_chassis):
+    """Partitions the graph of nodes in *num_chassis* parts.
+
+    Connected components are placed one at a time, largest first.
+    Nodes of a component are visited in BFS order and placed in the
+    chassis with the largest number of their neighbors and still room
+    available. The partition is then refined moving single nodes to
+    the chassis of their neighbors while this reduces the number of
+    edges between chassis.
+
+    Args:
+        config (MineMeldConfig): config
+        num_chassis (int): number of chassis
+
+    Returns:
+        list of dicts, one per chassis, with the nodes config
+    """
+    ugraph = _build_graph(config).to_undirected()
+
+    weights = {}
+    for n, nodeconfig in config.nodes.iteritems():
+        weights[n] = _node_weight(nodeconfig)
+
+    capacity = 0
+    if num_chassis > 0 and len(weights) > 0:
+        capacity = max(
+            BALANCE_TOLERANCE*sum(weights.values())/num_chassis,
+            max(weights.values())
+        )
+
+    loads = [0.0]*num_chassis
+    placement = {}
+
+    def _neighbor_counts(n):
+        counts = [0]*num_chassis
+        for m in ugraph.neighbors(n):
+            if m in placement:
+                counts[placement[m]] += 1
+        return counts
+
+    components = sorted(
+        nx.connected_components(ugraph),
+        key=lambda c: (-sum(weights[n] for n in c), sorted(c)),
+    )
+    for component in components:
+        start = min(component, key=lambda n: (-ugraph.degree(n), n))
+        order = [start]+[v for _, v in nx.bfs_edges(ugraph, start)]
+        for n in order:
+            counts = _neighbor_counts(n)
+            candidates = [
+                p for p in range(num_chassis)
+                if loads[p]+weights[n] <= capacity
+            ]
+            if len(candidates) == 0:
+                candidates = range(num_chassis)
+
+            p = min(candidates, key=lambda p: (-counts[p], loads[p], p))
+            placement[n] = p
+            loads[p] += weights[n]
+
+    for _ in range(MAX_REFINEMENT_PASSES):
+        moved = False
+
+        for n in sorted(placement.keys()):
+            cp = placement[n]
+            counts = _neighbor_counts(n)
+
+            best, best_gain = None, 0
+            for p in range(num_chassis):
+                if p == cp or loads[p]+weights[n] > capacity:
+                    continue
+
+                gain = counts[p]-counts[cp]
+                if gain > best_gain:
+                    best, best_gain = p, gain
+
+            if best is not None:
+                placement[n] = best
+                loads[cp] -= weights[n]
+                loads[best] += weights[n]
+                moved = True
+
+        if not moved:
+            break
+
+    ftlists = [{} for j in range(num_chassis)]
+    for n, p in placement.iteritems():
+        ftlists[p][n] = config.nodes[n]
+
+    return ftlists
+
+
+def cross_edges(config, ftlists):
+    """Returns the number of edges between nodes in different chassis."""
+    chassis = {}
+    for j, ftlist in enumerate(ftlists):
+        for n in ftlist:
+            chassis[n] = j
+
+    result = 0
+    for n, nodeconfig in config.nodes.iteritems():
+        for i in nodeconfig.get('inputs', []):
+            if i in chassis and chassis[i] != chassis[n]:
+                result += 1
+
+    return result
+
+
+STRATEGIES = {
+    'round-robin': round_robin,
+    'graph': graph
+}
+
+
+def place(strategy, config, num_chassis):
+    """Assigns nodes to chassis using *strategy*.
+
+    Args:
+        strategy (str): name of the strategy, see STRATEGIES
+        config (MineMeldConfig): config
+        num_chassis (int): number of chassis
+
+    Returns:
+        list of dicts, one per chassis, with the nodes config
+    """
+    if strategy not in STRATEGIES:
+        raise RuntimeError('Unknown placement strategy %s' % strategy)
+
+    ftlists = STRATEGIES[strategy](config, num_chassis)
+
+    LOG.info(
+        'placement %s: %d edges between chassis',
+        strategy, cross_edges(config, ftlists)
+    )
+
+    return ftlists
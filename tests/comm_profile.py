@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# usage: comm_profile.py [<num messages> [<subscriber delay in us>]]
+# measures publish -> subscribe throughput of the ZMQ and AMQP comm
+# classes with the same workload: publisher and subscriber run in
+# separate processes, the subscriber optionally spends <delay> us per
+# message. AMQP requires a local RabbitMQ broker.
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import sys
+import time
+import tempfile
+import shutil
+import subprocess
+
+import gevent
+import gevent.event
+import ujson
+
+import minemeld.comm
+
+TOPIC = 'mbus:commprofile'
+IDLE_TIMEOUT = 10
+
+
+class _Counter(object):
+    def __init__(self, num_messages, delay):
+        self.name = 'commprofile'
+        self.num_messages = num_messages
+        self.delay = delay
+        self.received = 0
+        self.last_received = time.time()
+        self.done = gevent.event.Event()
+
+    def update(self, indicator=None, value=None):
+        if self.delay:
+            # busy wait, like a node processing the update
+            t = time.time()+self.delay
+            while time.time() < t:
+                pass
+
+        self.received += 1
+        self.last_received = time.time()
+        if self.received == self.num_messages:
+            self.done.set()
+
+
+def subscriber(commclass, config, num_messages, delay):
+    counter = _Counter(num_messages, delay)
+
+    sub = minemeld.comm.factory(commclass, config)
+    sub.request_sub_channel(TOPIC, counter, allowed_methods=['update'])
+    sub.start()
+
+    sys.stdout.write('READY\n')
+    sys.stdout.flush()
+
+    # stops when all the messages are received or nothing has been
+    # received for IDLE_TIMEOUT seconds
+    while not counter.done.wait(timeout=1):
+        if time.time()-counter.last_received > IDLE_TIMEOUT:
+            break
+
+    sub.stop()
+
+    sys.stdout.write('RECEIVED %d\n' % counter.received)
+    sys.stdout.flush()
+
+
+def profile(commclass, config, num_messages, delay):
+    sub = subprocess.Popen(
+        [sys.executable, __file__, '--subscriber', commclass,
+         ujson.dumps(config), str(num_messages), str(delay)],
+        stdout=subprocess.PIPE
+    )
+    try:
+        if sub.stdout.readline().strip() != 'READY':
+            raise RuntimeError('subscriber failed')
+
+        pub = minemeld.comm.factory(commclass, config)
+        pc = pub.request_pub_channel(TOPIC)
+        with gevent.Timeout(5):
+            pub.start()
+
+        value = {
+            'type': 'IPv4',
+            'sources': ['commprofile'],
+            'confidence': 100
+        }
+
+        t1 = time.time()
+        for j in xrange(num_messages):
+            indicator = '10.%d.%d.%d' % (
+                j >> 16 & 0xff, j >> 8 & 0xff, j & 0xff
+            )
+            pc.publish('update', {
+                'indicator': indicator,
+                'value': value
+            })
+        t2 = time.time()
+
+        received = sub.stdout.readline().strip()
+        t3 = time.time()
+        received = int(received.split()[-1])
+
+        pub.stop()
+
+    finally:
+        if sub.poll() is None:
+            sub.kill()
+        sub.wait()
+
+    # t3 includes the subscriber idle timeout if messages were lost
+    print "TIME: %s published %d messages in %f, delivered %d in %f " \
+        "(%f/s)" % (commclass, num_messages, (t2-t1), received,
+                    (t3-t1), received/(t3-t1))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--subscriber':
+        subscriber(
+            sys.argv[2],
+            ujson.loads(sys.argv[3]),
+            int(sys.argv[4]),
+            float(sys.argv[5])
+        )
+        sys.exit(0)
+
+    num_messages = 100000
+    if len(sys.argv) > 1:
+        num_messages = int(sys.argv[1])
+
+    delay = 0
+    if len(sys.argv) > 2:
+        delay = int(sys.argv[2])/1000000.0
+
+    path = tempfile.mkdtemp(prefix='minemeld.commprofile')
+    try:
+        profile('ZMQ', {'path': path}, num_messages, delay)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+    try:
+        profile('AMQP', {}, num_messages, delay)
+    except (Exception, gevent.Timeout) as e:
+        print "AMQP not available: %s" % e
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# usage: condition_profile.py [<num nodes>]
+# creates the filters of <num nodes> (default 300) nodes sharing the
+# same prototype filters, without cache, with the in-process cache and
+# with the cache loaded from disk
+
+import sys
+import os
+import time
+import tempfile
+
+import minemeld.ft.base
+import minemeld.ft.condition
+
+PROTOTYPE_FILTERS = [
+    {
+        'name': 'accept withdraws',
+        'conditions': ["__method == 'withdraw'"],
+        'actions': ['accept']
+    },
+    {
+        'name': 'accept IPv4',
+        'conditions': ["type == 'IPv4'", "confidence >= 50"],
+        'actions': ['accept']
+    },
+    {
+        'name': 'accept URL',
+        'conditions': ["type == 'URL'", "length(sources) > 1"],
+        'actions': ['accept']
+    },
+    {
+        'name': 'drop all',
+        'actions': ['drop']
+    }
+]
+
+
+def create_filters(num_nodes, clear_cache=False):
+    for j in xrange(num_nodes):
+        if clear_cache:
+            minemeld.ft.condition.interface._CACHE.clear()
+
+        minemeld.ft.base._Filters(PROTOTYPE_FILTERS)
+        minemeld.ft.base._Filters(PROTOTYPE_FILTERS)
+
+
+if __name__ == '__main__':
+    num_nodes = 300
+    if len(sys.argv) > 1:
+        num_nodes = int(sys.argv[1])
+
+    t1 = time.time()
+    create_filters(num_nodes, clear_cache=True)
+    t2 = time.time()
+    print "TIME: no cache, filters of %d nodes in %f" % (num_nodes, (t2-t1))
+
+    minemeld.ft.condition.interface._CACHE.clear()
+    t1 = time.time()
+    create_filters(num_nodes)
+    t2 = time.time()
+    print "TIME: in-process cache, filters of %d nodes in %f" % \
+        (num_nodes, (t2-t1))
+
+    path = tempfile.mktemp(prefix='minemeld.conditioncache')
+    minemeld.ft.condition.save_cache(path)
+
+    minemeld.ft.condition.interface._CACHE.clear()
+    t1 = time.time()
+    minemeld.ft.condition.load_cache(path)
+    create_filters(num_nodes)
+    t2 = time.time()
+    print "TIME: disk cache, filters of %d nodes in %f" % (num_nodes, (t2-t1))
+
+    os.remove(path)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# usage: feedredis_profile.py [<num entries> ...]
+# generates the JSON output of feeds with <num entries> (default 1000,
+# 10000, 100000) indicators, with one HGET per indicator and with
+# the pipelined HMGET per page, and measures the cost of serving the
+# same feed again from the rendered feeds cache. Requires a redis server at REDIS_URL
+# (default redis://127.0.0.1:6379/0), the feed key is deleted at the end
+
+import sys
+import os
+import time
+import cStringIO
+
+import redis
+
+import minemeld.flask.feedredis
+
+FEED = 'minemeld.feedredisprofile'
+
+
+def hget_json_feed(SR, feed):
+    # previous implementation of generate_json_feed, one HGET
+    # per indicator
+    yield '[\n'
+
+    cstart = 0
+    firstelement = True
+    while True:
+        ilist = SR.zrange(feed, cstart, cstart+99)
+
+        result = cStringIO.StringIO()
+        for i in ilist:
+            v = SR.hget(feed+'.value', i)
+            if v is None:
+                v = 'null'
+
+            if not firstelement:
+                result.write(',\n')
+            result.write('{"indicator":"')
+            result.write(i)
+            result.write('","value":')
+            result.write(v)
+            result.write('}')
+            firstelement = False
+
+        yield result.getvalue()
+
+        if len(ilist) < 100:
+            break
+        cstart += 100
+
+    yield ']\n'
+
+
+def populate(SR, feed, num_entries):
+    SR.delete(feed, feed+'.value')
+
+    pipe = SR.pipeline(transaction=False)
+    for j in xrange(num_entries):
+        i = '10.%d.%d.%d' % (j >> 16 & 0xFF, j >> 8 & 0xFF, j & 0xFF)
+        pipe.zadd(feed, j, i)
+        pipe.hset(
+            feed+'.value', i,
+            '{"type":"IPv4","confidence":50,"sources":["s1"]}'
+        )
+        if j % 1000 == 999:
+            pipe.execute()
+    pipe.execute()
+
+
+if __name__ == '__main__':
+    counts = [1000, 10000, 100000]
+    if len(sys.argv) > 1:
+        counts = [int(a) for a in sys.argv[1:]]
+
+    SR = redis.StrictRedis.from_url(
+        os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+    )
+    minemeld.flask.feedredis.SR = SR
+
+    for num_entries in counts:
+        populate(SR, FEED, num_entries)
+
+        t1 = time.time()
+        r1 = ''.join(hget_json_feed(SR, FEED))
+        t2 = time.time()
+        print "TIME: HGET %d entries in %f" % (num_entries, (t2-t1))
+
+        t1 = time.time()
+        r2 = ''.join(minemeld.flask.feedredis.generate_json_feed(
+            FEED, 0, None, False, 'json'
+        ))
+        t2 = time.time()
+        print "TIME: pipelined HMGET %d entries in %f (page size %d)" % \
+            (num_entries, (t2-t1), minemeld.flask.feedredis._page_size())
+
+        assert r1 == r2
+
+        # repeated polls of an unchanged feed, generation check
+        # and cache lookup
+        cache = minemeld.flask.feedredis._FeedCache()
+        key = (FEED, 'json', 0, None, False)
+        SR.set(FEED+'.generation', 1)
+        cache.put(key, SR.get(FEED+'.generation'), r2, 64*1024*1024)
+
+        t1 = time.time()
+        for j in xrange(100):
+            entry = cache.get(key, SR.get(FEED+'.generation'))
+        t2 = time.time()
+        print "TIME: cached %d entries in %f" % (num_entries, (t2-t1)/100)
+
+        assert entry['body'] == r2
+
+    SR.delete(FEED, FEED+'.value', FEED+'.generation')
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# usage: filters_profile.py [<num updates>]
+# applies a set of 12 filter rules to <num updates> (default 100k)
+# updates with the compiled filters and with JMESPath evaluation
+# on a copy of the value
+
+import sys
+import copy
+import time
+import random
+
+import minemeld.ft.base
+
+FILTERS = [
+    {
+        'name': 'rule%d' % j,
+        'conditions': [
+            "type == 'IPv%d'" % (4+j % 3),
+            "confidence < %d" % (10*j),
+            "__method == 'update'"
+        ],
+        'actions': ['drop']
+    } for j in range(10)
+] + [
+    {
+        'name': 'rule_length',
+        'conditions': ['length(sources) > 2'],
+        'actions': ['drop']
+    },
+    {
+        'name': 'accept_all',
+        'actions': ['accept']
+    }
+]
+
+
+def jmespath_apply(filters, origin=None, method=None, indicator=None,
+                   value=None):
+    # previous implementation of _Filters.apply
+    if value is None:
+        d = {}
+    else:
+        d = copy.copy(value)
+
+    if indicator is not None:
+        d['__indicator'] = indicator
+    if method is not None:
+        d['__method'] = method
+    if origin is not None:
+        d['__origin'] = origin
+
+    for f in filters.filters:
+        r = True
+        for c in f['conditions']:
+            r &= c.eval(d)
+
+        if not r:
+            continue
+
+        for a in f['actions']:
+            if a == 'accept':
+                d.pop('__indicator')
+                d.pop('__origin', None)
+                d.pop('__method', None)
+                return indicator, d
+
+            elif a == 'drop':
+                return None, None
+
+    d.pop('__indicator')
+    d.pop('__origin', None)
+    d.pop('__method', None)
+
+    return indicator, d
+
+
+def updates(num_updates):
+    for j in xrange(num_updates):
+        yield '10.0.%d.%d' % (j >> 8 & 0xFF, j & 0xFF), {
+            'type': random.choice(['IPv4', 'IPv6', 'URL', 'domain']),
+            'confidence': random.randint(0, 100),
+            'sources': ['s%d' % k for k in range(random.randint(1, 2))],
+            'first_seen': 1000*j,
+            'last_seen': 1000*j
+        }
+
+
+if __name__ == '__main__':
+    num_updates = 100000
+    if len(sys.argv) > 1:
+        num_updates = int(sys.argv[1])
+
+    filters = minemeld.ft.base._Filters(FILTERS)
+    dataset = list(updates(num_updates))
+
+    t1 = time.time()
+    r1 = [
+        jmespath_apply(filters, origin='n1', method='update',
+                       indicator=i, value=v)
+        for i, v in dataset
+    ]
+    t2 = time.time()
+    print "TIME: JMESPath %d updates in %f (%f/s)" % \
+        (num_updates, (t2-t1), num_updates/(t2-t1))
+
+    t1 = time.time()
+    r2 = [
+        filters.apply(origin='n1', method='update', indicator=i, value=v)
+        for i, v in dataset
+    ]
+    t2 = time.time()
+    print "TIME: compiled %d updates in %f (%f/s)" % \
+        (num_updates, (t2-t1), num_updates/(t2-t1))
+
+    assert r1 == r2
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# usage: ipop_profile.py [<num prefixes>]
+# aggregates <num prefixes> (default 1M) random IPv6 prefixes
+# with AggregateIPv6FT
+
+import sys
+import random
+import tempfile
+import time
+import shutil
+
+import mock
+import netaddr
+
+import minemeld.ft.ipop
+
+FTNAME = tempfile.mktemp(prefix='minemeld.ipopprofile')
+
+
+class _NullChannel(object):
+    def publish(self, method, params=None):
+        pass
+
+
+def prefixes(num_prefixes):
+    for j in xrange(num_prefixes):
+        # prefixes inside 2000::/16, overlaps are rare but possible
+        plen = random.choice([48, 56, 64, 128])
+        net = random.getrandbits(plen-16) << (128-plen)
+        net = net | (0x2000 << 112)
+        yield '%s/%d' % (netaddr.IPAddress(net, 6), plen)
+
+
+if __name__ == '__main__':
+    num_prefixes = 1000000
+    if len(sys.argv) > 1:
+        num_prefixes = int(sys.argv[1])
+
+    chassis = mock.Mock()
+    chassis.request_pub_channel.return_value = _NullChannel()
+
+    a = minemeld.ft.ipop.AggregateIPv6FT(FTNAME, chassis, {})
+    a.connect(['s1'], True)
+    a.mgmtbus_initialize()
+    a.start()
+
+    t1 = time.time()
+    for p in prefixes(num_prefixes):
+        a.filtered_update('s1', indicator=p, value={
+            'type': 'IPv6',
+            'sources': ['s1s']
+        })
+    t2 = time.time()
+    print "TIME: Aggregated %d IPv6 prefixes in %f (%f/s)" % \
+        (num_prefixes, (t2-t1), num_prefixes/(t2-t1))
+
+    a.stop()
+    a.st.close()
+
+    shutil.rmtree(FTNAME, ignore_errors=True)
+    shutil.rmtree(FTNAME+'_st', ignore_errors=True)
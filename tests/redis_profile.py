@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+# usage: redis_profile.py [<num indicators>]
+# writes <num indicators> (default 100000) indicators to a RedisSet
+# with batch_size 1, with the default batch_size, with atomic_add and
+# replaying after a reset with shadow_rebuild.
+# Requires a redis server on localhost, the keys are deleted at the end
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import sys
+import time
+
+import mock
+
+import minemeld.ft.redis
+
+FTNAME = 'minemeld.redisprofile'
+
+
+def run(num_indicators, config):
+    config = dict(config, store_value=True)
+
+    chassis = mock.Mock()
+    chassis.request_pub_channel.return_value = None
+
+    r = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+    r.connect(['s1'], False)
+    r.mgmtbus_reset()
+    r.start()
+
+    t1 = time.time()
+    for j in xrange(num_indicators):
+        i = '10.%d.%d.%d' % (j >> 16 & 0xFF, j >> 8 & 0xFF, j & 0xFF)
+        r.filtered_update('s1', indicator=i, value={
+            'type': 'IPv4',
+            'last_seen': j,
+            'sources': ['s1s']
+        })
+    assert r.length() == num_indicators
+    t2 = time.time()
+
+    r.stop()
+    minemeld.ft.redis.RedisSet.gc(FTNAME)
+
+    return t2-t1
+
+
+if __name__ == '__main__':
+    num_indicators = 100000
+    if len(sys.argv) > 1:
+        num_indicators = int(sys.argv[1])
+
+    for label, config in [
+            ('batch_size 1', {'batch_size': 1}),
+            ('batched', {}),
+            ('batched atomic_add', {'atomic_add': True}),
+            ('batched shadow_rebuild', {'shadow_rebuild': True})]:
+        dt = run(num_indicators, config)
+        print "TIME: %s %d indicators in %f (%f/s)" % \
+            (label, num_indicators, dt, num_indicators/dt)
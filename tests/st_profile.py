@@ -25,22 +25,24 @@ TABLENAME = tempfile.mktemp(prefix='minemeld.ftsttest')
 
 
 def queries(st):
-    # t1 = time.time()
-    # j = 0
-    # for j in xrange(num_queries):
-    #     q = random.randint(0, 0xFFFFFFFF)
-    # t2 = time.time()
-    # dt = t2-t1
+    for j in xrange(num_queries):
+        q = random.randint(0, 0xFFFFFFFF)
+        next(st.cover(q), None)
 
-    # t1 = time.time()
 
-    j = 0
+def endpoint_queries(st):
     for j in xrange(num_queries):
         q = random.randint(0, 0xFFFFFFFF)
-        next(st.cover(q), None)
-    # t2 = time.time()
+        next(st.query_endpoints(start=0, stop=q, reverse=True), None)
+
+
+def timeit(label, f, *args):
+    t1 = time.time()
+    result = f(*args)
+    t2 = time.time()
+    print "TIME: %s in %f" % (label, (t2-t1))
+    return result
 
-    # print "TIME: Queried %d times in %d" % (num_queries, (t2-t1-dt))
 
 if __name__ == '__main__':
     num_intervals = 100000
@@ -73,4 +75,19 @@ if __name__ == '__main__':
     t2 = time.time()
     print "TIME: Inserted %d intervals in %d" % (num_intervals, (t2-t1-dt))
 
-    queries(st)
+    timeit('In memory - %d cover queries' % num_queries, queries, st)
+    timeit('In memory - %d endpoint queries' % num_queries,
+           endpoint_queries, st)
+    st.close()
+
+    st = timeit(
+        'In memory - rebuilt index of %d intervals' % num_intervals,
+        minemeld.ft.st.ST, TABLENAME, 32
+    )
+    st.close()
+
+    st = minemeld.ft.st.ST(TABLENAME, 32, in_memory=False)
+    timeit('LevelDB - %d cover queries' % num_queries, queries, st)
+    timeit('LevelDB - %d endpoint queries' % num_queries,
+           endpoint_queries, st)
+    st.close()
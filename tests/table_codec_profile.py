@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import minemeld.ft.table
+
+
+def typical_value(j):
+    now = 1483184218151 + random.randint(0, 3600000)
+    return {
+        'type': 'IPv4',
+        'confidence': 50,
+        'share_level': 'green',
+        'direction': 'inbound',
+        'sources': ['example.feed'],
+        'first_seen': now,
+        'last_seen': now,
+        '_last_run': now,
+        '_age_out': now + 30 * 86400000,
+        'description': 'indicator %d' % j
+    }
+
+
+def disk_size(path):
+    result = 0
+    for f in os.listdir(path):
+        result += os.path.getsize(os.path.join(path, f))
+    return result
+
+
+if __name__ == '__main__':
+    num_values = 100000
+    values = [typical_value(j) for j in xrange(num_values)]
+
+    for codec in sorted(minemeld.ft.table.VALUE_CODECS.keys()):
+        c = minemeld.ft.table.VALUE_CODECS[codec]()
+
+        encoded = [c.encode(v) for v in values]
+        size = sum([len(e) for e in encoded])
+
+        t1 = time.time()
+        for e in encoded:
+            c.decode(e)
+        t2 = time.time()
+        print "%s: Decoded %d values in %f - avg size %f bytes" % \
+            (codec, num_values, (t2-t1), float(size)/num_values)
+
+        tablename = tempfile.mktemp(prefix='minemeld.ftcodectest')
+        table = minemeld.ft.table.Table(tablename, codec=codec)
+        table.create_index('_age_out')
+        with table.batch():
+            for j, v in enumerate(values):
+                table.put('i%d' % j, v)
+
+        t1 = time.time()
+        for i, v in table.query(index='_age_out', include_value=True):
+            pass
+        t2 = time.time()
+        print "%s: Scanned _age_out with values in %f" % (codec, (t2-t1))
+
+        table.close()
+        print "%s: Table size on disk %d bytes" % (codec, disk_size(tablename))
+
+        shutil.rmtree(tablename)
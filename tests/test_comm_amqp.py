@@ -16,6 +16,8 @@ import gevent.monkey
 gevent.monkey.patch_all(thread=False, select=False)
 
 import unittest
+import mock
+import ujson as json
 
 import minemeld.comm.amqp
 
@@ -87,3 +89,93 @@ class MineMeldCommAMQP(unittest.TestCase):
         self.assertEqual(result['answers'], {'a1': 1, 'a2': 2})
 
         ac.stop()
+
+    def test_04_pub_batch(self):
+        pc = minemeld.comm.amqp.AMQPPubChannel(
+            'a',
+            batch_size=3,
+            batch_timeout=0.1
+        )
+        pc.channel = mock.Mock()
+
+        def _bodies():
+            return [
+                json.loads(args[0].body)
+                for args, _ in pc.channel.basic_publish.call_args_list
+            ]
+
+        pc.publish('update', {'indicator': 'i1'})
+        pc.publish('withdraw', {'indicator': 'i2'})
+        self.assertEqual(pc.channel.basic_publish.call_count, 0)
+
+        pc.publish('update', {'indicator': 'i3'})
+        self.assertEqual(_bodies(), [
+            {'batch': [
+                {'method': 'update', 'params': {'indicator': 'i1'}},
+                {'method': 'withdraw', 'params': {'indicator': 'i2'}},
+                {'method': 'update', 'params': {'indicator': 'i3'}}
+            ]}
+        ])
+
+        # other methods flush the batch first
+        pc.channel.basic_publish.reset_mock()
+        pc.publish('update', {'indicator': 'i4'})
+        pc.publish('checkpoint', {'value': 'c1'})
+        self.assertEqual(_bodies(), [
+            {'batch': [
+                {'method': 'update', 'params': {'indicator': 'i4'}}
+            ]},
+            {'method': 'checkpoint', 'params': {'value': 'c1'}}
+        ])
+
+        # time limit
+        pc.channel.basic_publish.reset_mock()
+        pc.publish('update', {'indicator': 'i5'})
+        gevent.sleep(0.2)
+        self.assertEqual(_bodies(), [
+            {'batch': [
+                {'method': 'update', 'params': {'indicator': 'i5'}}
+            ]}
+        ])
+
+        # size limit
+        pc.channel.basic_publish.reset_mock()
+        pc.batch_max_bytes = 10
+        pc.publish('update', {'indicator': 'i6'})
+        self.assertEqual(pc.channel.basic_publish.call_count, 1)
+
+    def test_05_sub_batch(self):
+        class A(object):
+            def __init__(self):
+                self.calls = []
+
+            def update(self, indicator=None):
+                self.calls.append(('update', indicator))
+
+            def withdraw(self, indicator=None):
+                self.calls.append(('withdraw', indicator))
+
+        a = A()
+        sc = minemeld.comm.amqp.AMQPSubChannel(
+            'a',
+            [(a, ['update', 'withdraw'])]
+        )
+
+        msg = mock.Mock()
+        msg.body = json.dumps({
+            'method': 'update',
+            'params': {'indicator': 'i1'}
+        })
+        sc._callback(msg)
+
+        msg.body = json.dumps({'batch': [
+            {'method': 'withdraw', 'params': {'indicator': 'i1'}},
+            {'method': 'update', 'params': {'indicator': 'i2'}}
+        ]})
+        sc._callback(msg)
+
+        self.assertEqual(a.calls, [
+            ('update', 'i1'),
+            ('withdraw', 'i1'),
+            ('update', 'i2')
+        ])
@@ -0,0 +1,259 @@
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import os
+import glob
+import socket
+import unittest
+import tempfile
+import shutil
+
+import gevent
+
+import minemeld.comm
+import minemeld.comm.zmq
+
+
+class MineMeldCommZMQ(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='minemeld.zmqtest')
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_factory(self):
+        c = minemeld.comm.factory('ZMQ', {'path': self.path})
+        self.assertIsInstance(c, minemeld.comm.zmq.ZMQ)
+
+    def test_01_rpc(self):
+        class A(object):
+            def f(self, x=None):
+                return 'ok%s' % x
+
+        a = A()
+
+        zc = minemeld.comm.zmq.ZMQ({'path': self.path})
+        zc.request_rpc_server_channel('a', a, allowed_methods=['f'])
+        zc.start()
+
+        result = zc.send_rpc('a', 'f', {'x': 1}, timeout=1)
+        self.assertEqual(result['result'], 'ok1')
+        self.assertEqual(result['error'], None)
+
+        result = zc.send_rpc('a', 'g', {}, timeout=1)
+        self.assertEqual(result['result'], None)
+        self.assertEqual(result['error'], 'Method not allowed')
+
+        zc.stop()
+
+    def test_02_pubsub(self):
+        class A(object):
+            counter = 0
+
+            def f(self):
+                self.counter += 1
+
+        a = A()
+
+        zc = minemeld.comm.zmq.ZMQ({'path': self.path})
+        zc.request_sub_channel('a', a, allowed_methods=['f'])
+        pc = zc.request_pub_channel('a')
+        zc.start()
+
+        for _ in range(25):
+            pc.publish('f')
+        pc.publish('g')
+        gevent.sleep(0.1)
+
+        self.assertEqual(a.counter, 25)
+
+        zc.stop()
+
+    def test_03_rpc_fanout(self):
+        class A(object):
+            def __init__(self, n):
+                self.n = n
+
+            def f(self):
+                return self.n
+
+        a1 = A(1)
+        a2 = A(2)
+
+        zc = minemeld.comm.zmq.ZMQ({'path': self.path})
+        zc.request_rpc_server_channel('a1', a1, allowed_methods=['f'],
+                                      fanout='test')
+        zc.request_rpc_server_channel('a2', a2, allowed_methods=['f'],
+                                      fanout='test')
+        client = zc.request_rpc_fanout_client_channel('test')
+        zc.start()
+
+        result = client.send_rpc('f', num_results=2).get(timeout=1)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['answers'], {'a1': 1, 'a2': 2})
+
+        zc.stop()
+
+    def test_04_multiprocess_pubsub(self):
+        # publisher and subscribers in separate comm instances,
+        # subscribers started after the publisher
+        class A(object):
+            def __init__(self, name):
+                self.name = name
+                self.values = []
+
+            def update(self, value=None):
+                self.values.append(value)
+
+        pub = minemeld.comm.zmq.ZMQ({
+            'path': self.path,
+            'discovery_interval': 0
+        })
+        pc = pub.request_pub_channel('t')
+        pub.start()
+
+        a1 = A('a1')
+        a2 = A('a2')
+        subs = []
+        for a in [a1, a2]:
+            zc = minemeld.comm.zmq.ZMQ({'path': self.path})
+            zc.request_sub_channel('t', a, allowed_methods=['update'])
+            zc.start()
+            subs.append(zc)
+
+        for j in range(5):
+            pc.publish('update', {'value': j})
+        gevent.sleep(0.1)
+
+        self.assertEqual(a1.values, range(5))
+        self.assertEqual(a2.values, range(5))
+
+        for zc in subs:
+            zc.stop()
+        pub.stop()
+
+    def test_05_path_permissions(self):
+        os.chmod(self.path, 0755)
+
+        zc = minemeld.comm.zmq.ZMQ({'path': self.path})
+        self.assertRaises(RuntimeError, zc.start)
+
+        os.chmod(self.path, 0700)
+        npath = os.path.join(self.path, 'new')
+        zc = minemeld.comm.zmq.ZMQ({'path': npath})
+        zc.start()
+        self.assertEqual(os.stat(npath).st_mode & 0777, 0700)
+        zc.stop()
+
+    def test_06_stale_endpoints(self):
+        # endpoint left by a dead process
+        stale = os.path.join(self.path, 's-0000-0000')
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        s.bind(stale)
+        s.close()
+
+        live = minemeld.comm.zmq.ZMQ({'path': self.path})
+        live.request_rpc_server_channel('a', object())
+        live.start()
+
+        zc = minemeld.comm.zmq.ZMQ({'path': self.path})
+        zc.start()
+
+        self.assertFalse(os.path.exists(stale))
+        self.assertEqual(
+            len(glob.glob(os.path.join(self.path, 'r-*'))),
+            1
+        )
+
+        zc.stop()
+        live.stop()
+
+    def test_07_hwm(self):
+        class A(object):
+            def f(self):
+                pass
+
+        zc = minemeld.comm.zmq.ZMQ({'path': self.path, 'hwm': 10})
+        zc.request_sub_channel('a', A(), allowed_methods=['f'],
+                               max_length=10)
+        pc = zc.request_pub_channel('a')
+        # receiver not dispatching, messages to the channel with
+        # max_length over the HWMs are dropped
+        zc.start(start_dispatching=False)
+
+        for _ in range(100):
+            pc.publish('f')
+
+        self.assertGreater(zc.endpoints.num_dropped, 0)
+        self.assertEqual(zc.sub_channels['a'].socket.getsockopt(
+            minemeld.comm.zmq.zmq.RCVHWM
+        ), 10)
+
+        zc.stop()
+
+    def test_08_slow_subscriber(self):
+        class A(object):
+            def __init__(self):
+                self.values = []
+
+            def update(self, value=None):
+                self.values.append(value)
+                gevent.sleep(0.001)
+
+        a = A()
+
+        sub = minemeld.comm.zmq.ZMQ({'path': self.path, 'hwm': 10})
+        sub.request_sub_channel('a', a, allowed_methods=['update'])
+        sub.start()
+
+        pub = minemeld.comm.zmq.ZMQ({'path': self.path, 'hwm': 10})
+        pc = pub.request_pub_channel('a')
+        pub.start()
+
+        # the publisher waits for the subscriber, nothing is lost
+        for j in range(200):
+            pc.publish('update', {'value': j})
+        gevent.sleep(0.5)
+
+        self.assertEqual(a.values, range(200))
+        self.assertEqual(pub.endpoints.num_dropped, 0)
+
+        pub.stop()
+        sub.stop()
+
+    def test_09_send_timeout(self):
+        class A(object):
+            def f(self, x=None):
+                pass
+
+        zc = minemeld.comm.zmq.ZMQ({
+            'path': self.path,
+            'hwm': 10,
+            'send_timeout': 0.2
+        })
+        zc.request_sub_channel('a', A(), allowed_methods=['f'])
+        pc = zc.request_pub_channel('a')
+        zc.start(start_dispatching=False)
+
+        # large enough to fill the socket buffers too
+        def _publish():
+            for _ in range(100):
+                pc.publish('f', {'x': 'x'*100000})
+
+        self.assertRaises(RuntimeError, _publish)
+
+        zc.stop()
@@ -0,0 +1,157 @@
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""FT fabric tests
+
+Unit tests for minemeld.fabric
+"""
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import unittest
+import mock
+
+import gevent
+
+import minemeld.fabric
+
+
+class _Node(object):
+    def __init__(self):
+        self.received = []
+
+    def update(self, source=None, indicator=None, value=None):
+        self.received.append(('update', source, indicator, value))
+
+    def withdraw(self, source=None, indicator=None, value=None):
+        self.received.append(('withdraw', source, indicator, value))
+
+
+class MineMeldFabricTests(unittest.TestCase):
+    @mock.patch('minemeld.comm.factory')
+    def test_local_delivery(self, comm_factory):
+        comm = comm_factory.return_value
+
+        f = minemeld.fabric.factory('AMQP', mock.Mock(), {})
+        f.set_remote_topics([])
+
+        n1 = _Node()
+        pc = f.request_pub_channel('a')
+        f.request_sub_channel('b', n1, 'a', ['update', 'withdraw'])
+        f.start()
+
+        self.assertFalse(comm.request_pub_channel.called)
+        self.assertFalse(comm.request_sub_channel.called)
+
+        value = {'type': 'IPv4'}
+        pc.publish('update', {'source': 'a', 'indicator': '1.1.1.1',
+                              'value': value})
+        pc.publish('withdraw', {'source': 'a', 'indicator': '1.1.1.1'})
+        pc.publish('checkpoint', {'source': 'a', 'value': 'x'})
+
+        # delivery starts with dispatching
+        gevent.sleep(0)
+        self.assertEqual(n1.received, [])
+
+        f.start_dispatching()
+        gevent.sleep(0)
+
+        self.assertEqual(n1.received, [
+            ('update', 'a', '1.1.1.1', value),
+            ('withdraw', 'a', '1.1.1.1', None)
+        ])
+        # subscribers get a copy
+        self.assertIsNot(n1.received[0][3], value)
+
+        f.stop()
+
+    @mock.patch('minemeld.comm.factory')
+    def test_multiple_local_subscribers(self, comm_factory):
+        f = minemeld.fabric.factory('AMQP', mock.Mock(), {})
+        f.set_remote_topics([])
+
+        n1 = _Node()
+        n2 = _Node()
+        pc = f.request_pub_channel('a')
+        f.request_sub_channel('b', n1, 'a', ['update'])
+        f.request_sub_channel('c', n2, 'a', ['update'])
+        f.start()
+        f.start_dispatching()
+
+        value = {'type': 'IPv4', 'sources': ['s1']}
+        pc.publish('update', {'source': 'a', 'indicator': '1.1.1.1',
+                              'value': value})
+        # changes after publish are not delivered
+        value['sources'].append('s2')
+        gevent.sleep(0)
+
+        self.assertEqual(len(n1.received), 1)
+        self.assertEqual(n1.received, n2.received)
+        self.assertIsNot(n1.received[0][3], n2.received[0][3])
+
+        # nested values are not shared between subscribers
+        n1.received[0][3]['sources'].append('s3')
+        self.assertEqual(n2.received[0][3]['sources'], ['s1'])
+
+        f.stop()
+
+    @mock.patch('minemeld.comm.factory')
+    def test_remote(self, comm_factory):
+        comm = comm_factory.return_value
+
+        f = minemeld.fabric.factory('AMQP', mock.Mock(), {})
+        f.set_remote_topics(['a'])
+
+        n1 = _Node()
+        n2 = _Node()
+        pca = f.request_pub_channel('a')
+        pcb = f.request_pub_channel('b')
+        f.request_sub_channel('b', n1, 'a', ['update'])
+        f.request_sub_channel('c', n2, 'x', ['update'])
+        f.start()
+        f.start_dispatching()
+
+        comm.request_pub_channel.assert_called_once_with('a')
+        comm.request_sub_channel.assert_called_once_with(
+            'x', n2, ['update']
+        )
+
+        params = {'source': 'a', 'indicator': '1.1.1.1', 'value': None}
+        pca.publish('update', params)
+        pcb.publish('update', params)
+        gevent.sleep(0)
+
+        comm.request_pub_channel.return_value.publish.assert_called_once_with(
+            'update', params
+        )
+        self.assertEqual(len(n1.received), 1)
+
+        f.stop()
+
+    @mock.patch('minemeld.comm.factory')
+    def test_remote_unknown(self, comm_factory):
+        comm = comm_factory.return_value
+
+        f = minemeld.fabric.factory('AMQP', mock.Mock(), {})
+
+        n1 = _Node()
+        f.request_pub_channel('a')
+        f.request_sub_channel('b', n1, 'a', ['update'])
+        f.start()
+
+        comm.request_pub_channel.assert_called_once_with('a')
+        self.assertFalse(comm.request_sub_channel.called)
+
+        f.stop()
@@ -0,0 +1,386 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""Flask feedredis tests
+
+Unit tests for minemeld.flask.feedredis
+"""
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import unittest
+import mock
+import os
+import zlib
+import ujson
+
+import flask
+import gevent
+
+os.environ['MM_CONFIG'] = '.'
+os.environ['API_CONFIG_LOCK'] = os.path.join('.', 'api-config.lock')
+
+import minemeld.flask.feedredis
+
+APP = flask.Flask(__name__)
+
+REDISSET = 'minemeld.ft.redis.RedisSet'
+
+
+class _Formatter(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.calls = 0
+
+    def __call__(self, feed, start, num, desc, value):
+        self.calls += 1
+        for c in self.chunks:
+            yield c
+
+
+class MineMeldFlaskFeedRedisTests(unittest.TestCase):
+    def setUp(self):
+        self.config = {}
+        self.generation = '1'
+
+        self.patches = [
+            mock.patch.object(
+                minemeld.flask.feedredis,
+                '_FEED_CACHE',
+                minemeld.flask.feedredis._FeedCache()
+            ),
+            mock.patch.object(minemeld.flask.feedredis, 'SR'),
+            mock.patch('minemeld.flask.config.get')
+        ]
+        self.cache = self.patches[0].start()
+        srmock = self.patches[1].start()
+        configmock = self.patches[2].start()
+
+        srmock.get.side_effect = lambda key: self.generation
+        configmock.side_effect = lambda key, default=None: \
+            self.config.get(key, default)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def _get(self, formatter, headers=None):
+        with APP.test_request_context('/feeds/feed1', headers=headers):
+            response = minemeld.flask.feedredis._feed_response(
+                'feed1', formatter, 'text/plain', 0, None, False, None
+            )
+            # reading the body changes is_streamed
+            response.streamed = response.is_streamed
+            response.data = response.get_data()
+
+        return response
+
+    def test_cache_lru(self):
+        c = minemeld.flask.feedredis._FeedCache()
+
+        e = c.put('a', '1', 'x'*100, 250)
+        self.assertIs(c.get('a', '1'), e)
+        self.assertEqual(c.get('a', '2'), None)
+        self.assertEqual(c.size, 0)
+
+        c.put('a', '1', 'x'*100, 250)
+        c.put('b', '1', 'x'*100, 250)
+        c.get('a', '1')
+        c.put('c', '1', 'x'*100, 250)
+        # b is the least recently used
+        self.assertEqual(c.get('b', '1'), None)
+        self.assertNotEqual(c.get('a', '1'), None)
+        self.assertNotEqual(c.get('c', '1'), None)
+        self.assertEqual(c.size, 200)
+
+        # larger than the cache
+        c.put('d', '1', 'x'*300, 250)
+        self.assertEqual(c.get('d', '1'), None)
+        self.assertEqual(c.size, 200)
+
+    def test_hit_miss(self):
+        f = _Formatter(['a\n', 'b\n'])
+
+        r1 = self._get(f)
+        self.assertEqual(r1.status_code, 200)
+        self.assertEqual(r1.data, 'a\nb\n')
+        self.assertEqual(f.calls, 1)
+
+        r2 = self._get(f)
+        self.assertEqual(r2.data, 'a\nb\n')
+        self.assertEqual(r2.headers['ETag'], r1.headers['ETag'])
+        self.assertEqual(f.calls, 1)
+
+        self.generation = '2'
+        r3 = self._get(f)
+        self.assertEqual(r3.data, 'a\nb\n')
+        self.assertNotEqual(r3.headers['ETag'], r1.headers['ETag'])
+        self.assertEqual(f.calls, 2)
+
+    def test_not_modified(self):
+        f = _Formatter(['a\n'])
+
+        r1 = self._get(f)
+        etag = r1.headers['ETag']
+
+        r2 = self._get(f, headers={'If-None-Match': etag})
+        self.assertEqual(r2.status_code, 304)
+        self.assertEqual(r2.data, '')
+        self.assertEqual(r2.headers['ETag'], etag)
+
+        # no rendering needed for a 304
+        self.cache._entries.clear()
+        r3 = self._get(f, headers={'If-None-Match': etag})
+        self.assertEqual(r3.status_code, 304)
+        self.assertEqual(f.calls, 1)
+
+        self.generation = '2'
+        r4 = self._get(f, headers={'If-None-Match': etag})
+        self.assertEqual(r4.status_code, 200)
+
+    def test_gzip(self):
+        self.config['FEEDS_GZIP'] = True
+        f = _Formatter(['a\n', 'b\n'])
+
+        plain = self._get(f)
+        self.assertEqual(plain.headers.get('Content-Encoding'), None)
+
+        r1 = self._get(f, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(r1.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(r1.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            zlib.decompress(r1.data, 16+zlib.MAX_WBITS),
+            'a\nb\n'
+        )
+        etag = r1.headers['ETag']
+        self.assertEqual(etag, plain.headers['ETag'][:-1]+'-gzip"')
+
+        r2 = self._get(f, headers={
+            'Accept-Encoding': 'gzip',
+            'If-None-Match': etag
+        })
+        self.assertEqual(r2.status_code, 304)
+
+        # the gzip ETag does not match the plain variant
+        r3 = self._get(f, headers={'If-None-Match': etag})
+        self.assertEqual(r3.status_code, 200)
+        self.assertEqual(r3.data, 'a\nb\n')
+
+        r4 = self._get(f, headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertEqual(r4.headers.get('Content-Encoding'), None)
+        self.assertEqual(f.calls, 1)
+
+    def test_streamed(self):
+        self.config['FEEDS_CACHE_ENTRY_SIZE'] = 3
+        f = _Formatter(['a\n', 'b\n', 'c\n'])
+
+        r1 = self._get(f)
+        self.assertTrue(r1.streamed)
+        self.assertEqual(r1.data, 'a\nb\nc\n')
+        self.assertEqual(len(self.cache._entries), 0)
+
+        r2 = self._get(f)
+        self.assertEqual(r2.data, 'a\nb\nc\n')
+        self.assertEqual(r2.headers['ETag'], r1.headers['ETag'])
+        self.assertEqual(f.calls, 2)
+
+    def test_streamed_not_modified(self):
+        self.config['FEEDS_CACHE_ENTRY_SIZE'] = 3
+        self.config['FEEDS_GZIP'] = True
+        f = _Formatter(['a\n', 'b\n', 'c\n'])
+
+        # streamed feeds are not compressed, also for gzip clients
+        r1 = self._get(f, headers={'Accept-Encoding': 'gzip'})
+        self.assertTrue(r1.streamed)
+        self.assertEqual(r1.headers.get('Content-Encoding'), None)
+        etag = r1.headers['ETag']
+
+        for headers in [{'Accept-Encoding': 'gzip'}, {}]:
+            headers['If-None-Match'] = etag
+            r2 = self._get(f, headers=headers)
+            self.assertEqual(r2.status_code, 304)
+            self.assertEqual(r2.headers['ETag'], etag)
+        self.assertEqual(f.calls, 1)
+
+        self.generation = '2'
+        r3 = self._get(f, headers={
+            'Accept-Encoding': 'gzip',
+            'If-None-Match': etag
+        })
+        self.assertEqual(r3.status_code, 200)
+        self.assertEqual(r3.data, 'a\nb\nc\n')
+        self.assertEqual(f.calls, 2)
+
+    def test_no_generation(self):
+        self.generation = None
+        f = _Formatter(['a\n'])
+
+        r1 = self._get(f)
+        self.assertTrue(r1.streamed)
+        self.assertEqual(r1.data, 'a\n')
+        self.assertNotIn('ETag', r1.headers)
+
+        self.config['FEEDS_CACHE_SIZE'] = 0
+        self.generation = '1'
+        r2 = self._get(f)
+        self.assertNotIn('ETag', r2.headers)
+        self.assertEqual(f.calls, 2)
+
+
+class MineMeldFlaskFeedNodesTests(unittest.TestCase):
+    def setUp(self):
+        self.config = {}
+        self.now = 1000.0
+        self.status = {}
+        self._add('feed1')
+
+        self.patches = [
+            mock.patch.object(minemeld.flask.feedredis, 'MMMaster'),
+            mock.patch.object(minemeld.flask.feedredis, 'time'),
+            mock.patch('minemeld.flask.config.get')
+        ]
+        self.master = self.patches[0].start()
+        timemock = self.patches[1].start()
+        configmock = self.patches[2].start()
+
+        self.master.status.side_effect = lambda: {
+            'result': self.status, 'error': None
+        }
+        timemock.time.side_effect = lambda: self.now
+        configmock.side_effect = lambda key, default=None: \
+            self.config.get(key, default)
+
+        self.nodes = minemeld.flask.feedredis._FeedNodes()
+        # no listener
+        self.nodes._glet = mock.Mock(dead=False)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def _sleep(self, seconds):
+        self.now += seconds
+
+    def _add(self, name):
+        self.status['mbus:slave:'+name] = {'class': REDISSET}
+
+    def _message(self, source, status):
+        return ujson.dumps({'source': source, 'status': status})
+
+    def test_refresh(self):
+        self.assertEqual(self.nodes.get_class('feed1'), REDISSET)
+        self.assertEqual(self.nodes.get_class('feed1'), REDISSET)
+        self.assertEqual(self.master.status.call_count, 1)
+
+        self.master.status.side_effect = lambda: {
+            'result': None, 'error': 'timeout'
+        }
+        self.now += 1
+        self.assertRaises(RuntimeError, self.nodes.get_class, 'feed2')
+
+    def test_missing(self):
+        self.assertEqual(self.nodes.get_class('feed2'), None)
+        self.assertEqual(self.nodes.get_class('feed2'), None)
+        self.assertEqual(self.master.status.call_count, 1)
+
+        # another node waits for the minimum interval and is looked up
+        self._add('feed3')
+        self.now += 0.5
+        with mock.patch.object(minemeld.flask.feedredis.gevent, 'sleep',
+                               side_effect=self._sleep) as sleep_mock:
+            self.assertEqual(self.nodes.get_class('feed3'), REDISSET)
+        sleep_mock.assert_called_once_with(0.5)
+        self.assertEqual(self.master.status.call_count, 2)
+
+        # feed2 is not looked up again until the refresh interval
+        self._add('feed2')
+        self.now += 1
+        self.assertEqual(self.nodes.get_class('feed2'), None)
+        self.now += 10
+        self.assertEqual(self.nodes.get_class('feed2'), REDISSET)
+        self.assertEqual(self.master.status.call_count, 3)
+
+    def test_shared_refresh(self):
+        def _status():
+            gevent.sleep(0.1)
+            return {'result': self.status, 'error': None}
+        self.master.status.side_effect = _status
+        self._add('feed2')
+
+        glets = [
+            gevent.spawn(self.nodes.get_class, name)
+            for name in ['feed1', 'feed2', 'feed3']
+        ]
+        gevent.joinall(glets)
+
+        self.assertEqual([g.value for g in glets], [REDISSET, REDISSET, None])
+        self.assertEqual(self.master.status.call_count, 1)
+
+        # errors are raised in the waiting requests too
+        def _error():
+            gevent.sleep(0.1)
+            return {'result': None, 'error': 'timeout'}
+        self.master.status.side_effect = _error
+        self.now += 60
+
+        glets = [
+            gevent.spawn(self.nodes.get_class, name)
+            for name in ['feed4', 'feed5']
+        ]
+        gevent.joinall(glets)
+
+        for g in glets:
+            self.assertIsInstance(g.exception, RuntimeError)
+        self.assertEqual(self.master.status.call_count, 2)
+
+    def test_update(self):
+        self.assertEqual(self.nodes.get_class('feed2'), None)
+
+        # the status of the new node is published
+        self.nodes._update(self._message('feed2', {'class': REDISSET}))
+        self.assertEqual(self.nodes.get_class('feed2'), REDISSET)
+        self.assertEqual(self.master.status.call_count, 1)
+
+        # invalid messages are ignored
+        self.nodes._update('{')
+        self.nodes._update(ujson.dumps({'source': 'feed3'}))
+        self.nodes._update(self._message('feed3', {}))
+        self.assertEqual(self.nodes.get_class('feed2'), REDISSET)
+        self.assertNotIn('feed3', self.nodes._nodes)
+
+    def test_engine_event(self):
+        self.assertEqual(self.nodes.get_class('feed2'), None)
+
+        self.nodes._update(self._message('<minemeld-engine>', {}))
+        self.assertEqual(self.nodes._nodes, {})
+
+        # the cache is rebuilt on the next request
+        self._add('feed2')
+        self.assertEqual(self.nodes.get_class('feed2'), REDISSET)
+        self.assertEqual(self.master.status.call_count, 2)
+
+    def test_ttl(self):
+        self.config['FEEDS_NODES_TTL'] = 60
+
+        self.assertEqual(self.nodes.get_class('feed1'), REDISSET)
+        self.now += 30
+        self.nodes.get_class('feed1')
+        self.assertEqual(self.master.status.call_count, 1)
+
+        # expired, refreshed from the master
+        self.now += 31
+        self.status = {}
+        self.assertEqual(self.nodes.get_class('feed1'), None)
+        self.assertEqual(self.master.status.call_count, 2)
@@ -262,3 +262,115 @@ class MineMeldFTBaseTests(unittest.TestCase):
         ochannel.publish.reset_mock()
         b.emit_update('testi', {'type': 'IPv6', 'direction': 'outbound'})
         self.assertEqual(ochannel.publish.call_count, 0)
+
+    def test_filters_compiled(self):
+        conditions = [
+            "type == 'IPv4'",
+            "confidence > 50",
+            "confidence == null",
+            "nested == null",
+            "__indicator == '1.1.1.1'",
+            "__method == 'update'",
+            "__origin != 'n1'",
+            "length(sources) > 1",
+            "contains(sources, 's1') == true"
+        ]
+        values = [
+            None,
+            {},
+            {'type': 'IPv4', 'confidence': 70, 'sources': ['s1', 's2']},
+            {'type': 'IPv6', 'confidence': 10, 'sources': ['s2']},
+            {'nested': {'a': 'x'}, '__indicator': '1.1.1.1'},
+            {'nested': 'null', 'type': 'null'},
+            {'nested': 'x'}
+        ]
+
+        for c in conditions:
+            c = minemeld.ft.condition.Condition(c)
+            m = minemeld.ft.base._compile_condition(c)
+
+            for v in values:
+                for i in ['1.1.1.1', None]:
+                    ctx = minemeld.ft.base._FilterContext(v, i, 'update', 'n1')
+                    self.assertEqual(
+                        m(ctx),
+                        c.eval(ctx.document()),
+                        msg='%s on %r %r' % (c.expression, v, i)
+                    )
+
+        f = minemeld.ft.base._Filters([
+            {'conditions': ["type == 'IPv4'"], 'actions': ['drop']},
+            {'actions': ['accept']}
+        ])
+        value = {'type': 'IPv6'}
+        i, v = f.apply(indicator='i', method='update', value=value)
+        self.assertEqual(v, value)
+        self.assertIsNot(v, value)
+        self.assertEqual(
+            f.apply(indicator='i', method='update', value={'type': 'IPv4'}),
+            (None, None)
+        )
+
+    def test_trace_modes(self):
+        chassis = mock.Mock()
+        chassis.request_sub_channel.return_value = None
+        chassis.request_pub_channel.return_value = mock.Mock()
+        chassis.request_rpc_channel.return_value = None
+
+        b = minemeld.ft.base.BaseFT('test', chassis, {
+            'trace_mode': 'sampled',
+            'trace_sample': 4
+        })
+        b.connect([], True)
+        b.mgmtbus_initialize()
+        b.start()
+
+        for j in range(20):
+            b.trace('EMIT_UPDATE', 'i%d' % j)
+        self.assertEqual(chassis.log.call_count, 5)
+        self.assertEqual(b.statistics['trace.dropped'], 15)
+
+        # hashed, indicators are always or never traced
+        b.mgmtbus_signal(signal='trace', mode='hashed')
+        traced = []
+        for _ in range(2):
+            chassis.log.reset_mock()
+            for j in range(100):
+                b.trace('EMIT_UPDATE', 'i%d' % j)
+            traced.append([
+                c[1]['value']['indicator'] for c in chassis.log.call_args_list
+            ])
+        self.assertEqual(traced[0], traced[1])
+        self.assertGreater(len(traced[0]), 0)
+        self.assertLess(len(traced[0]), 100)
+
+        with mock.patch('time.time', return_value=100.0):
+            b.mgmtbus_signal(signal='trace', mode='rate_limited', rate=10)
+            chassis.log.reset_mock()
+            for j in range(50):
+                b.trace('EMIT_UPDATE', 'i%d' % j)
+            self.assertEqual(chassis.log.call_count, 10)
+
+        with mock.patch('time.time', return_value=100.5):
+            chassis.log.reset_mock()
+            for j in range(50):
+                b.trace('EMIT_UPDATE', 'i%d' % j)
+            self.assertEqual(chassis.log.call_count, 5)
+
+        b.mgmtbus_signal(signal='trace', mode='off')
+        chassis.log.reset_mock()
+        b.trace('EMIT_UPDATE', 'i')
+        self.assertEqual(chassis.log.call_count, 0)
+
+        b.mgmtbus_signal(signal='trace', mode='full')
+        b.trace('EMIT_UPDATE', 'i')
+        self.assertEqual(chassis.log.call_count, 1)
+
+        self.assertRaises(
+            ValueError,
+            b.mgmtbus_signal, signal='trace', mode='unknown'
+        )
+        self.assertRaises(
+            NotImplementedError,
+            b.mgmtbus_signal, signal='unknown'
+        )
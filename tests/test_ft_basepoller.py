@@ -110,6 +110,47 @@ class RollingFeed(minemeld.ft.basepoller.BasePollerFT):
         return [[item, {'type': 'IPv4'}]]
 
 
+class UnchangedFeed(minemeld.ft.basepoller.BasePollerFT):
+    def __init__(self, name, chassis):
+        config = {
+            'age_out': {
+                'default': None,
+                'sudden_death': True
+            }
+        }
+        super(UnchangedFeed, self).__init__(name, chassis, config)
+
+        self.cur_iterator = 0
+
+        self.iterators = [
+            [('A', 1), ('B', 1), ('C', 1)],
+            [('B', 1), ('C', 2)],
+            [('B', 1), ('C', 2)]
+        ]
+
+    def _build_iterator(self, now):
+        r = []
+        if self.cur_iterator < len(self.iterators):
+            r = self.iterators[self.cur_iterator]
+
+        self.cur_iterator += 1
+
+        return r
+
+    def _process_item(self, item):
+        return [[item[0], {'type': 'IPv4', 'v': item[1]}]]
+
+
+class InPlaceFeed(UnchangedFeed):
+    def _process_item(self, item):
+        return [[item[0], {'type': 'IPv4', 'tags': ['x']}]]
+
+    def _update_attributes(self, current, _new, current_run, new_run):
+        # updates the current tags in place, like phishme
+        current['tags'].append(new_run)
+        return current
+
+
 class PermanentFeed(minemeld.ft.basepoller.BasePollerFT):
     def __init__(self, name, chassis):
         config = {
@@ -324,6 +365,82 @@ class MineMeldFTBasePollerTests(unittest.TestCase):
         a.stop()
 
 
+        a = None
+        chassis = None
+        rpcmock = None
+        ochannel = None
+
+        gc.collect()
+
+    @mock.patch.object(gevent, 'spawn')
+    @mock.patch.object(gevent, 'spawn_later')
+    @mock.patch.object(gevent, 'sleep', side_effect=gevent.GreenletExit())
+    @mock.patch('gevent.event.Event', side_effect=gevent_event_mock_factory)
+    @mock.patch('minemeld.ft.basepoller.utc_millisec', side_effect=logical_millisec)
+    def test_incremental_age_out(self, um_mock, event_mock, sleep_mock,
+                                 spawnl_mock, spawn_mock):
+        global CUR_LOGICAL_TIME
+
+        chassis = mock.Mock()
+
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        a = DeltaFeed(FTNAME, chassis)
+
+        a.connect([], False)
+        a.mgmtbus_initialize()
+        a.start()
+
+        CUR_LOGICAL_TIME = 2
+        a._poll()
+        CUR_LOGICAL_TIME = 4
+        a._poll()
+
+        CUR_LOGICAL_TIME = 6
+        a._age_out()
+        self.assertEqual(a.statistics.get('aged_out', 0), 0)
+        self.assertEqual(a._age_out_cursor, 5999)
+        self.assertEqual(a._next_age_out, 6000)
+
+        # nothing due, the index is not scanned
+        with mock.patch.object(a.table, 'query') as query_mock:
+            a._age_out()
+            self.assertEqual(query_mock.call_count, 0)
+
+        CUR_LOGICAL_TIME = 7
+        a._age_out()
+        self.assertEqual(a.statistics['aged_out'], 3)
+        self.assertEqual(a._age_out_cursor, 6999)
+        self.assertEqual(a._next_age_out, 8000)
+        self.assertEqual(a.age_out_rate, 3.0)
+        a._collect_garbage()
+        self.assertEqual(a.statistics['garbage_collected'], 3)
+        self.assertEqual(a._gc_cursor, 7000)
+
+        # indicators set to age out before the cursor are rescheduled
+        for i in ['D', 'E']:
+            v = a.table.get(i, 'IPv4')
+            v['_age_out'] = 5000
+            a._schedule_age_out(v['_age_out'])
+            a.table.put(i, v)
+        self.assertEqual(a._age_out_cursor, 4999)
+        self.assertEqual(a._next_age_out, 5000)
+
+        a._age_out()
+        self.assertEqual(a.statistics['aged_out'], 5)
+        self.assertEqual(a.length(), 3)
+
+        sstate = a._saved_state_create()
+        self.assertEqual(sstate['age_out_cursor'], 6999)
+        self.assertEqual(sstate['gc_cursor'], 7000)
+
+        a.stop()
+
         a = None
         chassis = None
         rpcmock = None
@@ -928,3 +1045,200 @@ class MineMeldFTBasePollerTests(unittest.TestCase):
         ochannel = None
 
         gc.collect()
+
+    @mock.patch.object(gevent, 'spawn')
+    @mock.patch.object(gevent, 'spawn_later')
+    @mock.patch.object(gevent, 'sleep', side_effect=gevent.GreenletExit())
+    @mock.patch('gevent.event.Event', side_effect=gevent_event_mock_factory)
+    @mock.patch('minemeld.ft.basepoller.utc_millisec', side_effect=logical_millisec)
+    def test_unchanged_feed(self, um_mock, event_mock,
+                            sleep_mock, spawnl_mock, spawn_mock):
+        global CUR_LOGICAL_TIME
+
+        chassis = mock.Mock()
+
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        a = UnchangedFeed(FTNAME, chassis)
+
+        a.connect([], False)
+        a.mgmtbus_initialize()
+        a.start()
+
+        CUR_LOGICAL_TIME = 2
+        a._poll()
+        self.assertEqual(a.statistics['added'], 3)
+
+        # B unchanged, C updated, A gone
+        CUR_LOGICAL_TIME = 4
+        a._poll()
+        a._sudden_death()
+        self.assertEqual(a.statistics['unchanged'], 1)
+        self.assertEqual(a.statistics['removed'], 1)
+        self.assertNotIn('_last_run', a.table.get('B'))
+        self.assertEqual(a.table.get_last_run('B'), 4000)
+        self.assertEqual(a.table.get_last_run('C'), 4000)
+        self.assertNotIn('_last_run', a.table.table.indexes)
+        self.assertEqual(a.table.get('C')['v'], 2)
+
+        # B and C still in feed
+        CUR_LOGICAL_TIME = 6
+        a._poll()
+        a._sudden_death()
+        a._age_out()
+        a._collect_garbage()
+        self.assertEqual(a.statistics['added'], 3)
+        self.assertEqual(a.statistics['unchanged'], 3)
+        self.assertEqual(a.statistics['removed'], 2)
+        self.assertEqual(a.statistics['garbage_collected'], 1)
+        self.assertEqual(a.length(), 2)
+        self.assertEqual(a.table.get_last_run('A'), None)
+
+        a.stop()
+
+        a = None
+        chassis = None
+        rpcmock = None
+        ochannel = None
+
+        gc.collect()
+
+    @mock.patch.object(gevent, 'spawn')
+    @mock.patch.object(gevent, 'spawn_later')
+    @mock.patch.object(gevent, 'sleep', side_effect=gevent.GreenletExit())
+    @mock.patch('gevent.event.Event', side_effect=gevent_event_mock_factory)
+    @mock.patch('minemeld.ft.basepoller.utc_millisec', side_effect=logical_millisec)
+    def test_update_in_place(self, um_mock, event_mock,
+                             sleep_mock, spawnl_mock, spawn_mock):
+        global CUR_LOGICAL_TIME
+
+        chassis = mock.Mock()
+
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        a = InPlaceFeed(FTNAME, chassis)
+
+        a.connect([], False)
+        a.mgmtbus_initialize()
+        a.start()
+
+        CUR_LOGICAL_TIME = 2
+        a._poll()
+        self.assertEqual(a.table.get('B')['tags'], ['x'])
+
+        # attributes equal, but updated in place by _update_attributes
+        CUR_LOGICAL_TIME = 4
+        a._poll()
+        self.assertEqual(a.statistics['unchanged'], 0)
+        self.assertEqual(a.table.get('B')['tags'], ['x', 4000])
+
+        a.stop()
+
+        a = None
+        chassis = None
+        rpcmock = None
+        ochannel = None
+
+        gc.collect()
+
+    def test_bptable_last_run_upgrade(self):
+        # tables without the _last_run column
+        t = minemeld.ft.table.Table(FTNAME, truncate=True)
+        t.put('A', {'_last_run': 10})
+        t.put('B', {'x': 1})
+        t.close()
+
+        t = minemeld.ft.table.Table(FTNAME)
+        bpt0 = minemeld.ft.basepoller._BPTable_v0(t)
+        self.assertEqual(bpt0.get_last_run('A'), 10)
+        self.assertEqual(bpt0.get_last_run('B'), None)
+        self.assertEqual(
+            [i for i, _ in bpt0.query_last_run(to_key=9)],
+            []
+        )
+        self.assertEqual(
+            [i for i, _ in bpt0.query_last_run(to_key=10)],
+            ['A']
+        )
+
+        # rewritten values are stripped of _last_run
+        bpt0.put('A', bpt0.get('A'))
+        self.assertEqual(bpt0.get('A'), {})
+        self.assertEqual(bpt0.get_last_run('A'), 10)
+        bpt0.close()
+
+        # v1 tables with type in key
+        t = minemeld.ft.table.Table(FTNAME, truncate=True)
+        t.set_custom_metadata({'version': 1, 'type_in_key': True})
+        t.create_index('_last_run')
+        t.put('IPv4::A', {'type': 'IPv4', '_last_run': 10})
+        t.close()
+
+        t = minemeld.ft.table.Table(FTNAME)
+        bpt1 = minemeld.ft.basepoller._BPTable_v1(t, type_in_key=True)
+        self.assertEqual(bpt1.get_last_run('A', 'IPv4'), 10)
+
+        bpt1.put('A', bpt1.get('A', 'IPv4'))
+        self.assertEqual(bpt1.get('A', 'IPv4'), {'type': 'IPv4'})
+        self.assertEqual(bpt1.get_last_run('A', 'IPv4'), 10)
+        self.assertEqual(
+            list(t.query(index='_last_run', include_value=True)),
+            []
+        )
+        bpt1.close()
+
+        t = minemeld.ft.table.Table(FTNAME, truncate=True)
+        bpt1 = minemeld.ft.basepoller._BPTable_v1(t, type_in_key=True)
+        bpt1.put('A', {'type': 'IPv4'})
+        bpt1.set_last_run('A', 'IPv4', 5)
+        self.assertEqual(bpt1.get_last_run('A', 'IPv4'), 5)
+        self.assertEqual(bpt1.get_last_run('A', 'URL'), None)
+        self.assertEqual(
+            list(bpt1.query_last_run(to_key=5)),
+            [('A', {'type': 'IPv4'})]
+        )
+        bpt1.close()
+
+    def test_fetch_pages(self):
+        a = DeltaFeed(FTNAME, mock.Mock())
+        a.fetch_concurrency = 2
+
+        inflight = [0, 0]  # current, max
+
+        def _fetch(page):
+            inflight[0] += 1
+            inflight[1] = max(inflight)
+            # later pages complete first
+            gevent.sleep(0.01*(5-page))
+            inflight[0] -= 1
+            return page*10
+
+        self.assertEqual(
+            list(a._fetch_pages(_fetch, iter(range(5)))),
+            [0, 10, 20, 30, 40]
+        )
+        self.assertEqual(inflight[1], 2)
+
+        def _failing_fetch(page):
+            if page == 1:
+                raise RuntimeError('failed')
+            return page
+
+        result = a._fetch_pages(_failing_fetch, range(5))
+        self.assertEqual(next(result), 0)
+        self.assertRaises(RuntimeError, next, result)
+
+        session = a._http_session()
+        self.assertIs(a._http_session(), session)
+        a.hup()
+        self.assertIsNot(a._http_session(), session)
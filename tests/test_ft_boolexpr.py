@@ -18,9 +18,12 @@ Unit tests for minemeld.ft.boolexpr
 """
 
 import unittest
+import tempfile
+import os
 import jmespath
 import operator
 import logging
+import mock
 
 import antlr4
 
@@ -134,3 +137,35 @@ class MineMeldFTBaseTests(unittest.TestCase):
 
         c = minemeld.ft.condition.Condition("type == 'IPv4'")
         self.assertTrue(c.eval(i))
+
+    def test_cache(self):
+        c1 = minemeld.ft.condition.Condition("type == 'IPv4'")
+        c2 = minemeld.ft.condition.Condition("type == 'IPv4'")
+        self.assertIs(c1.expression, c2.expression)
+
+        minemeld.ft.condition.Condition('length(sources) >= 2')
+
+        path = tempfile.mktemp(prefix='minemeld.conditioncache')
+        try:
+            minemeld.ft.condition.save_cache(path)
+
+            minemeld.ft.condition.interface._CACHE.clear()
+            self.assertGreaterEqual(
+                minemeld.ft.condition.load_cache(path),
+                2
+            )
+
+            with mock.patch.object(minemeld.ft.condition.Condition,
+                                   '_parse_boolexpr') as parse_mock:
+                c = minemeld.ft.condition.Condition('length(sources) >= 2')
+                self.assertEqual(parse_mock.call_count, 0)
+
+            self.assertEqual(c.comparator, operator.ge)
+            self.assertEqual(c.value, 2)
+            self.assertTrue(c.eval({'sources': [1, 2]}))
+            self.assertFalse(c.eval({'sources': [1]}))
+
+        finally:
+            os.remove(path)
+
+        self.assertEqual(minemeld.ft.condition.load_cache(path), 0)
@@ -1121,6 +1121,302 @@ class MineMeldFTIPOpTests(unittest.TestCase):
         a.st.db.close()
         a = None
 
+    def test_ipv6_uw(self):
+        config = {
+            'whitelist_prefixes': ['s2']
+        }
+        chassis = mock.Mock()
+
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        a = minemeld.ft.ipop.AggregateIPv6FT(FTNAME, chassis, config)
+
+        inputs = ['s1', 's2']
+        output = True
+
+        a.connect(inputs, output)
+        a.mgmtbus_initialize()
+        a.start()
+
+        a.filtered_update('s1', indicator='192.168.0.0/16', value={
+            'type': 'IPv4',
+            'sources': ['s1s']
+        })
+        self.assertEqual(ochannel.publish.call_count, 0)
+        self.assertEqual(a.statistics['update.ignored'], 1)
+
+        a.filtered_update('s1', indicator='2001:db8::/32', value={
+            'type': 'IPv6',
+            'sources': ['s1s'],
+            's1$a': 1
+        })
+        self.assertTrue(check_for_rpc(
+            ochannel.publish.call_args_list,
+            [
+                {
+                    'method': 'update',
+                    'indicator': '2001:db8::-2001:db8:ffff:ffff:ffff:ffff:ffff:ffff',
+                    'value': {
+                        's1$a': 1
+                    }
+                }
+            ],
+            all_here=True
+        ))
+
+        ochannel.publish.reset_mock()
+        a.filtered_update('s2', indicator='2001:db8:1::/48', value={
+            'type': 'IPv6',
+            'sources': ['s2s']
+        })
+        self.assertTrue(check_for_rpc(
+            ochannel.publish.call_args_list,
+            [
+                {
+                    'method': 'withdraw',
+                    'indicator': '2001:db8::-2001:db8:ffff:ffff:ffff:ffff:ffff:ffff'
+                },
+                {
+                    'method': 'update',
+                    'indicator': '2001:db8::-2001:db8:0:ffff:ffff:ffff:ffff:ffff'
+                },
+                {
+                    'method': 'update',
+                    'indicator': '2001:db8:2::-2001:db8:ffff:ffff:ffff:ffff:ffff:ffff'
+                }
+            ],
+            all_here=True
+        ))
+
+        ochannel.publish.reset_mock()
+        a.filtered_update(
+            's1',
+            indicator='ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff',
+            value={
+                'type': 'IPv6',
+                'sources': ['s1s']
+            }
+        )
+        self.assertTrue(check_for_rpc(
+            ochannel.publish.call_args_list,
+            [
+                {
+                    'method': 'update',
+                    'indicator': 'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff-'
+                                 'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff'
+                }
+            ],
+            all_here=True
+        ))
+
+        ochannel.publish.reset_mock()
+        a.filtered_withdraw('s2', indicator='2001:db8:1::/48', value={
+            'type': 'IPv6'
+        })
+        self.assertTrue(check_for_rpc(
+            ochannel.publish.call_args_list,
+            [
+                {
+                    'method': 'update',
+                    'indicator': '2001:db8::-2001:db8:ffff:ffff:ffff:ffff:ffff:ffff'
+                },
+                {
+                    'method': 'withdraw',
+                    'indicator': '2001:db8::-2001:db8:0:ffff:ffff:ffff:ffff:ffff'
+                },
+                {
+                    'method': 'withdraw',
+                    'indicator': '2001:db8:2::-2001:db8:ffff:ffff:ffff:ffff:ffff:ffff'
+                }
+            ],
+            all_here=True
+        ))
+
+        a.stop()
+
+        a.st.db.close()
+        a = None
+
+    def test_deferred(self):
+        config = {
+            'aggregation_window': 3600
+        }
+        chassis = mock.Mock()
+
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        a = minemeld.ft.ipop.AggregateIPv4FT(FTNAME, chassis, config)
+
+        inputs = ['s1', 's2']
+        output = True
+
+        a.connect(inputs, output)
+        a.mgmtbus_initialize()
+        a.start()
+
+        for j in range(8):
+            a.filtered_update(
+                's1',
+                indicator='192.168.0.%d-192.168.0.%d' % (j*2, j*2+1),
+                value={
+                    'type': 'IPv4',
+                    'sources': ['s1s'],
+                    's1$a': j
+                }
+            )
+        a.filtered_update('s1', indicator='192.168.0.0/24', value={
+            'type': 'IPv4',
+            'sources': ['s1s']
+        })
+        a.filtered_withdraw('s1', indicator='192.168.0.0/24')
+        a.filtered_withdraw('s1', indicator='192.168.0.2-192.168.0.3')
+        self.assertEqual(ochannel.publish.call_count, 0)
+
+        a._flush_ranges()
+        self.assertTrue(check_for_rpc(
+            ochannel.publish.call_args_list,
+            [
+                {
+                    'method': 'update',
+                    'indicator': '192.168.0.%d-192.168.0.%d' % (j*2, j*2+1),
+                    'value': {
+                        's1$a': j
+                    }
+                } for j in range(8) if j != 1
+            ],
+            all_here=True
+        ))
+        self.assertGreater(a.statistics['ranges.recomputations_saved'], 0)
+
+        ochannel.publish.reset_mock()
+        a.filtered_update('s1', indicator='192.168.0.0-192.168.0.1', value={
+            'type': 'IPv4',
+            'sources': ['s1s'],
+            's1$a': 100
+        })
+        a._flush_ranges()
+        self.assertTrue(check_for_rpc(
+            ochannel.publish.call_args_list,
+            [
+                {
+                    'method': 'update',
+                    'indicator': '192.168.0.0-192.168.0.1',
+                    'value': {
+                        's1$a': 100
+                    }
+                }
+            ],
+            all_here=True
+        ))
+
+        ochannel.publish.reset_mock()
+        a.filtered_withdraw('s1', indicator='192.168.0.4-192.168.0.5')
+        a.stop()
+        self.assertTrue(check_for_rpc(
+            ochannel.publish.call_args_list,
+            [
+                {
+                    'method': 'withdraw',
+                    'indicator': '192.168.0.4-192.168.0.5',
+                    'value': {
+                        's1$a': 2
+                    }
+                }
+            ],
+            all_here=True
+        ))
+
+        a.st.db.close()
+        a = None
+
+    def test_deferred_random(self):
+        def _projection(value):
+            # attributes of overlapping indicators are merged in uuid
+            # order, check only the attribute names
+            return (
+                sorted(value['sources']),
+                sorted(k for k in value.keys() if not k.startswith('_'))
+            )
+
+        def _downstream(call_args_list):
+            result = {}
+            for args, _ in call_args_list:
+                if args[0] == 'update':
+                    result[args[1]['indicator']] = \
+                        _projection(args[1]['value'])
+                elif args[0] == 'withdraw':
+                    result.pop(args[1]['indicator'], None)
+            return result
+
+        config = {
+            'whitelist_prefixes': ['s2'],
+            'aggregation_window': 3600
+        }
+        chassis = mock.Mock()
+
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+
+        a = minemeld.ft.ipop.AggregateIPv4FT(FTNAME, chassis, config)
+
+        inputs = ['s1', 's2']
+        output = True
+
+        a.connect(inputs, output)
+        a.mgmtbus_initialize()
+        a.start()
+
+        random.seed(7)
+        added = []
+        for j in xrange(10):
+            for k in xrange(40):
+                if len(added) > 0 and random.randint(0, 3) == 0:
+                    source, indicator = added.pop(
+                        random.randint(0, len(added)-1)
+                    )
+                    a.filtered_withdraw(source, indicator=indicator)
+                    continue
+
+                start = random.randint(0, 128)
+                end = min(start+random.randint(0, 32), 255)
+                indicator = '10.0.0.%d-10.0.0.%d' % (start, end)
+                source = random.choice(['s1', 's1', 's2'])
+                a.filtered_update(source, indicator=indicator, value={
+                    'type': 'IPv4',
+                    'sources': [source],
+                    source+'$v': random.randint(0, 2)
+                })
+                added.append((source, indicator))
+
+            a._flush_ranges()
+
+            expected = {}
+            for u in a._calc_ipranges(0, a.st.max_endpoint):
+                expected[u.indicator()] = _projection(
+                    a._calc_indicator_value(u.uuids)
+                )
+            self.assertEqual(
+                _downstream(ochannel.publish.call_args_list),
+                expected
+            )
+
+        self.assertGreater(a.statistics['ranges.recomputations_saved'], 0)
+
+        a.stop()
+
+        a.st.db.close()
+        a = None
+
     @attr('slow')
     def test_stress_1(self):
         num_intervals = 100000
@@ -0,0 +1,246 @@
+#  Copyright 2016 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""FT JSON tests
+
+Unit tests for minemeld.ft.json
+"""
+
+import gevent.monkey
+gevent.monkey.patch_all(thread=False, select=False)
+
+import unittest
+import mock
+
+import time
+import json
+import shutil
+import io
+
+import minemeld.ft.json
+
+FTNAME = 'testft-%d' % int(time.time())
+
+FEED = {
+    'syncToken': '1',
+    'prefixes': [
+        {'ip_prefix': '192.168.0.0/24', 'region': 'a', 'weight': 1.5},
+        {'ip_prefix': '10.0.0.0/8', 'region': 'b', 'tags': [1, 2]},
+        {'region': 'c'}
+    ]
+}
+
+
+class MineMeldFTJSONTests(unittest.TestCase):
+    def setUp(self):
+        shutil.rmtree(FTNAME, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(FTNAME, ignore_errors=True)
+
+    def test_extractor_prefix(self):
+        ep = minemeld.ft.json._extractor_prefix
+
+        self.assertEqual(ep('@'), 'item')
+        self.assertEqual(ep('items[*]'), 'items.item')
+        self.assertEqual(ep(' data[] '), 'data.item')
+        self.assertEqual(ep('data.items[*]'), 'data.items.item')
+        self.assertEqual(ep('items'), None)
+        self.assertEqual(ep("prefixes[?service=='AMAZON']"), None)
+        self.assertEqual(ep('items[*].ip'), None)
+
+    def _node(self, config):
+        chassis = mock.Mock()
+        chassis.request_pub_channel.return_value = mock.Mock()
+
+        config['url'] = 'https://example.com/feed.json'
+        return minemeld.ft.json.SimpleJSON(FTNAME, chassis, config)
+
+    def _response(self, document, status_code=200, headers=None):
+        if headers is None:
+            headers = {}
+
+        response = mock.Mock()
+        response.status_code = status_code
+        response.headers = headers
+        response.content = json.dumps(document)
+        response.raw = io.BytesIO(response.content)
+        response.json.return_value = document
+
+        return response
+
+    def _run_iterator(self, config, document):
+        a = self._node(config)
+        response = self._response(document)
+
+        with mock.patch('requests.get', return_value=response):
+            result = []
+            for item in a._build_iterator(0):
+                result.extend(a._process_item(item))
+
+        return response, result
+
+    def test_streaming(self):
+        response, result = self._run_iterator({
+            'extractor': 'prefixes[*]',
+            'indicator': 'ip_prefix',
+            'prefix': 'aws',
+            'streaming': True
+        }, FEED)
+
+        self.assertFalse(response.json.called)
+        self.assertTrue(response.close.called)
+        self.assertEqual(result, [
+            ['192.168.0.0/24', {'aws_region': 'a', 'aws_weight': 1.5}],
+            ['10.0.0.0/8', {'aws_region': 'b', 'aws_tags': [1, 2]}],
+            [None, None]
+        ])
+        self.assertIsInstance(result[0][1]['aws_weight'], float)
+
+    def test_streaming_same_result(self):
+        config = {
+            'extractor': 'prefixes[]',
+            'indicator': 'ip_prefix'
+        }
+        response, result = self._run_iterator(dict(config), FEED)
+        self.assertTrue(response.json.called)
+
+        config['streaming'] = True
+        response, sresult = self._run_iterator(dict(config), FEED)
+        self.assertFalse(response.json.called)
+
+        self.assertEqual(result, sresult)
+
+    def test_streaming_fallback(self):
+        response, result = self._run_iterator({
+            'extractor': "prefixes[?region=='b']",
+            'indicator': 'ip_prefix',
+            'streaming': True
+        }, FEED)
+
+        self.assertTrue(response.json.called)
+        self.assertEqual(result, [
+            ['10.0.0.0/8', {'json_region': 'b', 'json_tags': [1, 2]}]
+        ])
+
+    def _poll(self, a, now, response):
+        with mock.patch('requests.get', return_value=response) as get_mock:
+            iterator = a._build_iterator(now)
+
+        if iterator is not None:
+            # successful poll
+            list(iterator)
+            a.last_successful_run = now
+            a.conditional_state = a._conditional_candidate
+
+        return get_mock.call_args[1].get('headers', {}), iterator
+
+    def test_conditional(self):
+        a = self._node({
+            'extractor': 'prefixes[*]',
+            'conditional_content_hash': True
+        })
+
+        headers, iterator = self._poll(a, 1000, self._response(
+            FEED,
+            headers={'etag': '"1"', 'last-modified': 'X'}
+        ))
+        self.assertEqual(headers, {})
+        self.assertIsNotNone(iterator)
+
+        # persisted in saved state
+        sstate = a._saved_state_create()
+        a._saved_state_reset()
+        self.assertEqual(a.conditional_state, None)
+        a._saved_state_restore(sstate)
+        self.assertEqual(a.conditional_state['etag'], '"1"')
+        self.assertNotIn('example.com', a.conditional_state['url'])
+
+        # not modified
+        response = self._response({}, status_code=304)
+        headers, iterator = self._poll(a, 2000, response)
+        self.assertEqual(headers, {
+            'If-None-Match': '"1"',
+            'If-Modified-Since': 'X'
+        })
+        self.assertIsNone(iterator)
+        response.close.assert_called_once_with()
+        self.assertEqual(a.last_successful_run, 1000)
+        self.assertEqual(a.statistics['poll.not_modified'], 1)
+
+        # same content
+        response = self._response(FEED)
+        headers, iterator = self._poll(a, 3000, response)
+        self.assertIsNone(iterator)
+        self.assertEqual(a.statistics['poll.unchanged'], 1)
+        response.close.assert_called_once_with()
+
+        # new content
+        feed = {'prefixes': FEED['prefixes'][:1]}
+        headers, iterator = self._poll(a, 4000, self._response(feed))
+        self.assertIsNotNone(iterator)
+        self.assertEqual(a.conditional_state['etag'], None)
+
+        # max age exceeded
+        headers, iterator = self._poll(
+            a, 4000+86401*1000, self._response(feed)
+        )
+        self.assertEqual(headers, {})
+        self.assertIsNotNone(iterator)
+
+    def test_conditional_streaming(self):
+        a = self._node({'extractor': 'prefixes[*]', 'streaming': True})
+
+        headers, iterator = self._poll(a, 1000, self._response(
+            FEED,
+            headers={'etag': '"1"'}
+        ))
+        self.assertIsNotNone(iterator)
+
+        # content is not hashed in streaming mode
+        headers, iterator = self._poll(a, 2000, self._response(FEED))
+        self.assertEqual(headers, {'If-None-Match': '"1"'})
+        self.assertIsNotNone(iterator)
+
+        headers, iterator = self._poll(
+            a, 3000, self._response({}, status_code=304)
+        )
+        self.assertIsNone(iterator)
+
+    def test_conditional_no_content_hash(self):
+        a = self._node({'extractor': 'prefixes[*]'})
+
+        self._poll(a, 1000, self._response(FEED, headers={'etag': '"1"'}))
+        self.assertEqual(a.conditional_state['content_hash'], None)
+
+        # same content without validators, full poll
+        headers, iterator = self._poll(a, 2000, self._response(FEED))
+        self.assertEqual(headers, {'If-None-Match': '"1"'})
+        self.assertIsNotNone(iterator)
+
+        headers, iterator = self._poll(
+            a, 3000, self._response({}, status_code=304)
+        )
+        self.assertIsNone(iterator)
+
+    def test_conditional_disabled(self):
+        a = self._node({
+            'extractor': 'prefixes[*]',
+            'conditional_polling': False
+        })
+
+        self._poll(a, 1000, self._response(FEED, headers={'etag': '"1"'}))
+        headers, iterator = self._poll(a, 2000, self._response(FEED))
+        self.assertEqual(headers, {})
+        self.assertIsNotNone(iterator)
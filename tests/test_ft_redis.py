@@ -34,10 +34,18 @@ class MineMeldFTRedisTests(unittest.TestCase):
     def setUp(self):
         SR = redis.StrictRedis()
         SR.delete(FTNAME)
+        SR.delete(FTNAME+'.value')
+        SR.delete(FTNAME+'.generation')
+        SR.delete(FTNAME+'.shadow')
+        SR.delete(FTNAME+'.value.shadow')
 
     def tearDown(self):
         SR = redis.StrictRedis()
         SR.delete(FTNAME)
+        SR.delete(FTNAME+'.value')
+        SR.delete(FTNAME+'.generation')
+        SR.delete(FTNAME+'.shadow')
+        SR.delete(FTNAME+'.value.shadow')
 
     def test_init(self):
         config = {}
@@ -109,7 +117,7 @@ class MineMeldFTRedisTests(unittest.TestCase):
         chassis.request_pub_channel.assert_not_called()
 
     def test_uw(self):
-        config = {}
+        config = {'batch_size': 1}
         chassis = mock.Mock()
 
         chassis.request_sub_channel.return_value = None
@@ -187,7 +195,7 @@ class MineMeldFTRedisTests(unittest.TestCase):
         b.stop()
 
     def test_store_value(self):
-        config = {'store_value': True}
+        config = {'store_value': True, 'batch_size': 1}
         chassis = mock.Mock()
 
         chassis.request_sub_channel.return_value = None
@@ -227,8 +235,340 @@ class MineMeldFTRedisTests(unittest.TestCase):
         b.stop()
         self.assertNotEqual(b.SR, None)
 
+    def test_generation(self):
+        config = {'batch_size': 1}
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+        chassis.request_rpc_channel.return_value = None
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+
+        inputs = ['a', 'b', 'c']
+        output = False
+
+        b.connect(inputs, output)
+        b.mgmtbus_reset()
+
+        b.start()
+        time.sleep(1)
+
+        SR = redis.StrictRedis()
+
+        g0 = int(SR.get(FTNAME+'.generation'))
+        self.assertGreater(g0, 0)
+
+        b.filtered_update('a', indicator='testi', value={'test': 'v'})
+        g1 = int(SR.get(FTNAME+'.generation'))
+        self.assertGreater(g1, g0)
+
+        b.filtered_withdraw('a', indicator='testi')
+        g2 = int(SR.get(FTNAME+'.generation'))
+        self.assertGreater(g2, g1)
+
+        b.stop()
+
+    def test_batch(self):
+        config = {'batch_size': 3, 'batch_interval': 0.5}
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+        chassis.request_rpc_channel.return_value = None
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+
+        inputs = ['a', 'b', 'c']
+        output = False
+
+        b.connect(inputs, output)
+        b.mgmtbus_reset()
+
+        b.start()
+        time.sleep(1)
+
+        SR = redis.StrictRedis()
+        g0 = int(SR.get(FTNAME+'.generation'))
+
+        # flushed by size
+        b.filtered_update('a', indicator='i1', value={'test': 'v'})
+        b.filtered_update('a', indicator='i2', value={'test': 'v'})
+        self.assertEqual(SR.zcard(FTNAME), 0)
+        b.filtered_withdraw('a', indicator='i1')
+        self.assertItemsEqual(SR.zrange(FTNAME, 0, -1), ['i2'])
+        self.assertEqual(int(SR.get(FTNAME+'.generation')), g0+1)
+        self.assertEqual(b.statistics['added'], 2)
+        self.assertEqual(b.statistics['removed'], 1)
+
+        # flushed by time
+        b.filtered_update('a', indicator='i3', value={'test': 'v'})
+        self.assertEqual(SR.zcard(FTNAME), 1)
+        time.sleep(1)
+        self.assertItemsEqual(SR.zrange(FTNAME, 0, -1), ['i2', 'i3'])
+
+        # flushed by length
+        b.filtered_update('a', indicator='i4', value={'test': 'v'})
+        self.assertEqual(b.length(), 3)
+        self.assertEqual(SR.zcard(FTNAME), 3)
+
+        # flushed by stop
+        b.filtered_withdraw('a', indicator='i4')
+        b.stop()
+        self.assertItemsEqual(SR.zrange(FTNAME, 0, -1), ['i2', 'i3'])
+
+    def test_flush_error(self):
+        config = {'batch_size': 2, 'batch_interval': 0.5, 'max_pending': 3}
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+        chassis.request_rpc_channel.return_value = None
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+
+        b.connect(['a'], False)
+        b.mgmtbus_reset()
+        b.start()
+
+        SR = redis.StrictRedis()
+
+        b.filtered_update('a', indicator='i1', value={'test': 'v'})
+        with mock.patch.object(
+                redis.client.BasePipeline, 'execute',
+                side_effect=redis.ConnectionError('test')):
+            b.filtered_update('a', indicator='i2', value={'test': 'v'})
+            self.assertEqual(b.statistics['error.flush'], 1)
+
+            # while retrying only the timer flushes, and the backlog
+            # is capped at max_pending
+            b.filtered_update('a', indicator='i3', value={'test': 'v'})
+            b.filtered_update('a', indicator='i4', value={'test': 'v'})
+            self.assertEqual(b.length(), 0)
+            self.assertEqual(b.statistics['error.flush'], 1)
+            self.assertEqual(b.statistics['drop.backlog'], 1)
+
+        # the batch is put back and retried by the timer with backoff
+        self.assertEqual(SR.zcard(FTNAME), 0)
+        time.sleep(0.7)
+        self.assertEqual(SR.zcard(FTNAME), 0)
+        time.sleep(0.6)
+        self.assertItemsEqual(SR.zrange(FTNAME, 0, -1), ['i1', 'i2', 'i3'])
+        self.assertEqual(b.statistics['added'], 3)
+        self.assertEqual(b.length(), 3)
+
+        b.stop()
+
+    def test_atomic_add(self):
+        config = {'store_value': True, 'atomic_add': True}
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+        chassis.request_rpc_channel.return_value = None
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+        b.max_entries = 1
+
+        inputs = ['a', 'b', 'c']
+        output = False
+
+        b.connect(inputs, output)
+        b.mgmtbus_reset()
+
+        b.start()
+        time.sleep(1)
+
+        SR = redis.StrictRedis()
+
+        b.filtered_update('a', indicator='testi', value={'test': 'v'})
+        b.filtered_update('a', indicator='testio', value={'test': 'v'})
+        b.filtered_update('a', indicator='testi', value={'test': 'v2'})
+        self.assertEqual(b.length(), 1)
+        self.assertEqual(b.statistics['drop.overflow'], 1)
+        self.assertEqual(b.statistics['added'], 1)
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['testi'])
+        self.assertEqual(
+            SR.hget(FTNAME+'.value', 'testi'),
+            '{"test":"v2"}'
+        )
+
+        b.filtered_withdraw('a', indicator='testi')
+        b.filtered_update('a', indicator='testio', value={'test': 'v'})
+        self.assertEqual(b.length(), 1)
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['testio'])
+        self.assertEqual(SR.hlen(FTNAME+'.value'), 1)
+
+        b.stop()
+
+    def test_shadow_rebuild(self):
+        config = {
+            'store_value': True,
+            'batch_size': 1,
+            'shadow_rebuild': True,
+            'shadow_rebuild_idle': 1
+        }
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+        chassis.request_rpc_channel.return_value = None
+        rpcmock = mock.Mock()
+        rpcmock.get.return_value = {'error': None, 'result': 'OK'}
+        chassis.send_rpc.return_value = rpcmock
+
+        SR = redis.StrictRedis()
+        SR.zadd(FTNAME, 0, 'old')
+        SR.hset(FTNAME+'.value', 'old', '{}')
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+
+        inputs = ['a', 'b', 'c']
+        output = False
+
+        b.connect(inputs, output)
+        b.mgmtbus_reset()
+        g0 = int(SR.get(FTNAME+'.generation'))
+
+        b.start()
+
+        # replay goes to the shadow keys
+        b.filtered_update('a', indicator='i1', value={'test': 'v'})
+        b.filtered_update('a', indicator='i2', value={'test': 'v'})
+        b.filtered_withdraw('a', indicator='i2')
+        self.assertEqual(b.length(), 1)
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['old'])
+        self.assertEqual(SR.zrange(FTNAME+'.shadow', 0, -1), ['i1'])
+        self.assertEqual(int(SR.get(FTNAME+'.generation')), g0)
+
+        time.sleep(2)
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['i1'])
+        self.assertEqual(SR.hkeys(FTNAME+'.value'), ['i1'])
+        self.assertFalse(SR.exists(FTNAME+'.shadow'))
+        self.assertFalse(SR.exists(FTNAME+'.value.shadow'))
+        self.assertEqual(int(SR.get(FTNAME+'.generation')), g0+1)
+
+        # after the swap operations go to the feed keys
+        b.filtered_update('a', indicator='i3', value={'test': 'v'})
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['i1', 'i3'])
+        self.assertEqual(b.length(), 2)
+
+        b.stop()
+
+    def test_shadow_rebuild_checkpoint(self):
+        config = {
+            'batch_size': 10,
+            'shadow_rebuild': True
+        }
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+        chassis.request_rpc_channel.return_value = None
+
+        SR = redis.StrictRedis()
+        SR.zadd(FTNAME, 0, 'old')
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+
+        b.connect(['a'], False)
+        b.mgmtbus_reset()
+        b.start()
+
+        b.filtered_update('a', indicator='i1', value={'test': 'v'})
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['old'])
+
+        # the checkpoint from upstream completes the replay
+        b.checkpoint(source='a', value='c1')
+        time.sleep(0.1)
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['i1'])
+        self.assertFalse(SR.exists(FTNAME+'.shadow'))
+        self.assertEqual(SR.get(FTNAME+'.chkp'), 'c1')
+        self.assertEqual(b._resync_glet, None)
+
+        b.stop()
+        SR.delete(FTNAME+'.chkp')
+
+    def test_shadow_rebuild_retry(self):
+        config = {
+            'shadow_rebuild': True,
+            'shadow_rebuild_idle': 1,
+            'shadow_rebuild_timeout': 1
+        }
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+        chassis.request_rpc_channel.return_value = None
+
+        SR = redis.StrictRedis()
+        SR.zadd(FTNAME, 0, 'old')
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+
+        b.connect(['a'], False)
+        b.mgmtbus_rebuild()
+
+        swap = b._swap
+        b._swap = mock.Mock(side_effect=redis.exceptions.ConnectionError())
+        b.start()
+
+        time.sleep(1.5)
+        self.assertEqual(b.statistics['error.swap'], 1)
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['old'])
+
+        b._swap = swap
+        time.sleep(1)
+        self.assertFalse(SR.exists(FTNAME))
+
+        b.stop()
+
+    def test_shadow_rebuild_timeout(self):
+        config = {
+            'shadow_rebuild': True,
+            'shadow_rebuild_timeout': 1
+        }
+        chassis = mock.Mock()
+
+        chassis.request_sub_channel.return_value = None
+        ochannel = mock.Mock()
+        chassis.request_pub_channel.return_value = ochannel
+        chassis.request_rpc_channel.return_value = None
+
+        SR = redis.StrictRedis()
+        SR.zadd(FTNAME, 0, 'old')
+
+        b = minemeld.ft.redis.RedisSet(FTNAME, chassis, config)
+
+        b.connect(['a'], False)
+        b.mgmtbus_rebuild()
+        b.start()
+
+        self.assertEqual(SR.zrange(FTNAME, 0, -1), ['old'])
+        time.sleep(2)
+        self.assertFalse(SR.exists(FTNAME))
+        self.assertEqual(b.length(), 0)
+
+        b.stop()
+
     def test_store_value_overflow(self):
-        config = {'store_value': True}
+        config = {'store_value': True, 'batch_size': 1}
         chassis = mock.Mock()
 
         chassis.request_sub_channel.return_value = None
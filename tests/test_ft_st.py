@@ -185,12 +185,76 @@ class MineMeldFTSTTests(unittest.TestCase):
 
         st.close()
 
-    def _random_map(self, nbits=10, nintervals=1000):
+    def test_sorted_keys(self):
+        sk = minemeld.ft.st._SortedKeys()
+        sk.BUCKET_SIZE = 4
+
+        keys = set()
+        for j in xrange(2000):
+            k = random.randint(0, 300)
+            if random.randint(0, 2) == 0:
+                sk.discard(k)
+                keys.discard(k)
+            else:
+                sk.add(k)
+                keys.add(k)
+
+            start = random.randint(0, 300)
+            stop = random.randint(start, 300)
+            include_start = random.randint(0, 1) == 0
+            include_stop = random.randint(0, 1) == 0
+
+            expected = sorted([
+                x for x in keys
+                if (x > start or (include_start and x == start)) and
+                (x < stop or (include_stop and x == stop))
+            ])
+            self.assertEqual(
+                list(sk.irange(start, stop, include_start=include_start,
+                               include_stop=include_stop)),
+                expected
+            )
+            self.assertEqual(
+                list(sk.irange(start, stop, include_start=include_start,
+                               include_stop=include_stop, reverse=True)),
+                expected[::-1]
+            )
+
+        self.assertEqual(len(sk), len(keys))
+
+    def test_in_memory_reload(self):
+        st = minemeld.ft.st.ST(TABLENAME, 8, truncate=True)
+
+        sid1 = uuid.uuid4().bytes
+        sid2 = uuid.uuid4().bytes
+
+        st.put(sid1, 1, 70, 1)
+        st.put(sid2, 50, 100, 2)
+        st.close()
+
+        st = minemeld.ft.st.ST(TABLENAME, 8)
+        self.assertEqual(st.num_endpoints, 4)
+
+        eps = [ep[0] for ep in st.query_endpoints()]
+        self.assertEqual(eps, [1, 50, 70, 100])
+
+        intervals = set([(i[0], i[1]) for i in st.cover(60)])
+        self.assertEqual(intervals, set([(sid2, 2), (sid1, 1)]))
+
+        st.delete(sid2, 50, 100, 2)
+        eps = [ep[0] for ep in st.query_endpoints()]
+        self.assertEqual(eps, [1, 70])
+        self.assertEqual(list(st.cover(80)), [])
+
+        st.close()
+
+    def _random_map(self, nbits=10, nintervals=1000, in_memory=True):
         epmax = (1 << nbits)-1
 
         rmap = [set() for i in xrange(epmax+1)]
 
-        st = minemeld.ft.st.ST(TABLENAME, nbits, truncate=True)
+        st = minemeld.ft.st.ST(TABLENAME, nbits, truncate=True,
+                               in_memory=in_memory)
 
         for j in xrange(nintervals):
             sid = uuid.uuid4().bytes
@@ -226,6 +290,9 @@ class MineMeldFTSTTests(unittest.TestCase):
     def test_random_map_fast(self):
         self._random_map()
 
+    def test_random_map_db(self):
+        self._random_map(in_memory=False)
+
     @attr('slow')
     def test_random_map_fast2(self):
         self._random_map(nintervals=2000)
@@ -22,6 +22,7 @@ import tempfile
 import shutil
 import random
 import time
+import collections
 
 import minemeld.ft.table
 
@@ -210,6 +211,251 @@ class MineMeldFTTableTests(unittest.TestCase):
         self.assertEqual(ok, 1)
         table.close()
 
+    def test_update_query_value(self):
+        table = minemeld.ft.table.Table(TABLENAME)
+        table.create_index('a')
+
+        table.put('k1', {'a': 1})
+        table.put('k2', {'a': 1})
+        table.put('k1', {'a': 2, 'b': 'x'})
+
+        result = list(table.query('a', from_key=0, to_key=2,
+                                  include_value=True))
+        self.assertEqual(
+            result,
+            [('k2', {'a': 1}), ('k1', {'a': 2, 'b': 'x'})]
+        )
+
+        result = list(table.query(include_value=True))
+        self.assertEqual(
+            result,
+            [('k1', {'a': 2, 'b': 'x'}), ('k2', {'a': 1})]
+        )
+        table.close()
+
+    def test_vacuum(self):
+        table = minemeld.ft.table.Table(TABLENAME)
+        table.create_index('a')
+        table.create_index('b')
+
+        for j in range(3):
+            table.put('k1', {'a': j, 'b': 'x'})
+        table.put('k2', {'a': 1, 'b': 'y'})
+        table.put('k3', {'a': 1})
+        table.delete('k3')
+
+        def _num_entries(idxid):
+            return len(list(table.db.iterator(
+                start=chr(2)+chr(idxid)+chr(0xF0),
+                stop=chr(2)+chr(idxid)+chr(0xF1)
+            )))
+
+        # bounded work per call
+        self.assertFalse(table.vacuum(max_entries=2))
+        self.assertEqual(table.statistics['table.vacuum.deleted'], 2)
+        self.assertEqual(table.index_stats, {})
+
+        self.assertTrue(table.vacuum())
+        self.assertEqual(table.statistics['table.vacuum.deleted'], 5)
+        self.assertEqual(
+            table.index_stats['a'],
+            {'live': 2, 'dead': 3, 'dead_ratio': 0.6}
+        )
+        self.assertEqual(
+            table.index_stats['b'],
+            {'live': 2, 'dead': 2, 'dead_ratio': 0.5}
+        )
+        self.assertEqual(_num_entries(table.indexes['a']['id']), 2)
+        self.assertEqual(_num_entries(table.indexes['b']['id']), 2)
+
+        self.assertEqual(list(table.query('a')), ['k2', 'k1'])
+
+        # next pass starts from the first index
+        self.assertTrue(table.vacuum())
+        self.assertEqual(table.statistics['table.vacuum.deleted'], 5)
+        self.assertEqual(table.index_stats['a']['dead'], 0)
+
+        table.close()
+
+    def test_column(self):
+        table = minemeld.ft.table.Table(TABLENAME)
+        self.assertTrue(table.create_column('c'))
+        self.assertFalse(table.create_column('c'))
+
+        table.put('k1', {'a': 1})
+        table.put('k2', {'a': 1})
+        table.put_column('k1', 'c', 10)
+        table.put_column('k2', 'c', 5)
+        table.put_column('k1', 'c', 20)
+
+        self.assertEqual(table.get_column('k1', 'c'), 20)
+        self.assertEqual(table.get_column('k3', 'c'), None)
+        self.assertEqual(
+            list(table.query_column('c')),
+            [('k1', 20), ('k2', 5)]
+        )
+
+        with table.batch():
+            table.put_column('k2', 'c', 30)
+            self.assertEqual(table.get_column('k2', 'c'), 30)
+            self.assertEqual(
+                list(table.query_column('c')),
+                [('k1', 20), ('k2', 30)]
+            )
+            table.delete('k1')
+            self.assertEqual(list(table.query_column('c')), [('k2', 30)])
+
+        # column values do not touch the indicator value
+        self.assertEqual(table.get('k2'), {'a': 1})
+        table.close()
+
+        table = minemeld.ft.table.Table(TABLENAME)
+        self.assertEqual(table.columns, {'c': 0})
+        self.assertEqual(list(table.query_column('c')), [('k2', 30)])
+        table.close()
+
+    def test_batch(self):
+        table = minemeld.ft.table.Table(TABLENAME)
+        table.create_index('a')
+
+        # local dict
+        d = {}
+
+        with table.batch(size=100) as b:
+            for i in xrange(NUM_ELEMENTS):
+                value = {'a': random.randint(0, 1000)}
+                key = 'i%d' % i
+                d[key] = value
+                b.put(key, value)
+
+                # pending writes should be visible
+                self.assertEqual(b.get(key), value)
+
+            b.delete('i1')
+            del d['i1']
+            self.assertFalse(b.exists('i1'))
+            b.delete('i1')
+
+        self.assertEqual(table.num_indicators, len(d))
+
+        table.close()
+        table = None
+
+        # reopen, metadata should have been committed
+        table = minemeld.ft.table.Table(TABLENAME)
+        self.assertEqual(table.num_indicators, len(d))
+
+        num_below_500 = len([v for v in d.values() if v['a'] <= 500])
+        j = 0
+        for k, v in table.query('a', from_key=0, to_key=500,
+                                include_value=True):
+            self.assertEqual(d[k], v)
+            j += 1
+
+        self.assertEqual(j, num_below_500)
+
+        table.put('i1', {'a': 1001})
+        self.assertEqual(
+            list(table.query('a', from_key=1001, to_key=1001)),
+            ['i1']
+        )
+        table.close()
+
+    def test_codec_msgpack(self):
+        table = minemeld.ft.table.Table(TABLENAME, codec='msgpack')
+        table.create_index('_age_out')
+
+        value = {
+            '_age_out': 1483184218151,
+            'sources': ['s1', u's\u00e8'],
+            'type': 'IPv4',
+            'custom': {'a': 1.5, 'b': None}
+        }
+        table.put('k1', value)
+        self.assertEqual(table.get('k1'), value)
+        self.assertEqual(
+            list(table.query('_age_out', include_value=True)),
+            [('k1', value)]
+        )
+        table.close()
+        table = None
+
+        # codec is preserved on reopen
+        table = minemeld.ft.table.Table(TABLENAME)
+        self.assertEqual(table.codec.name, 'msgpack')
+        self.assertEqual(table.get('k1'), value)
+        table.close()
+
+    def test_codec_conversion(self):
+        table = minemeld.ft.table.Table(TABLENAME)
+        self.assertEqual(table.codec.name, 'json')
+
+        for i in xrange(100):
+            table.put('i%d' % i, {'a': i, 'type': 'IPv4'})
+        table.close()
+        table = None
+
+        table = minemeld.ft.table.Table(TABLENAME, codec='msgpack')
+        self.assertEqual(table.codec.name, 'msgpack')
+        for i in xrange(100):
+            self.assertEqual(table.get('i%d' % i), {'a': i, 'type': 'IPv4'})
+        table.close()
+        table = None
+
+        table = minemeld.ft.table.Table(TABLENAME)
+        self.assertEqual(table.codec.name, 'msgpack')
+        self.assertEqual(table.num_indicators, 100)
+        table.close()
+
+    def test_cache(self):
+        statistics = collections.defaultdict(int)
+        table = minemeld.ft.table.Table(
+            TABLENAME,
+            cache_size=2,
+            statistics=statistics
+        )
+        table.create_index('a')
+
+        table.put('k1', {'a': 1, 'sources': ['s1']})
+        table.put('k2', {'a': 2})
+        misses = statistics['table.cache.miss']
+
+        v = table.get('k1')
+        self.assertEqual(v, {'a': 1, 'sources': ['s1']})
+        self.assertEqual(statistics['table.cache.hit'], 1)
+
+        # returned values can be modified
+        v['sources'].append('s2')
+        self.assertEqual(table.get('k1'), {'a': 1, 'sources': ['s1']})
+
+        # missing indicators are cached
+        self.assertFalse(table.exists('k3'))
+        self.assertFalse(table.exists('k3'))
+        self.assertEqual(statistics['table.cache.miss'], misses+1)
+
+        # k2 has been evicted
+        self.assertEqual(table.get('k2'), {'a': 2})
+        self.assertEqual(statistics['table.cache.miss'], misses+2)
+
+        # write through
+        table.put('k2', {'a': 3})
+        self.assertEqual(table.get('k2'), {'a': 3})
+        table.delete('k2')
+        self.assertFalse(table.exists('k2'))
+        self.assertEqual(statistics['table.cache.miss'], misses+2)
+        self.assertEqual(table.num_indicators, 1)
+
+        # index point queries populate the cache
+        self.assertEqual(
+            list(table.query('a', from_key=1, to_key=1, include_value=True)),
+            [('k1', {'a': 1, 'sources': ['s1']})]
+        )
+        hits = statistics['table.cache.hit']
+        table.get('k1')
+        self.assertEqual(statistics['table.cache.hit'], hits+1)
+
+        table.close()
+
     @attr('slow')
     def test_random(self):
         # create table
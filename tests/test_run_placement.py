@@ -0,0 +1,114 @@
+#  Copyright 2015 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""FT placement tests
+
+Unit tests for minemeld.run.placement
+"""
+
+import unittest
+
+import minemeld.run.config
+import minemeld.run.placement
+
+
+def _chains_config(num_chains, weights=None):
+    if weights is None:
+        weights = {}
+
+    nodes = {}
+    for j in range(num_chains):
+        nodes['m%d' % j] = {'class': 'M', 'output': True}
+        nodes['a%d' % j] = {
+            'class': 'A', 'output': True, 'inputs': ['m%d' % j]
+        }
+        nodes['o%d' % j] = {'class': 'O', 'inputs': ['a%d' % j]}
+
+    for n, w in weights.iteritems():
+        nodes[n]['weight'] = w
+
+    return minemeld.run.config.MineMeldConfig.from_dict({'nodes': nodes})
+
+
+class MineMeldRunPlacementTests(unittest.TestCase):
+    def _check_all_placed(self, config, ftlists):
+        placed = []
+        for ftlist in ftlists:
+            placed.extend(ftlist.keys())
+        self.assertEqual(sorted(placed), sorted(config.nodes.keys()))
+
+    def test_round_robin(self):
+        config = _chains_config(3)
+
+        ftlists = minemeld.run.placement.place('round-robin', config, 3)
+        self._check_all_placed(config, ftlists)
+        self.assertEqual([len(ftlist) for ftlist in ftlists], [3, 3, 3])
+
+    def test_graph_chains(self):
+        config = _chains_config(3)
+
+        ftlists = minemeld.run.placement.place('graph', config, 3)
+        self._check_all_placed(config, ftlists)
+        self.assertEqual([len(ftlist) for ftlist in ftlists], [3, 3, 3])
+        self.assertEqual(
+            minemeld.run.placement.cross_edges(config, ftlists),
+            0
+        )
+
+        rrftlists = minemeld.run.placement.round_robin(config, 3)
+        self.assertGreater(
+            minemeld.run.placement.cross_edges(config, rrftlists),
+            0
+        )
+
+    def test_graph_shared_output(self):
+        # 6 miners -> 1 aggregator, 2 chassis
+        nodes = {'agg': {'class': 'A', 'output': True, 'inputs': []}}
+        for j in range(6):
+            nodes['m%d' % j] = {'class': 'M', 'output': True}
+            nodes['agg']['inputs'].append('m%d' % j)
+        config = minemeld.run.config.MineMeldConfig.from_dict(
+            {'nodes': nodes}
+        )
+
+        ftlists = minemeld.run.placement.place('graph', config, 2)
+        self._check_all_placed(config, ftlists)
+        self.assertEqual(sorted(len(ftlist) for ftlist in ftlists), [3, 4])
+        self.assertEqual(
+            minemeld.run.placement.cross_edges(config, ftlists),
+            3
+        )
+
+    def test_graph_weights(self):
+        # the heavy miner gets a chassis by itself
+        config = _chains_config(2, weights={'m0': 4})
+
+        ftlists = minemeld.run.placement.place('graph', config, 2)
+        self._check_all_placed(config, ftlists)
+        heavy = next(ftlist for ftlist in ftlists if 'm0' in ftlist)
+        self.assertEqual(heavy.keys(), ['m0'])
+
+    def test_graph_more_chassis_than_nodes(self):
+        config = _chains_config(1)
+
+        ftlists = minemeld.run.placement.place('graph', config, 4)
+        self._check_all_placed(config, ftlists)
+
+    def test_unknown(self):
+        config = _chains_config(1)
+
+        self.assertRaises(
+            RuntimeError,
+            minemeld.run.placement.place, 'unknown', config, 2
+        )